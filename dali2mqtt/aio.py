@@ -0,0 +1,201 @@
+"""Asyncio runtime: DALI bus and MQTT client driven from one event loop.
+
+The sequences of dali2mqtt.bus run unchanged, AsyncBus steps them from a
+task instead of a thread. Drivers with a coroutine ``send`` (the
+``dali.driver.hid`` drivers) are awaited, synchronous ones run in the
+default executor.
+"""
+import asyncio
+import itertools
+import logging
+import time
+
+import paho.mqtt.client as mqtt
+from dali.exceptions import CommunicationError
+from dali2mqtt.bus import PacedDriver, _Task, step_sequence
+from dali2mqtt.consts import (
+    ALL_SUPPORTED_LOG_LEVELS,
+    BUS_PRIORITY_STOP,
+    DALI_FRAME_BURST,
+    DEFAULT_DALI_FRAME_RATE,
+    DEFAULT_DALI_TIMEOUT,
+    LOG_FORMAT,
+    MQTT_MISC_INTERVAL,
+)
+
+logging.basicConfig(format=LOG_FORMAT)
+logger = logging.getLogger(__name__)
+
+
+class AsyncPacedDriver(PacedDriver):
+    """PacedDriver waiting for its tokens without blocking the event loop."""
+
+    def __init__(self, driver, rate=DEFAULT_DALI_FRAME_RATE, burst=DALI_FRAME_BURST):
+        """Initialize paced driver."""
+        super().__init__(driver, rate, burst)
+        self.is_async = asyncio.iscoroutinefunction(driver.send)
+
+    async def send(self, command, in_transaction=False):
+        """Send a command once the frame rate allows it."""
+        delay = self._reserve_token()
+        if delay:
+            await asyncio.sleep(delay)
+        started = time.monotonic()
+        response = error = None
+        try:
+            if self.is_async:
+                response = await self.driver.send(
+                    command, in_transaction=in_transaction
+                )
+            else:
+                response = await asyncio.get_running_loop().run_in_executor(
+                    None, self.driver.send, command
+                )
+            return response
+        except Exception as err:
+            error = err
+            raise
+        finally:
+            self._account(command, time.monotonic() - started, delay, error, response)
+
+
+class AsyncBus:
+    """Event loop task owning the DALI driver and running sequences by priority.
+
+    The asyncio counterpart of BusWorker, with the same submit() but
+    returning an asyncio future: cancelling it drops the sequence before
+    its next frame. A transaction (a command, or a list of commands sent
+    back to back) not answered within ``timeout`` seconds raises
+    CommunicationError into its sequence.
+    """
+
+    def __init__(
+        self,
+        driver,
+        log_level,
+        frame_rate=DEFAULT_DALI_FRAME_RATE,
+        timeout=DEFAULT_DALI_TIMEOUT,
+        name="dali-bus",
+    ):
+        """Initialize async bus."""
+        self.name = name
+        self.model = type(driver).__name__
+        self.driver = AsyncPacedDriver(driver, frame_rate)
+        self.timeout = timeout
+        self._queue = asyncio.PriorityQueue()
+        self._order = itertools.count()
+        self._task = None
+
+        logger.setLevel(ALL_SUPPORTED_LOG_LEVELS[log_level])
+
+    def start(self):
+        """Start running sequences, from the event loop."""
+        self._task = asyncio.get_running_loop().create_task(self.run(), name=self.name)
+
+    def submit(self, priority, sequence):
+        """Queue a sequence, returning a future with its result."""
+        task = _Task(sequence, asyncio.get_running_loop().create_future())
+        self._queue.put_nowait((priority, next(self._order), task))
+        return task.future
+
+    def pending(self):
+        """Return the number of sequences waiting for the bus."""
+        return self._queue.qsize()
+
+    def stop(self):
+        """Stop the bus once the current transaction is done."""
+        self._queue.put_nowait((BUS_PRIORITY_STOP, next(self._order), None))
+
+    async def _transaction(self, command):
+        """Send a command, or a list of commands in one transaction."""
+        if not isinstance(command, list):
+            return await self.driver.send(command)
+        lock = getattr(self.driver.driver, "transaction_lock", None)
+        if lock is None:
+            return [await self.driver.send(item) for item in command]
+        async with lock:
+            return [
+                await self.driver.send(item, in_transaction=True) for item in command
+            ]
+
+    async def run(self):
+        """Process queued sequences until stopped."""
+        while True:
+            priority, order, task = await self._queue.get()
+            if task is None:
+                logger.info("Bus <%s> stopped, %s", self.name, self.driver.stats())
+                return
+            if task.future.cancelled():
+                logger.debug("Dropping cancelled sequence on <%s>", self.name)
+                task.sequence.close()
+                continue
+            try:
+                command = step_sequence(task.sequence, task.response, task.error)
+            except StopIteration as result:
+                task.future.set_result(result.value)
+                continue
+            except Exception as err:
+                logger.error("Bus sequence failed, %s: %s", type(err).__name__, err)
+                task.future.set_exception(err)
+                continue
+            try:
+                task.response = await asyncio.wait_for(
+                    self._transaction(command), self.timeout
+                )
+                task.error = None
+            except asyncio.TimeoutError:
+                task.response, task.error = None, CommunicationError(
+                    f"No answer from the bus within {self.timeout}s"
+                )
+            except Exception as err:
+                task.response, task.error = None, err
+            self._queue.put_nowait((priority, order, task))
+
+
+class MQTTSocketHooks:
+    """Drive a paho client from the event loop through its socket callbacks.
+
+    Must be created before the client connects. ``disconnected`` is a
+    future set to the reason code once the connection is gone.
+    """
+
+    def __init__(self, client):
+        """Initialize socket hooks."""
+        self.loop = asyncio.get_running_loop()
+        self.client = client
+        self.disconnected = self.loop.create_future()
+        self._misc = None
+        client.on_socket_open = self.on_socket_open
+        client.on_socket_close = self.on_socket_close
+        client.on_socket_register_write = self.on_socket_register_write
+        client.on_socket_unregister_write = self.on_socket_unregister_write
+        client.on_disconnect = self.on_disconnect
+
+    def on_socket_open(self, client, userdata, sock):  # pylint: disable=W0613
+        """Read from the socket when it has data."""
+        self.loop.add_reader(sock, client.loop_read)
+        self._misc = self.loop.create_task(self._loop_misc())
+
+    def on_socket_close(self, client, userdata, sock):  # pylint: disable=W0613
+        """Stop watching a closed socket."""
+        self.loop.remove_reader(sock)
+        if self._misc is not None:
+            self._misc.cancel()
+
+    def on_socket_register_write(self, client, userdata, sock):  # pylint: disable=W0613
+        """Write to the socket when it can take data."""
+        self.loop.add_writer(sock, client.loop_write)
+
+    def on_socket_unregister_write(self, client, userdata, sock):  # pylint: disable=W0613
+        """Stop waiting to write to the socket."""
+        self.loop.remove_writer(sock)
+
+    def on_disconnect(self, client, userdata, result):  # pylint: disable=W0613
+        """Signal the end of the connection."""
+        if not self.disconnected.done():
+            self.disconnected.set_result(result)
+
+    async def _loop_misc(self):
+        """Run the keepalive and retry housekeeping of the client."""
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(MQTT_MISC_INTERVAL)
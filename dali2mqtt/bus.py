@@ -0,0 +1,244 @@
+"""DALI bus worker.
+
+All bus traffic is expressed as sequences: generators that yield DALI
+commands (or a list of commands that must go out back to back) and
+receive the responses, like the sequences of python-dali.
+"""
+import itertools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from dali2mqtt.consts import (
+    ALL_SUPPORTED_LOG_LEVELS,
+    BUS_PRIORITY_STOP,
+    DALI_FRAME_BURST,
+    DEFAULT_DALI_FRAME_RATE,
+    LOG_FORMAT,
+)
+
+logging.basicConfig(format=LOG_FORMAT)
+logger = logging.getLogger(__name__)
+
+
+def send_commands(driver, command):
+    """Send a command, or a list of commands in one transaction."""
+    if isinstance(command, list):
+        return [driver.send(item) for item in command]
+    return driver.send(command)
+
+
+def step_sequence(sequence, response, error):
+    """Resume a sequence with the outcome of its last command."""
+    if error is not None:
+        return sequence.throw(error)
+    return sequence.send(response)
+
+
+def run_sequence(driver, sequence):
+    """Run a sequence to completion on a synchronous driver."""
+    response, error = None, None
+    while True:
+        try:
+            command = step_sequence(sequence, response, error)
+        except StopIteration as result:
+            return result.value
+        try:
+            response, error = send_commands(driver, command), None
+        except Exception as err:
+            response, error = None, err
+
+
+class PacedDriver:
+    """Driver wrapper pacing frames with a token bucket.
+
+    Up to ``burst`` frames go out back to back, after that frames are sent
+    at ``rate`` frames per second, so bursts wait here instead of overrunning
+    the interface. Frames sent, time spent sending and time spent waiting
+    for a token are accounted for, and every frame is reported to
+    ``on_frame(command, seconds, error, response)`` when set.
+    """
+
+    def __init__(self, driver, rate=DEFAULT_DALI_FRAME_RATE, burst=DALI_FRAME_BURST):
+        """Initialize paced driver."""
+        self.driver = driver
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._refilled = self._started = time.monotonic()
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.busy_time = 0
+        self.queue_delay = 0
+        self.max_queue_delay = 0
+        self.on_frame = None
+
+    def _reserve_token(self):
+        """Take a token, returning how long to wait before sending."""
+        now = time.monotonic()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._refilled) * self.rate
+        )
+        self._refilled = now
+        delay = 0
+        if self._tokens < 1:
+            delay = (1 - self._tokens) / self.rate
+            self._tokens, self._refilled = 1, now + delay
+        self._tokens -= 1
+        return delay
+
+    def _account(self, command, elapsed, delay, error, response=None):
+        """Account for a frame sent."""
+        self.frames += 1
+        self.busy_time += elapsed
+        self.queue_delay += delay
+        self.max_queue_delay = max(self.max_queue_delay, delay)
+        if self.on_frame is not None:
+            self.on_frame(command, elapsed, error, response)
+
+    def send(self, command):
+        """Send a command once the frame rate allows it."""
+        with self._lock:
+            delay = self._reserve_token()
+            if delay:
+                time.sleep(delay)
+            started = time.monotonic()
+            response = error = None
+            try:
+                response = self.driver.send(command)
+                return response
+            except Exception as err:
+                error = err
+                raise
+            finally:
+                self._account(
+                    command, time.monotonic() - started, delay, error, response
+                )
+
+    def stats(self):
+        """Return frames sent, bus utilization and queueing delay so far."""
+        with self._lock:
+            elapsed = time.monotonic() - self._started
+            return {
+                "frames": self.frames,
+                "utilization": self.busy_time / elapsed if elapsed else 0,
+                "mean_queue_delay": self.queue_delay / self.frames if self.frames else 0,
+                "max_queue_delay": self.max_queue_delay,
+            }
+
+
+class _Task:
+    """A sequence queued on the bus and the outcome of its last command."""
+
+    def __init__(self, sequence, future=None):
+        self.sequence = sequence
+        self.future = Future() if future is None else future
+        self.response = None
+        self.error = None
+
+
+class BusWorker(threading.Thread):
+    """Thread owning the DALI driver and running sequences by priority.
+
+    Sequences are stepped one command at a time and requeued with their
+    original priority and order, so a command submitted on a more urgent
+    lane goes out before the next frame of a running scan. Every frame goes
+    through a PacedDriver limited to ``frame_rate`` frames per second.
+    """
+
+    def __init__(
+        self, driver, log_level, frame_rate=DEFAULT_DALI_FRAME_RATE, name="dali-bus"
+    ):
+        """Initialize bus worker."""
+        super().__init__(name=name, daemon=True)
+        self.model = type(driver).__name__
+        self.driver = PacedDriver(driver, frame_rate)
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()
+
+        logger.setLevel(ALL_SUPPORTED_LOG_LEVELS[log_level])
+
+    def submit(self, priority, sequence):
+        """Queue a sequence, returning a future with its result."""
+        task = _Task(sequence)
+        self._queue.put((priority, next(self._order), task))
+        return task.future
+
+    def pending(self):
+        """Return the number of sequences waiting for the bus."""
+        return self._queue.qsize()
+
+    def stop(self):
+        """Stop the worker once the current command is done."""
+        self._queue.put((BUS_PRIORITY_STOP, next(self._order), None))
+
+    def run(self):
+        """Process queued sequences until stopped."""
+        while True:
+            priority, order, task = self._queue.get()
+            if task is None:
+                logger.info("Bus stopped, %s", self.driver.stats())
+                return
+            try:
+                command = step_sequence(task.sequence, task.response, task.error)
+            except StopIteration as result:
+                task.future.set_result(result.value)
+                continue
+            except Exception as err:
+                logger.error("Bus sequence failed, %s: %s", type(err).__name__, err)
+                task.future.set_exception(err)
+                continue
+            try:
+                task.response, task.error = send_commands(self.driver, command), None
+            except Exception as err:
+                task.response, task.error = None, err
+            self._queue.put((priority, order, task))
+
+
+class CommandCoalescer:
+    """Keep only the newest pending command per target while the bus is busy.
+
+    Commands pushed for a target that already has one waiting replace it
+    and move to the end of the batch, which keeps arrival order; the whole
+    batch is handed to ``flush`` once the bus picks it up. Every command
+    superseded is reported to ``on_collapse()`` when set.
+    """
+
+    def __init__(self, bus, priority, flush):
+        """Initialize coalescer."""
+        self._bus = bus
+        self._priority = priority
+        self._flush = flush
+        self._pending = {}
+        self._scheduled = False
+        self._lock = threading.Lock()
+        self.collapsed = 0
+        self.on_collapse = None
+
+    def push(self, key, command):
+        """Queue a command, superseding any pending one for the same key."""
+        with self._lock:
+            if key in self._pending:
+                self.collapsed += 1
+                if self.on_collapse is not None:
+                    self.on_collapse()
+                logger.debug("Superseded pending command for %s", key)
+                # the newest command takes its place in arrival order
+                del self._pending[key]
+            self._pending[key] = command
+            if not self._scheduled:
+                self._scheduled = True
+                self._bus.submit(self._priority, self._drain())
+
+    def _drain(self):
+        """Sequence flushing the commands pending when the bus gets to it."""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            self._scheduled = False
+        logger.debug(
+            "Flushing %d commands, %d collapsed so far", len(batch), self.collapsed
+        )
+        result = yield from self._flush(batch)
+        return result
@@ -1,34 +1,96 @@
 """Configuration Object."""
+import asyncio
 import logging
+import os
 
 import voluptuous as vol
 import yaml
 from dali2mqtt.consts import (
     ALL_SUPPORTED_LOG_LEVELS,
+    CONF_BUS_NAME,
+    CONF_BUS_MONITOR,
+    CONF_BUSES,
     CONF_CONFIG,
+    CONF_DALI_DEVICE,
     CONF_DALI_DRIVER,
+    CONF_DALI_FRAME_RATE,
+    CONF_DALI_LAMPS,
+    CONF_DALI_TIMEOUT,
     CONF_DEVICES_NAMES_FILE,
     CONF_HA_DISCOVERY_PREFIX,
+    CONF_INSTANCE,
+    CONF_INVENTORY_FILE,
+    CONF_LEASE_DURATION,
+    CONF_LIGHT_SCHEMA,
     CONF_LOG_COLOR,
     CONF_LOG_LEVEL,
+    CONF_METRICS_PORT,
     CONF_MQTT_BASE_TOPIC,
     CONF_MQTT_PASSWORD,
     CONF_MQTT_PORT,
     CONF_MQTT_SERVER,
     CONF_MQTT_USERNAME,
+    CONF_POLL_BUDGET,
+    CONF_PUBLISH_QOS,
+    CONF_PUBLISH_WINDOW,
+    CONF_RUNTIME,
+    CONF_SNAPSHOT_INTERVAL,
+    CONF_TRACE_FILE,
+    CONF_TRACE_LATENCY,
     DALI_DRIVERS,
+    CONFIG_DEBOUNCE_TIME,
+    DALI_SHORT_ADDRESSES,
+    DEFAULT_BUS_MONITOR,
     DEFAULT_DALI_DRIVER,
+    DEFAULT_DALI_FRAME_RATE,
+    DEFAULT_DALI_LAMPS,
+    DEFAULT_DALI_TIMEOUT,
     DEFAULT_DEVICES_NAMES_FILE,
     DEFAULT_HA_DISCOVERY_PREFIX,
+    DEFAULT_INVENTORY_FILE,
+    DEFAULT_LEASE_DURATION,
+    DEFAULT_LIGHT_SCHEMA,
     DEFAULT_LOG_COLOR,
     DEFAULT_LOG_LEVEL,
     DEFAULT_MQTT_BASE_TOPIC,
     DEFAULT_MQTT_PORT,
     DEFAULT_MQTT_SERVER,
+    DEFAULT_POLL_BUDGET,
+    DEFAULT_PUBLISH_QOS,
+    DEFAULT_PUBLISH_WINDOW,
+    DEFAULT_RUNTIME,
+    DEFAULT_SNAPSHOT_INTERVAL,
+    DEFAULT_TRACE_LATENCY,
+    LIGHT_SCHEMAS,
     LOG_FORMAT,
+    RUNTIMES,
 )
-from watchdog.events import FileSystemEventHandler
-from watchdog.observers.polling import PollingObserver as Observer
+from dali2mqtt.watcher import FileWatcher
+
+BUS_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_BUS_NAME): vol.Match(r"^[A-Za-z0-9_-]+$"),
+        vol.Optional(CONF_DALI_DRIVER): vol.In(DALI_DRIVERS),
+        vol.Optional(CONF_DALI_DEVICE): str,
+        vol.Optional(CONF_DALI_LAMPS): vol.All(
+            vol.Coerce(int), vol.Range(min=0, max=DALI_SHORT_ADDRESSES)
+        ),
+        vol.Optional(CONF_DALI_FRAME_RATE): vol.All(
+            vol.Coerce(float), vol.Range(min=1)
+        ),
+        vol.Optional(CONF_DEVICES_NAMES_FILE): str,
+        vol.Optional(CONF_INVENTORY_FILE): str,
+    }
+)
+
+
+def unique_bus_names(buses):
+    """Validate that every bus has its own name."""
+    names = [bus[CONF_BUS_NAME] for bus in buses]
+    if len(set(names)) != len(names):
+        raise vol.Invalid("bus names must be unique")
+    return buses
+
 
 CONF_SCHEMA = vol.Schema(
     {
@@ -40,14 +102,52 @@ CONF_SCHEMA = vol.Schema(
         vol.Required(CONF_DALI_DRIVER, default=DEFAULT_DALI_DRIVER): vol.In(
             DALI_DRIVERS
         ),
+        vol.Optional(CONF_DALI_DEVICE): str,
+        vol.Optional(CONF_DALI_LAMPS): vol.All(
+            vol.Coerce(int), vol.Range(min=0, max=DALI_SHORT_ADDRESSES)
+        ),
+        vol.Optional(CONF_INSTANCE): vol.Match(r"^[A-Za-z0-9_-]+$"),
+        vol.Optional(CONF_LEASE_DURATION, default=DEFAULT_LEASE_DURATION): vol.All(
+            vol.Coerce(int), vol.Range(min=6)
+        ),
+        vol.Optional(CONF_RUNTIME, default=DEFAULT_RUNTIME): vol.In(RUNTIMES),
+        vol.Optional(CONF_DALI_TIMEOUT, default=DEFAULT_DALI_TIMEOUT): vol.All(
+            vol.Coerce(float), vol.Range(min=0.1)
+        ),
+        vol.Optional(CONF_PUBLISH_WINDOW, default=DEFAULT_PUBLISH_WINDOW): vol.All(
+            vol.Coerce(int), vol.Range(min=1)
+        ),
+        vol.Optional(CONF_PUBLISH_QOS, default=DEFAULT_PUBLISH_QOS): vol.In([0, 1]),
+        vol.Optional(CONF_LIGHT_SCHEMA, default=DEFAULT_LIGHT_SCHEMA): vol.In(
+            LIGHT_SCHEMAS
+        ),
+        vol.Optional(
+            CONF_SNAPSHOT_INTERVAL, default=DEFAULT_SNAPSHOT_INTERVAL
+        ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional(CONF_BUS_MONITOR, default=DEFAULT_BUS_MONITOR): bool,
+        vol.Optional(CONF_BUSES): vol.All(
+            [BUS_SCHEMA], vol.Length(min=1), unique_bus_names
+        ),
+        vol.Optional(
+            CONF_DALI_FRAME_RATE, default=DEFAULT_DALI_FRAME_RATE
+        ): vol.All(vol.Coerce(float), vol.Range(min=1)),
         vol.Optional(
             CONF_HA_DISCOVERY_PREFIX, default=DEFAULT_HA_DISCOVERY_PREFIX
         ): str,
         vol.Optional(CONF_DEVICES_NAMES_FILE, default=DEFAULT_DEVICES_NAMES_FILE): str,
+        vol.Optional(CONF_INVENTORY_FILE): str,
         vol.Optional(CONF_LOG_LEVEL, default=DEFAULT_LOG_LEVEL): vol.In(
             ALL_SUPPORTED_LOG_LEVELS
         ),
         vol.Optional(CONF_LOG_COLOR, default=DEFAULT_LOG_COLOR): bool,
+        vol.Optional(CONF_METRICS_PORT): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=65535)
+        ),
+        vol.Optional(CONF_TRACE_LATENCY, default=DEFAULT_TRACE_LATENCY): bool,
+        vol.Optional(CONF_TRACE_FILE): str,
+        vol.Optional(CONF_POLL_BUDGET, default=DEFAULT_POLL_BUDGET): vol.All(
+            vol.Coerce(float), vol.Range(min=0, max=1)
+        ),
     },
     extra=True,
 )
@@ -56,15 +156,25 @@ logging.basicConfig(format=LOG_FORMAT)
 logger = logging.getLogger(__name__)
 
 
+def config_changes(previous, current):
+    """Return the keys whose settings differ between two configurations."""
+    return {
+        key
+        for key in set(previous) | set(current)
+        if previous.get(key) != current.get(key)
+    }
+
+
 class Config:
     """Configuration representation."""
 
     def __init__(self, args, callback=None):
         """Initialize configuration."""
-        self._watchdog_observer = None
+        self._watcher = None
         self._path = args.config
         self._callback = callback
         self._config = {}
+        self._overrides = dict(vars(args))
 
         # Load from file
         try:
@@ -74,18 +184,58 @@ class Config:
             self._config = CONF_SCHEMA({})
 
         # Overwrite with command line arguments
-        args_keys = vars(args)
-        for key in args_keys:
-            if self._config.get(key) != args_keys[key]:
-                self._config[key] = args_keys[key]
+        self._override(self._config)
 
         self.save_config_file()
 
-        self._watchdog_observer = Observer()
-        watchdog_event_handler = FileSystemEventHandler()
-        watchdog_event_handler.on_modified = lambda event: self.load_config_file()
-        self._watchdog_observer.schedule(watchdog_event_handler, self._path)
-        self._watchdog_observer.start()
+    def _override(self, configuration):
+        """Overwrite a configuration with the command line arguments."""
+        for key, value in self._overrides.items():
+            if configuration.get(key) != value:
+                configuration[key] = value
+
+    def watch(self, debounce=CONFIG_DEBOUNCE_TIME, loop=None):
+        """Reload the configuration file when it changes, from a watchdog thread.
+
+        See FileWatcher for how changes are noticed and debounced. With
+        loop, reloads and their callback run in that event loop.
+        """
+        self._watcher = FileWatcher(self._path, self.reload, debounce, loop)
+        self._watcher.start()
+
+    async def watch_async(self, callback=None, debounce=CONFIG_DEBOUNCE_TIME):
+        """Reload the configuration file when it changes, from the event loop.
+
+        callback, when given, replaces the one called after every reload.
+        """
+        if callback is not None:
+            self._callback = callback
+        self.watch(debounce, asyncio.get_running_loop())
+        try:
+            await asyncio.Event().wait()
+        finally:
+            self._watcher.stop()
+
+    def reload(self):
+        """Reload the configuration file, returning the keys that changed.
+
+        The callback is called with the changed keys, if any. A file that
+        can't be read or is invalid leaves the running configuration alone.
+        """
+        try:
+            with open(self._path, "r") as infile:
+                configuration = CONF_SCHEMA(yaml.safe_load(infile) or {})
+        except (OSError, yaml.YAMLError, vol.Invalid) as error:
+            logger.error("Keeping the running configuration, %s: %s", self._path, error)
+            return set()
+        self._override(configuration)
+        changes = config_changes(self._config, configuration)
+        self._config = configuration
+        if changes:
+            logger.debug("Configuration changes: %s", ", ".join(sorted(changes)))
+            if self._callback:
+                self._callback(changes)
+        return changes
 
     def load_config_file(self):
         """Load configuration from yaml file."""
@@ -100,11 +250,6 @@ class Config:
                     )
                     configuration = {}
                 self._config = CONF_SCHEMA(configuration)
-                if self._callback:
-                    self._callback()
-            except AttributeError:
-                # No callback configured
-                pass
             except vol.MultipleInvalid as error:
                 logger.error("In configuration file %s: %s", self._path, error)
                 quit(1)
@@ -124,9 +269,8 @@ class Config:
 
     def __del__(self):
         """Release watchdog."""
-        if self._watchdog_observer:
-            self._watchdog_observer.stop()
-            self._watchdog_observer.join()
+        if self._watcher:
+            self._watcher.stop()
         if self._config != {}:
             self.save_config_file()
 
@@ -150,6 +294,108 @@ class Config:
         """DALI driver configured."""
         return self._config[CONF_DALI_DRIVER]
 
+    @property
+    def dali_lamps(self):
+        """Number of lamps emulated by the dummy driver."""
+        return self._config.get(CONF_DALI_LAMPS, DEFAULT_DALI_LAMPS)
+
+    @property
+    def dali_frame_rate(self):
+        """Maximum DALI frames sent per second."""
+        return self._config[CONF_DALI_FRAME_RATE]
+
+    @property
+    def runtime(self):
+        """Runtime driving the bus and MQTT, threads or asyncio."""
+        return self._config[CONF_RUNTIME]
+
+    @property
+    def dali_timeout(self):
+        """Seconds a DALI transaction may take in the asyncio runtime."""
+        return self._config[CONF_DALI_TIMEOUT]
+
+    @property
+    def publish_window(self):
+        """Messages of a bulk publish in flight at once."""
+        return self._config[CONF_PUBLISH_WINDOW]
+
+    @property
+    def publish_qos(self):
+        """QoS of the discovery and state messages published in bulk."""
+        return self._config[CONF_PUBLISH_QOS]
+
+    @property
+    def light_schema(self):
+        """Home Assistant MQTT light schema, default or json."""
+        return self._config[CONF_LIGHT_SCHEMA]
+
+    @property
+    def snapshot_interval(self):
+        """Minimum seconds between bus snapshots, 0 disables them."""
+        return self._config[CONF_SNAPSHOT_INTERVAL]
+
+    @property
+    def bus_monitor(self):
+        """Follow the level commands other masters send on the buses."""
+        return self._config[CONF_BUS_MONITOR]
+
+    @property
+    def instance(self):
+        """Name of this bridge among several sharing a broker, None if alone."""
+        return self._config.get(CONF_INSTANCE)
+
+    @property
+    def lease_duration(self):
+        """Seconds a bus lease of an instance is valid without renewal."""
+        return self._config[CONF_LEASE_DURATION]
+
+    @property
+    def buses(self):
+        """DALI buses served, each with its driver, names and inventory files.
+
+        Without a list of buses the top level settings describe a single
+        bus, named after the instance if there is one. Settings missing from
+        a named bus are taken from the top level, and its files default to
+        <file>-<name>.yaml.
+        """
+        if CONF_BUSES not in self._config:
+            return [
+                {
+                    CONF_BUS_NAME: self.instance,
+                    CONF_DALI_DRIVER: self.dali_driver,
+                    CONF_DALI_DEVICE: self._config.get(CONF_DALI_DEVICE),
+                    CONF_DALI_LAMPS: self.dali_lamps,
+                    CONF_DALI_FRAME_RATE: self.dali_frame_rate,
+                    CONF_DEVICES_NAMES_FILE: self.devices_names_file,
+                    CONF_INVENTORY_FILE: self.inventory_file,
+                }
+            ]
+
+        def per_bus(filename, name):
+            root, extension = os.path.splitext(filename)
+            return f"{root}-{name}{extension}"
+
+        return [
+            {
+                CONF_BUS_NAME: bus[CONF_BUS_NAME],
+                CONF_DALI_DRIVER: bus.get(CONF_DALI_DRIVER, self.dali_driver),
+                CONF_DALI_DEVICE: bus.get(CONF_DALI_DEVICE),
+                CONF_DALI_LAMPS: bus.get(CONF_DALI_LAMPS, self.dali_lamps),
+                CONF_DALI_FRAME_RATE: bus.get(
+                    CONF_DALI_FRAME_RATE, self.dali_frame_rate
+                ),
+                CONF_DEVICES_NAMES_FILE: bus.get(
+                    CONF_DEVICES_NAMES_FILE,
+                    per_bus(self.devices_names_file, bus[CONF_BUS_NAME]),
+                ),
+                CONF_INVENTORY_FILE: bus.get(
+                    CONF_INVENTORY_FILE,
+                    per_bus(self.inventory_file, bus[CONF_BUS_NAME]),
+                ),
+            }
+            for bus in self._config[CONF_BUSES]
+        ]
+
     @property
     def ha_discovery_prefix(self):
         """Home Assistant discovery prefix."""
@@ -165,7 +411,37 @@ class Config:
         """Color to be used for logs."""
         return self._config[CONF_LOG_COLOR]
 
+    @property
+    def poll_budget(self):
+        """Share of bus time background polling may use, 0 disables it."""
+        return self._config[CONF_POLL_BUDGET]
+
+    @property
+    def metrics_port(self):
+        """Port of the metrics HTTP endpoint, None if disabled."""
+        return self._config.get(CONF_METRICS_PORT)
+
+    @property
+    def trace_latency(self):
+        """Trace the latency of lamp commands."""
+        return self._config[CONF_TRACE_LATENCY]
+
+    @property
+    def trace_file(self):
+        """Return JSON-lines file for latency reports, None to publish them."""
+        return self._config.get(CONF_TRACE_FILE)
+
     @property
     def devices_names_file(self):
         """Return filename containing devices names."""
         return self._config[CONF_DEVICES_NAMES_FILE]
+
+    @property
+    def inventory_file(self):
+        """Return filename of the bus inventory cache, next to the devices names."""
+        return self._config.get(
+            CONF_INVENTORY_FILE,
+            os.path.join(
+                os.path.dirname(self.devices_names_file), DEFAULT_INVENTORY_FILE
+            ),
+        )
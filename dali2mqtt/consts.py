@@ -9,23 +9,74 @@ __email__ = "diogogomes@gmail.com"
 HASSEB = "hasseb"
 TRIDONIC = "tridonic"
 DALI_SERVER = "dali_server"
-DALI_DRIVERS = [HASSEB, TRIDONIC, DALI_SERVER, "dummy"]
+DUMMY = "dummy"
+DALI_DRIVERS = [HASSEB, TRIDONIC, DALI_SERVER, DUMMY]
+
+RUNTIME_THREADS = "threads"
+RUNTIME_ASYNCIO = "asyncio"
+RUNTIMES = [RUNTIME_THREADS, RUNTIME_ASYNCIO]
+
+LIGHT_SCHEMA_DEFAULT = "default"
+LIGHT_SCHEMA_JSON = "json"
+LIGHT_SCHEMAS = [LIGHT_SCHEMA_DEFAULT, LIGHT_SCHEMA_JSON]
 
 CONF_CONFIG = "config"
 CONF_DEVICES_NAMES_FILE = "devices_names"
+CONF_INVENTORY_FILE = "inventory_file"
 CONF_MQTT_SERVER = "mqtt_server"
 CONF_MQTT_PORT = "mqtt_port"
 CONF_MQTT_USERNAME = "mqtt_username"
 CONF_MQTT_PASSWORD = "mqtt_password"
 CONF_MQTT_BASE_TOPIC = "mqtt_base_topic"
 CONF_DALI_DRIVER = "dali_driver"
+CONF_DALI_DEVICE = "dali_device"
+CONF_INSTANCE = "instance"
+CONF_LEASE_DURATION = "lease_duration"
+CONF_RUNTIME = "runtime"
+CONF_DALI_TIMEOUT = "dali_timeout"
+CONF_PUBLISH_WINDOW = "publish_window"
+CONF_PUBLISH_QOS = "publish_qos"
+CONF_LIGHT_SCHEMA = "light_schema"
+CONF_SNAPSHOT_INTERVAL = "snapshot_interval"
+CONF_BUS_MONITOR = "bus_monitor"
+CONF_BUSES = "buses"
+CONF_BUS_NAME = "name"
 CONF_DALI_LAMPS = "dali_lamps"
 CONF_HA_DISCOVERY_PREFIX = "ha_discovery_prefix"
 CONF_LOG_LEVEL = "log_level"
 CONF_LOG_COLOR = "log_color"
+CONF_POLL_BUDGET = "poll_budget"
+CONF_DALI_FRAME_RATE = "dali_frame_rate"
+CONF_METRICS_PORT = "metrics_port"
+CONF_TRACE_LATENCY = "trace_latency"
+CONF_TRACE_FILE = "trace_file"
+
+# How a running bridge applies a change of the configuration file,
+# settings missing from these take effect on restart
+CONFIG_LIVE_KEYS = {CONF_LOG_LEVEL, CONF_PUBLISH_WINDOW, CONF_PUBLISH_QOS}
+CONFIG_RECONNECT_KEYS = {
+    CONF_MQTT_SERVER,
+    CONF_MQTT_PORT,
+    CONF_MQTT_USERNAME,
+    CONF_MQTT_PASSWORD,
+    CONF_MQTT_BASE_TOPIC,
+    CONF_HA_DISCOVERY_PREFIX,
+    CONF_LIGHT_SCHEMA,
+}
+CONFIG_BUS_KEYS = {
+    CONF_DALI_DRIVER,
+    CONF_DALI_DEVICE,
+    CONF_DALI_LAMPS,
+    CONF_DALI_FRAME_RATE,
+    CONF_DALI_TIMEOUT,
+    CONF_BUSES,
+    CONF_DEVICES_NAMES_FILE,
+    CONF_INVENTORY_FILE,
+}
 
 DEFAULT_CONFIG_FILE = "config.yaml"
 DEFAULT_DEVICES_NAMES_FILE = "devices.yaml"
+DEFAULT_INVENTORY_FILE = "inventory.yaml"
 DEFAULT_MQTT_SERVER = "localhost"
 DEFAULT_MQTT_PORT = "1883"
 DEFAULT_MQTT_BASE_TOPIC = "dali2mqtt"
@@ -33,6 +84,18 @@ DEFAULT_HA_DISCOVERY_PREFIX = "homeassistant"
 DEFAULT_DALI_DRIVER = "hasseb"
 DEFAULT_LOG_LEVEL = "info"
 DEFAULT_LOG_COLOR = False
+DEFAULT_POLL_BUDGET = 0
+DEFAULT_DALI_FRAME_RATE = 40
+DEFAULT_DALI_LAMPS = 4
+DEFAULT_TRACE_LATENCY = False
+DEFAULT_LEASE_DURATION = 60
+DEFAULT_RUNTIME = RUNTIME_THREADS
+DEFAULT_DALI_TIMEOUT = 2
+DEFAULT_PUBLISH_WINDOW = 32
+DEFAULT_PUBLISH_QOS = 0
+DEFAULT_LIGHT_SCHEMA = LIGHT_SCHEMA_DEFAULT
+DEFAULT_SNAPSHOT_INTERVAL = 0
+DEFAULT_BUS_MONITOR = False
 
 MQTT_DALI2MQTT_STATUS = "{}/status"
 MQTT_STATE_TOPIC = "{}/{}/light/status"
@@ -40,20 +103,69 @@ MQTT_COMMAND_TOPIC = "{}/{}/light/switch"
 MQTT_BRIGHTNESS_STATE_TOPIC = "{}/{}/light/brightness/status"
 MQTT_BRIGHTNESS_COMMAND_TOPIC = "{}/{}/light/brightness/set"
 MQTT_BRIGHTNESS_GET_COMMAND_TOPIC = "{}/{}/light/brightness/get"
+MQTT_JSON_STATE_TOPIC = "{}/{}/light/json"
+MQTT_JSON_COMMAND_TOPIC = "{}/{}/light/json/set"
 MQTT_SCAN_LAMPS_COMMAND_TOPIC = "{}/find"
+MQTT_SCAN_LAMPS_RESULT_TOPIC = "{}/find/result"
 MQTT_BRIGHTNESS_MAX_LEVEL_TOPIC = "{}/{}/max_level"
 MQTT_BRIGHTNESS_MIN_LEVEL_TOPIC = "{}/{}/min_level"
 MQTT_BRIGHTNESS_PHYSICAL_MINIMUM_LEVEL_TOPIC = "{}/{}/physical_minimum"
+MQTT_SCENE_STORE_COMMAND_TOPIC = "{}/scene/{}/store"
+MQTT_SCENE_RECALL_COMMAND_TOPIC = "{}/scene/{}/recall"
+MQTT_SCENE_REMOVE_COMMAND_TOPIC = "{}/scene/{}/remove"
+MQTT_DIAGNOSTICS_LATENCY_TOPIC = "{}/diagnostics/latency"
+MQTT_LEASE_TOPIC = "{}/lease"
+MQTT_SNAPSHOT_TOPIC = "{}/snapshot"
 MQTT_PAYLOAD_ON = b"ON"
 MQTT_PAYLOAD_OFF = b"OFF"
 MQTT_AVAILABLE = "online"
 MQTT_NOT_AVAILABLE = "offline"
 
 HA_DISCOVERY_PREFIX = "{}/light/{}/config"
+HA_SCENE_DISCOVERY_PREFIX = "{}/scene/dali_scene_{}/config"
+HA_NODE_DISCOVERY_PREFIX = "{}/light/{}/{}/config"
+HA_NODE_SCENE_DISCOVERY_PREFIX = "{}/scene/{}/dali_scene_{}/config"
 
 HA_STATUS_TOPIC = "{}/status"
 HA_STATUS_ONLINE = b"online"
 
+DALI_SHORT_ADDRESSES = 64
+DALI_SCENES = 16
+DALI_FADE_TIMES = 16
+DALI_MAX_LEVEL = 254
+DALI_MASK = 255
+DALI_FRAME_BURST = 4
+
+BUS_PRIORITY_STOP = -1
+BUS_PRIORITY_COMMAND = 0
+BUS_PRIORITY_QUERY = 1
+BUS_PRIORITY_SCAN = 2
+BUS_PRIORITY_POLL = 3
+
+POLL_MIN_INTERVAL = 2
+POLL_MAX_INTERVAL = 120
+
+METRICS_LATENCY_BUCKETS = [0.01, 0.02, 0.03, 0.05, 0.075, 0.1, 0.25, 0.5, 1]
+METRICS_SCAN_BUCKETS = [0.5, 1, 2.5, 5, 10, 30, 60, 120]
+
+TRACE_SLOWEST = 10
+TRACE_WINDOW = 1000
+TRACE_REPORT_INTERVAL = 60
+
+INVENTORY_SAVE_DELAY = 5
+
+SNAPSHOT_INTERVAL = 1
+
+LEASE_SETTLE_TIME = 2
+
+PUBLISH_PROGRESS_EVERY = 100
+PUBLISH_EARLY_DELIVERIES = 1024
+
+MQTT_MISC_INTERVAL = 1
+CONFIG_DEBOUNCE_TIME = 0.5
+HASSEB_HID_PATH = "/dev/dali/hasseb-*"
+TRIDONIC_HID_PATH = "/dev/dali/daliusb-*"
+
 MIN_HASSEB_FIRMWARE_VERSION = 2.3
 MIN_BACKOFF_TIME = 2
 MAX_BACKOFF_TIME = 10
@@ -1,27 +1,60 @@
 import argparse
+import asyncio
+import json
 import logging
 import random
-import re
+import threading
 import time
 import os
 
-import paho.mqtt.client as mqtt
-
 import dali.address as address
 import dali.gear.general as gear
 from dali.command import YesNoResponse
 from dali.exceptions import DALIError
+from slugify import slugify
 
+from dali2mqtt.aio import AsyncBus, MQTTSocketHooks
+from dali2mqtt.bus import BusWorker, CommandCoalescer, run_sequence
 from dali2mqtt.devicesnamesconfig import DevicesNamesConfig
-from dali2mqtt.lamp import Lamp
+from dali2mqtt.emulator import BusEmulator
+from dali2mqtt.inventory import LAMP_FIELDS, BusInventory
+from dali2mqtt.lamp import Lamp, fade_time_code
+from dali2mqtt.lease import BusLease
+from dali2mqtt.metrics import BridgeMetrics, start_metrics_server
+from dali2mqtt.monitor import BusMonitor
+from dali2mqtt.planner import plan_levels
+from dali2mqtt.poller import StatePoller
+from dali2mqtt.publisher import DedupClient
+from dali2mqtt.router import TopicRouter
+from dali2mqtt.snapshot import BusSnapshot
+from dali2mqtt.tracing import Tracer
+from dali2mqtt import tracing
+from dali2mqtt.scene import (
+    gen_ha_scene_config,
+    scene_object_id,
+    known_scenes,
+    recall_scene,
+    remove_scene,
+    store_scene,
+)
 from dali2mqtt.config import Config
 from dali2mqtt.consts import (
     ALL_SUPPORTED_LOG_LEVELS,
+    BUS_PRIORITY_COMMAND,
+    BUS_PRIORITY_QUERY,
+    BUS_PRIORITY_SCAN,
+    CONF_BUS_NAME,
     CONF_CONFIG,
+    CONFIG_BUS_KEYS,
+    CONFIG_LIVE_KEYS,
+    CONFIG_RECONNECT_KEYS,
+    CONF_DALI_DEVICE,
     CONF_DALI_DRIVER,
+    CONF_DALI_FRAME_RATE,
     CONF_DALI_LAMPS,
     CONF_DEVICES_NAMES_FILE,
     CONF_HA_DISCOVERY_PREFIX,
+    CONF_INVENTORY_FILE,
     CONF_LOG_COLOR,
     CONF_LOG_LEVEL,
     CONF_MQTT_BASE_TOPIC,
@@ -30,13 +63,26 @@ from dali2mqtt.consts import (
     CONF_MQTT_SERVER,
     CONF_MQTT_USERNAME,
     DALI_DRIVERS,
+    DALI_MAX_LEVEL,
+    DALI_SCENES,
+    DALI_SHORT_ADDRESSES,
+    DUMMY,
     DALI_SERVER,
     DEFAULT_CONFIG_FILE,
     DEFAULT_HA_DISCOVERY_PREFIX,
+    DEFAULT_LIGHT_SCHEMA,
+    DEFAULT_PUBLISH_QOS,
+    DEFAULT_PUBLISH_WINDOW,
     HA_DISCOVERY_PREFIX,
+    HA_NODE_DISCOVERY_PREFIX,
+    HA_NODE_SCENE_DISCOVERY_PREFIX,
+    HA_SCENE_DISCOVERY_PREFIX,
     HA_STATUS_TOPIC,
     HA_STATUS_ONLINE,
     HASSEB,
+    HASSEB_HID_PATH,
+    LIGHT_SCHEMA_DEFAULT,
+    LIGHT_SCHEMA_JSON,
     LOG_FORMAT,
     MAX_RETRIES,
     MIN_BACKOFF_TIME,
@@ -51,13 +97,25 @@ from dali2mqtt.consts import (
     MQTT_BRIGHTNESS_STATE_TOPIC,
     MQTT_COMMAND_TOPIC,
     MQTT_DALI2MQTT_STATUS,
+    MQTT_DIAGNOSTICS_LATENCY_TOPIC,
+    MQTT_JSON_COMMAND_TOPIC,
+    MQTT_JSON_STATE_TOPIC,
+    MQTT_LEASE_TOPIC,
     MQTT_NOT_AVAILABLE,
     MQTT_PAYLOAD_OFF,
     MQTT_PAYLOAD_ON,
     MQTT_SCAN_LAMPS_COMMAND_TOPIC,
+    MQTT_SCAN_LAMPS_RESULT_TOPIC,
+    MQTT_SCENE_RECALL_COMMAND_TOPIC,
+    MQTT_SCENE_REMOVE_COMMAND_TOPIC,
+    MQTT_SCENE_STORE_COMMAND_TOPIC,
+    MQTT_SNAPSHOT_TOPIC,
     MQTT_STATE_TOPIC,
     RED_COLOR,
+    RUNTIME_ASYNCIO,
+    RUNTIME_THREADS,
     TRIDONIC,
+    TRIDONIC_HID_PATH,
     YELLOW_COLOR,
 )
 
@@ -65,16 +123,26 @@ from dali2mqtt.consts import (
 logging.basicConfig(format=LOG_FORMAT, level=os.environ.get("LOGLEVEL", "INFO"))
 logger = logging.getLogger(__name__)
 
-
-def dali_scan(dali_driver):
-    """Scan a maximum number of dali devices."""
+# Retained topics of a lamp, besides its discovery, per light schema
+LAMP_STATE_TOPICS = {
+    LIGHT_SCHEMA_DEFAULT: (
+        MQTT_STATE_TOPIC,
+        MQTT_BRIGHTNESS_STATE_TOPIC,
+        MQTT_BRIGHTNESS_MAX_LEVEL_TOPIC,
+        MQTT_BRIGHTNESS_MIN_LEVEL_TOPIC,
+        MQTT_BRIGHTNESS_PHYSICAL_MINIMUM_LEVEL_TOPIC,
+    ),
+    LIGHT_SCHEMA_JSON: (MQTT_JSON_STATE_TOPIC,),
+}
+
+
+def dali_scan_sequence():
+    """Sequence scanning a maximum number of dali devices."""
     lamps = []
-    for lamp in range(0, 63):
+    for lamp in range(DALI_SHORT_ADDRESSES):
         try:
             logging.debug("Search for Lamp %s", lamp)
-            present = dali_driver.send(
-                gear.QueryControlGearPresent(address.Short(lamp))
-            )
+            present = yield gear.QueryControlGearPresent(address.Short(lamp))
             if isinstance(present, YesNoResponse) and present.value:
                 lamps.append(lamp)
                 logger.debug("Found lamp at address %d", lamp)
@@ -83,18 +151,23 @@ def dali_scan(dali_driver):
     return lamps
 
 
-def scan_groups(dali_driver, lamps):
-    """Scan for groups."""
+def dali_scan(dali_driver):
+    """Scan a maximum number of dali devices."""
+    return run_sequence(dali_driver, dali_scan_sequence())
+
+
+def scan_groups_sequence(lamps):
+    """Sequence scanning for groups."""
     logger.info("Scanning for groups")
     groups = {}
     for lamp in lamps:
         try:
             logging.debug("Search for groups for Lamp {}".format(lamp))
-            group1 = dali_driver.send(
-                gear.QueryGroupsZeroToSeven(address.Short(lamp))
+            group1 = (
+                yield gear.QueryGroupsZeroToSeven(address.Short(lamp))
             ).value.as_integer
-            group2 = dali_driver.send(
-                gear.QueryGroupsEightToFifteen(address.Short(lamp))
+            group2 = (
+                yield gear.QueryGroupsEightToFifteen(address.Short(lamp))
             ).value.as_integer
 
             #            logger.debug("Group 0-7: %d", group1)
@@ -124,225 +197,861 @@ def scan_groups(dali_driver, lamps):
     return groups
 
 
-def initialize_lamps(data_object, client):
-    """Initialize all lamps and groups."""
+def scan_groups(dali_driver, lamps):
+    """Scan for groups."""
+    return run_sequence(dali_driver, scan_groups_sequence(lamps))
 
-    driver = data_object["driver"]
-    mqtt_base_topic = data_object["base_topic"]
-    ha_prefix = data_object["ha_prefix"]
-    log_level = data_object["log_level"]
-    devices_names_config = data_object["devices_names_config"]
-    devices_names_config.load_devices_names_file()
-    lamps = dali_scan(driver)
-    logger.info(
-        "Found %d lamps",
-        len(lamps),
-    )
 
-    def create_mqtt_lamp(address, name):
-        try:
-            lamp_object = Lamp(
-                log_level,
-                driver,
-                name,
-                address,
-            )
+def discovery_topic(data_object, name):
+    """Return the Home Assistant discovery topic of a lamp of a bus."""
+    if data_object["bus_name"]:
+        name = f"{data_object['bus_name']}_{name}"
+    if data_object["instance"]:
+        return HA_NODE_DISCOVERY_PREFIX.format(
+            data_object["ha_prefix"], data_object["instance"], name
+        )
+    return HA_DISCOVERY_PREFIX.format(data_object["ha_prefix"], name)
 
-            data_object["all_lamps"][name] = lamp_object
 
-            mqtt_data = [
-                (
-                    HA_DISCOVERY_PREFIX.format(ha_prefix, name),
-                    lamp_object.gen_ha_config(mqtt_base_topic),
-                    True,
-                ),
-                (
-                    MQTT_BRIGHTNESS_STATE_TOPIC.format(mqtt_base_topic, name),
-                    lamp_object.level,
-                    False,
-                ),
-                (
-                    MQTT_BRIGHTNESS_MAX_LEVEL_TOPIC.format(mqtt_base_topic, name),
-                    lamp_object.max_level,
-                    True,
-                ),
-                (
-                    MQTT_BRIGHTNESS_MIN_LEVEL_TOPIC.format(mqtt_base_topic, name),
-                    lamp_object.min_level,
-                    True,
-                ),
-                (
-                    MQTT_BRIGHTNESS_PHYSICAL_MINIMUM_LEVEL_TOPIC.format(
-                        mqtt_base_topic, name
-                    ),
-                    lamp_object.min_physical_level,
-                    True,
-                ),
+def scene_discovery_topic(data_object, scene):
+    """Return the Home Assistant discovery topic of a scene of a bus."""
+    object_id = scene_object_id(scene, data_object["bus_name"])
+    if data_object["instance"]:
+        return HA_NODE_SCENE_DISCOVERY_PREFIX.format(
+            data_object["ha_prefix"], data_object["instance"], object_id
+        )
+    return HA_SCENE_DISCOVERY_PREFIX.format(data_object["ha_prefix"], object_id)
+
+
+def publish_lamp(client, data_object, lamp_object):
+    """Publish discovery, limits and state of a lamp."""
+    mqtt_base_topic = data_object["base_topic"]
+    name = lamp_object.device_name
+    ha_config = lamp_object.gen_ha_config(
+        mqtt_base_topic,
+        data_object["bus_name"],
+        data_object["availability_topic"],
+        data_object["light_schema"],
+    )
+    if data_object["light_schema"] == LIGHT_SCHEMA_JSON:
+        mqtt_data = [
+            (discovery_topic(data_object, name), ha_config, True),
+            (
+                MQTT_JSON_STATE_TOPIC.format(mqtt_base_topic, name),
+                lamp_object.json_state() if lamp_object.level is not None else None,
+                True,
+            ),
+        ]
+    else:
+        mqtt_data = [
+            (discovery_topic(data_object, name), ha_config, True),
+            (
+                MQTT_BRIGHTNESS_STATE_TOPIC.format(mqtt_base_topic, name),
+                lamp_object.level,
+                False,
+            ),
+            (
+                MQTT_BRIGHTNESS_MAX_LEVEL_TOPIC.format(mqtt_base_topic, name),
+                lamp_object.max_level,
+                True,
+            ),
+            (
+                MQTT_BRIGHTNESS_MIN_LEVEL_TOPIC.format(mqtt_base_topic, name),
+                lamp_object.min_level,
+                True,
+            ),
+            (
+                MQTT_BRIGHTNESS_PHYSICAL_MINIMUM_LEVEL_TOPIC.format(mqtt_base_topic, name),
+                lamp_object.min_physical_level,
+                True,
+            ),
+        ]
+        if lamp_object.level is not None:
+            mqtt_data.append(
                 (
                     MQTT_STATE_TOPIC.format(mqtt_base_topic, name),
                     MQTT_PAYLOAD_ON if lamp_object.level > 0 else MQTT_PAYLOAD_OFF,
                     False,
-                ),
-            ]
-            for topic, payload, retain in mqtt_data:
-                client.publish(topic, payload, retain)
+                )
+            )
+    for topic, payload, retain in mqtt_data:
+        # Values not read yet are published once they are known
+        if payload is not None:
+            client.publish(topic, payload, retain=retain)
+    note_lamp(data_object, lamp_object)
+
+    logger.info(lamp_object)
+
+
+def publish_lamp_state(client, data_object, lamp_object, retain=False):
+    """Publish state and brightness of a lamp."""
+    if lamp_object.level is None:
+        return
+    note_lamp(data_object, lamp_object)
+    if data_object["light_schema"] == LIGHT_SCHEMA_JSON:
+        # the only copy of the limits, always retained
+        client.publish(
+            MQTT_JSON_STATE_TOPIC.format(
+                data_object["base_topic"], lamp_object.device_name
+            ),
+            lamp_object.json_state(),
+            retain=True,
+        )
+        return
+    client.publish(
+        MQTT_STATE_TOPIC.format(data_object["base_topic"], lamp_object.device_name),
+        MQTT_PAYLOAD_ON if lamp_object.level != 0 else MQTT_PAYLOAD_OFF,
+        retain=False,
+    )
+    client.publish(
+        MQTT_BRIGHTNESS_STATE_TOPIC.format(
+            data_object["base_topic"], lamp_object.device_name
+        ),
+        lamp_object.level,
+        retain=retain,
+    )
 
-            logger.info(lamp_object)
 
-        except DALIError as err:
-            logger.error("While initializing <%s> @ %s: %s", name, address, err)
+def note_lamp(data_object, lamp_object, failed=False):
+    """Record the state of a lamp, or that it failed, in the snapshot and inventory."""
+    snapshot = data_object.get("snapshot")
+    inventory = data_object.get("inventory")
+    if not failed and inventory is not None and lamp_object.level is not None:
+        inventory.update_level(lamp_object)
+    if snapshot is None:
+        return
+    if failed:
+        snapshot.fault(lamp_object)
+    else:
+        snapshot.update(lamp_object)
+
+
+def register_lamp(data_object, lamp_object):
+    """Add (or replace) a lamp and route its command topics."""
+    data_object["all_lamps"][lamp_object.device_name] = lamp_object
+    data_object["router"].rebuild(data_object["all_lamps"])
+
+
+def retire_lamp(client, data_object, name):
+    """Forget a lamp that left the bus and clear its retained topics."""
+    lamp_object = data_object["all_lamps"].pop(name, None)
+    if lamp_object is not None and data_object.get("snapshot") is not None:
+        data_object["snapshot"].remove(lamp_object)
+    data_object["router"].rebuild(data_object["all_lamps"])
+    mqtt_base_topic = data_object["base_topic"]
+    client.publish(discovery_topic(data_object, name), "", retain=True)
+    for template in LAMP_STATE_TOPICS[data_object["light_schema"]]:
+        client.publish(template.format(mqtt_base_topic, name), "", retain=True)
+    logger.info("Retired <%s>", name)
+
+
+def rename_lamps(client, data_object, addresses):
+    """Republish the lamps renamed in the devices names, without bus traffic.
+
+    The retained topics of the old name are cleared and the commands of
+    the new one routed, the values already known are published again.
+    """
+    devices_names_config = data_object["devices_names_config"]
+    known = known_lamps(data_object)
+    for number in sorted(addresses):
+        lamp_object = known.get(number)
+        if lamp_object is None:
+            continue
+        name = devices_names_config.get_friendly_name(number)
+        if name == lamp_object.friendly_name:
+            continue
+        old_name = lamp_object.device_name
+        if slugify(name) != old_name:
+            if slugify(name) in data_object["all_lamps"]:
+                logger.error("Can't rename <%s> to <%s>, name taken", old_name, name)
+                continue
+            retire_lamp(client, data_object, old_name)
+        lamp_object.rename(name)
+        register_lamp(data_object, lamp_object)
+        publish_lamp(client, data_object, lamp_object)
+        logger.info("Renamed <%s> to <%s>", old_name, lamp_object.device_name)
+
+
+def publish_scenes(client, data_object):
+    """Publish discovery of every scene stored in the lamps."""
+    for scene in known_scenes(data_object["all_lamps"]):
+        client.publish(
+            scene_discovery_topic(data_object, scene),
+            gen_ha_scene_config(
+                scene,
+                data_object["model"],
+                data_object["base_topic"],
+                data_object["bus_name"],
+                data_object["availability_topic"],
+            ),
+            retain=True,
+        )
+
+
+def new_lamp(data_object, lamp_address, name):
+    """Create a lamp whose values are still to be read from the ballast."""
+    lamp_object = Lamp(
+        data_object["log_level"],
+        data_object["model"],
+        name,
+        lamp_address,
+    )
+    if not lamp_object.is_group:
+        cached = data_object["inventory"].lamps.get(lamp_object.number, {})
+        lamp_object.scenes = dict(cached.get("scenes") or {})
+    return lamp_object
+
+
+def read_lamp(lamp_object):
+    """Sequence reading the values of a lamp, returning False on failure."""
+    try:
+        yield from lamp_object.query_values()
+    except DALIError as err:
+        logger.error(
+            "While initializing <%s> @ %s: %s",
+            lamp_object.friendly_name,
+            lamp_object.short_address,
+            err,
+        )
+        return False
+    return True
 
-    for lamp in lamps:
-        short_address = address.Short(lamp)
 
-        create_mqtt_lamp(
-            short_address,
-            devices_names_config.get_friendly_name(short_address.address),
+def query_lamp(data_object, lamp_address, name):
+    """Sequence creating a lamp from the values read from the ballast."""
+    lamp_object = new_lamp(data_object, lamp_address, name)
+    if not (yield from read_lamp(lamp_object)):
+        return None
+    return lamp_object
+
+
+def observe_scan(data_object, kind, started):
+    """Record the duration of a scan in the metrics, if enabled."""
+    if data_object.get("metrics") is not None:
+        data_object["metrics"].observe_scan(kind, time.monotonic() - started)
+
+
+def known_lamps(data_object, groups=False):
+    """Return the lamps (or groups) already known, indexed by number."""
+    return {
+        lamp_object.number: lamp_object
+        for lamp_object in list(data_object["all_lamps"].values())
+        if lamp_object.is_group == groups
+    }
+
+
+def initialize_lamps(data_object, client):
+    """Initialize all lamps and groups, returning the future of the bus scan.
+
+    Lamps already known are only published again, from their live state.
+    Lamps cached in the inventory are published at once and verified in
+    the background, that verification republishing what it corrects. In
+    both cases nothing is left to wait for and None is returned.
+    """
+    if data_object["all_lamps"]:
+        logger.info("Publishing %d known lamps", len(data_object["all_lamps"]))
+        for lamp_object in list(data_object["all_lamps"].values()):
+            publish_lamp(client, data_object, lamp_object)
+        publish_scenes(client, data_object)
+        return None
+
+    devices_names_config = data_object["devices_names_config"]
+    devices_names_config.load_devices_names_file()
+    inventory = data_object["inventory"]
+
+    if inventory.is_empty():
+        return data_object["bus"].submit(
+            BUS_PRIORITY_SCAN, scan_lamps(data_object, client)
         )
 
-    groups = scan_groups(driver, lamps)
+    logger.info("Publishing %d lamps from bus inventory", len(inventory.lamps))
+    cached_lamps = [
+        (address.Short(lamp), devices_names_config.get_friendly_name(lamp), entry)
+        for lamp, entry in inventory.lamps.items()
+    ] + [
+        (address.Group(group), f"group_{group}", entry)
+        for group, entry in inventory.groups.items()
+    ]
+    for lamp_address, name, entry in cached_lamps:
+        lamp_object = Lamp(
+            data_object["log_level"],
+            data_object["model"],
+            name,
+            lamp_address,
+            scenes=entry.get("scenes"),
+            **{field: entry.get(field) for field in LAMP_FIELDS},
+        )
+        register_lamp(data_object, lamp_object)
+        publish_lamp(client, data_object, lamp_object)
+    data_object["groups"] = inventory.lamp_groups()
+    publish_scenes(client, data_object)
+
+    data_object["bus"].submit(BUS_PRIORITY_SCAN, verify_inventory(data_object, client))
+    return None
+
+
+def scan_lamps(data_object, client):
+    """Sequence scanning the whole bus and publishing every lamp and group."""
+    started = time.monotonic()
+    devices_names_config = data_object["devices_names_config"]
+    inventory = data_object["inventory"]
+
+    lamps = yield from dali_scan_sequence()
+    logger.info(
+        "Found %d lamps",
+        len(lamps),
+    )
+
+    # Announce every lamp first, their values follow as they are read
+    lamp_objects = [
+        new_lamp(
+            data_object, address.Short(lamp), devices_names_config.get_friendly_name(lamp)
+        )
+        for lamp in lamps
+    ]
+    for lamp_object in lamp_objects:
+        register_lamp(data_object, lamp_object)
+        publish_lamp(client, data_object, lamp_object)
+    for lamp_object in lamp_objects:
+        if (yield from read_lamp(lamp_object)):
+            publish_lamp(client, data_object, lamp_object)
+
+    groups = yield from scan_groups_sequence(lamps)
     for group in groups:
         logger.debug("Publishing group %d", group)
 
-        group_address = address.Group(int(group))
-
-        create_mqtt_lamp(group_address, f"group_{group}")
+        name = f"group_{group}"
+        lamp_object = yield from query_lamp(data_object, address.Group(group), name)
+        if lamp_object is not None:
+            register_lamp(data_object, lamp_object)
+            publish_lamp(client, data_object, lamp_object)
+    data_object["groups"] = groups
 
     if devices_names_config.is_devices_file_empty():
         devices_names_config.save_devices_names_file(data_object["all_lamps"])
+    inventory.update(data_object["all_lamps"], groups)
+    inventory.save_inventory_file()
+    publish_scenes(client, data_object)
+    observe_scan(data_object, "full", started)
     logger.info("initialize_lamps finished")
 
 
-def on_detect_changes_in_config(mqtt_client):
-    """Callback when changes are detected in the configuration file."""
-    logger.info("Reconnecting to server")
-    mqtt_client.disconnect()
+def verify_inventory(data_object, client):
+    """Sequence checking the cached inventory against the bus.
+
+    Only the entries that turn out to be wrong are updated and republished.
+    """
+    started = time.monotonic()
+    devices_names_config = data_object["devices_names_config"]
+    inventory = data_object["inventory"]
+    logger.info("Verifying bus inventory")
+
+    lamps = yield from dali_scan_sequence()
+    groups = yield from scan_groups_sequence(lamps)
+
+    changed = False
+    cached_lamps = known_lamps(data_object)
+    for lamp in set(inventory.lamps) - set(lamps):
+        logger.warning("Cached lamp @ %d is no longer on the bus", lamp)
+        if lamp in cached_lamps:
+            retire_lamp(client, data_object, cached_lamps[lamp].device_name)
+        changed = True
+
+    def verify(lamp_address, name, entry):
+        lamp_object = yield from query_lamp(data_object, lamp_address, name)
+        if lamp_object is None:
+            return False
+        if entry is not None and all(
+            getattr(lamp_object, field) == entry.get(field) for field in LAMP_FIELDS
+        ):
+            return False
+        logger.info("Updating cached <%s> @ %s", name, lamp_address)
+        register_lamp(data_object, lamp_object)
+        publish_lamp(client, data_object, lamp_object)
+        return True
+
+    for lamp in lamps:
+        entry = inventory.lamps.get(lamp)
+        if entry is not None and sorted(entry.get("groups", [])) != sorted(
+            group for group, members in groups.items() if lamp in members
+        ):
+            changed = True
+        changed |= yield from verify(
+            address.Short(lamp), devices_names_config.get_friendly_name(lamp), entry
+        )
+
+    cached_groups = known_lamps(data_object, groups=True)
+    for group in set(inventory.groups) - set(groups):
+        if group in cached_groups:
+            retire_lamp(client, data_object, cached_groups[group].device_name)
+        changed = True
+    for group in groups:
+        changed |= yield from verify(
+            address.Group(group), f"group_{group}", inventory.groups.get(group)
+        )
+    data_object["groups"] = groups
+
+    if changed:
+        inventory.update(data_object["all_lamps"], groups)
+        inventory.save_inventory_file()
+    observe_scan(data_object, "verify", started)
+    logger.info("Bus inventory verified, %s", "updated" if changed else "unchanged")
+
+
+def rescan_lamps(mqtt_client, data_object):
+    """Sequence rescanning the bus against the lamps already known.
+
+    Lamp objects are only built for new addresses, lamps that left the bus
+    are retired, and only the topics whose values changed are published.
+    """
+    started = time.monotonic()
+    devices_names_config = data_object["devices_names_config"]
+    known = known_lamps(data_object)
+    known_groups = known_lamps(data_object, groups=True)
+    summary = {"added": [], "removed": [], "changed": []}
+
+    lamps = yield from dali_scan_sequence()
+    groups = yield from scan_groups_sequence(lamps)
 
+    for number in sorted(set(known) - set(lamps)):
+        retire_lamp(mqtt_client, data_object, known[number].device_name)
+        summary["removed"].append(known[number].device_name)
+    for number in sorted(set(known_groups) - set(groups)):
+        retire_lamp(mqtt_client, data_object, known_groups[number].device_name)
+        summary["removed"].append(known_groups[number].device_name)
 
-def on_message_ha_online(mqtt_client, data_object, msg):
+    for lamp in lamps:
+        if lamp in known:
+            lamp_object = known[lamp]
+            level = lamp_object.level
+            try:
+                yield from lamp_object.actual_level()
+            except DALIError as err:
+                logger.error(
+                    "While rescanning <%s> @ %d: %s", lamp_object.device_name, lamp, err
+                )
+                continue
+            if lamp_object.level != level:
+                publish_lamp_state(mqtt_client, data_object, lamp_object)
+                summary["changed"].append(lamp_object.device_name)
+            continue
+        name = devices_names_config.get_friendly_name(lamp)
+        lamp_object = yield from query_lamp(data_object, address.Short(lamp), name)
+        if lamp_object is not None:
+            register_lamp(data_object, lamp_object)
+            publish_lamp(mqtt_client, data_object, lamp_object)
+            summary["added"].append(lamp_object.device_name)
+
+    for group, members in groups.items():
+        if group in known_groups:
+            if sorted(members) != sorted(data_object["groups"].get(group, [])):
+                summary["changed"].append(known_groups[group].device_name)
+            continue
+        name = f"group_{group}"
+        lamp_object = yield from query_lamp(data_object, address.Group(group), name)
+        if lamp_object is not None:
+            register_lamp(data_object, lamp_object)
+            publish_lamp(mqtt_client, data_object, lamp_object)
+            summary["added"].append(lamp_object.device_name)
+    data_object["groups"] = groups
+
+    if any(summary.values()):
+        data_object["inventory"].update(data_object["all_lamps"], groups)
+        data_object["inventory"].save_inventory_file()
+    observe_scan(data_object, "rescan", started)
+    logger.info(
+        "Rescan finished: %d added, %d removed, %d changed",
+        len(summary["added"]),
+        len(summary["removed"]),
+        len(summary["changed"]),
+    )
+    mqtt_client.publish(
+        MQTT_SCAN_LAMPS_RESULT_TOPIC.format(data_object["base_topic"]),
+        json.dumps(summary),
+        retain=False,
+    )
+    return summary
+
+
+def apply_fade(data_object, lamp_object, fade_time):
+    """Sequence setting the fade time of a lamp, or of the members of a group.
+
+    None restores the fade time each gear had before dali2mqtt changed it.
+    """
+    if not lamp_object.is_group:
+        yield from lamp_object.fade_to(fade_time)
+        return
+    lamps = known_lamps(data_object)
+    members = [
+        lamps[member]
+        for member in data_object["groups"].get(lamp_object.number, [])
+        if member in lamps
+    ]
+    if fade_time is None:
+        for member in members:
+            yield from member.fade_to(None)
+        return
+    for member in members:
+        if member.default_fade_time is None:
+            yield from member.read_fade_time()
+    if members and all(member.fade_time == fade_time for member in members):
+        return
+    yield [gear.DTR0(fade_time), gear.SetFadeTime(lamp_object.short_address)]
+    for member in members:
+        member.fade_time = fade_time
+
+
+def set_lamp_level(
+    mqtt_client, data_object, lamp_object, level, trace=None, fade_time=None
+):
+    """Sequence setting the brightness of a lamp and publishing its state.
+
+    A fade_time code makes the gear fade to the level (or off) in that time.
+    """
+    try:
+        yield from apply_fade(data_object, lamp_object, fade_time)
+        # 0 in DALI is turn off
+        yield from lamp_object.set_level(level, fade=bool(fade_time))
+    except ValueError as err:
+        logger.error(
+            "Can't convert <%s> to integer %s..%s: %s",
+            level,
+            lamp_object.min_level,
+            lamp_object.max_level,
+            err,
+        )
+        tracing.finish(trace, "failed")
+        return
+    except DALIError as err:
+        logger.error(
+            "Failed to set light <%s> to %s: %s", lamp_object.device_name, level, err
+        )
+        note_lamp(data_object, lamp_object, failed=True)
+        tracing.finish(trace, "failed")
+        return
+    tracing.mark(trace, "sent")
+    members = lamp_members(data_object, lamp_object)
+    if lamp_object.is_group and members:
+        publish_levels(mqtt_client, data_object, members, lamp_object.level)
+    else:
+        publish_lamp_state(mqtt_client, data_object, lamp_object, retain=True)
+    tracing.finish(trace)
+
+
+def set_lamp_levels(mqtt_client, data_object, batch):
+    """Sequence committing the newest pending level of each lamp.
+
+    Lamps sharing a level are folded into group or broadcast frames when
+    they cover the exact members of a group or the whole bus. Each command
+    is (lamp, level, trace, fade time code or None), lamps given a fade
+    time are set one by one, in arrival order with the others.
+    """
+    for _, _, trace, _ in batch.values():
+        tracing.mark(trace, "bus")
+
+    pending = {}
+    for lamp_object, level, trace, fade_time in batch.values():
+        if lamp_object.is_group or fade_time is not None:
+            # commit the earlier commands to the same lamps first
+            if lamp_members(data_object, lamp_object) & set(pending):
+                yield from commit_levels(mqtt_client, data_object, pending)
+                pending = {}
+            yield from set_lamp_level(
+                mqtt_client, data_object, lamp_object, level, trace, fade_time
+            )
+            continue
+        try:
+            yield from lamp_object.ensure_limits()
+            yield from lamp_object.fade_to(None)
+        except DALIError as err:
+            logger.error("Failed to read limits of <%s>: %s", lamp_object.device_name, err)
+            note_lamp(data_object, lamp_object, failed=True)
+            tracing.finish(trace, "failed")
+            continue
+        if not lamp_object.valid_level(level):
+            logger.error(
+                "Can't convert <%s> to integer %s..%s",
+                level,
+                lamp_object.min_level,
+                lamp_object.max_level,
+            )
+            tracing.finish(trace, "failed")
+        else:
+            pending[lamp_object.number] = (lamp_object, level, trace)
+    yield from commit_levels(mqtt_client, data_object, pending)
+
+
+def lamp_members(data_object, lamp_object):
+    """Return the short addresses of the lamps a lamp or group drives."""
+    if lamp_object.is_group:
+        return set(data_object["groups"].get(lamp_object.number, []))
+    return {lamp_object.number}
+
+
+def commit_levels(mqtt_client, data_object, pending):
+    """Sequence setting the levels pending per short address, in few frames."""
+    for target, level, members in plan_levels(
+        {number: level for number, (_, level, _) in pending.items()},
+        data_object["groups"],
+        list(known_lamps(data_object)),
+    ):
+        if len(members) == 1 and isinstance(target, address.Short):
+            lamp_object, level, trace = pending[members[0]]
+            yield from set_lamp_level(
+                mqtt_client, data_object, lamp_object, level, trace
+            )
+            continue
+        try:
+            yield gear.Off(target) if level == 0 else gear.DAPC(target, level)
+        except DALIError as err:
+            logger.error("Failed to set %s to %s: %s", target, level, err)
+            for member in members:
+                note_lamp(data_object, pending[member][0], failed=True)
+                tracing.finish(pending[member][2], "failed")
+            continue
+        logger.debug("Set %d lamps with one frame to %s: %s", len(members), target, level)
+        for member in members:
+            tracing.mark(pending[member][2], "sent")
+        publish_levels(mqtt_client, data_object, members, level)
+        for member in members:
+            tracing.finish(pending[member][2])
+
+
+def publish_levels(mqtt_client, data_object, members, level):
+    """Record a level set on some lamps at once, publishing them.
+
+    The groups whose members all took the level are published too.
+    """
+    for member, lamp_object in known_lamps(data_object).items():
+        if member in members:
+            lamp_object.level = level
+            publish_lamp_state(mqtt_client, data_object, lamp_object, retain=True)
+    for group, lamp_object in known_lamps(data_object, groups=True).items():
+        group_members = data_object["groups"].get(group)
+        if group_members and set(group_members) <= set(members):
+            lamp_object.level = level
+            publish_lamp_state(mqtt_client, data_object, lamp_object, retain=True)
+
+
+def get_lamp_level(mqtt_client, data_object, lamp_object, trace=None):
+    """Sequence reading the brightness of a lamp and publishing its state."""
+    tracing.mark(trace, "bus")
+    try:
+        yield from lamp_object.actual_level()
+        logger.debug(
+            "Get light <%s> results in %s", lamp_object.device_name, lamp_object.level
+        )
+    except DALIError as err:
+        logger.error("Failed to get light <%s> level: %s", lamp_object.device_name, err)
+        note_lamp(data_object, lamp_object, failed=True)
+        tracing.finish(trace, "failed")
+        return
+    tracing.mark(trace, "sent")
+    publish_lamp_state(mqtt_client, data_object, lamp_object)
+    tracing.finish(trace)
+
+
+def scene_command(mqtt_client, data_object, scene, action):
+    """Sequence storing, recalling or removing a scene on the whole bus."""
+    all_lamps = data_object["all_lamps"]
+    try:
+        if action == "store":
+            yield from store_scene(all_lamps, scene)
+        elif action == "recall":
+            changed = yield from recall_scene(all_lamps, scene)
+            for lamp_object in changed:
+                publish_lamp_state(mqtt_client, data_object, lamp_object, retain=True)
+            return
+        else:
+            yield from remove_scene(all_lamps, scene)
+            mqtt_client.publish(
+                scene_discovery_topic(data_object, scene), "", retain=True
+            )
+    except DALIError as err:
+        logger.error("Failed to %s scene %d: %s", action, scene, err)
+        return
+    publish_scenes(mqtt_client, data_object)
+    data_object["inventory"].update(all_lamps, data_object["groups"])
+    data_object["inventory"].save_inventory_file()
+
+
+def apply_log_level(log_level):
+    """Set the level of the loggers of every module, while running."""
+    level = ALL_SUPPORTED_LOG_LEVELS[log_level]
+    logger.setLevel(level)
+    for name, module_logger in list(logging.root.manager.loggerDict.items()):
+        if name.startswith("dali2mqtt") and isinstance(module_logger, logging.Logger):
+            module_logger.setLevel(level)
+
+
+def on_detect_changes_in_config(mqtt_client, config, changes, rebuild=None):
+    """Callback when changes are detected in the configuration file.
+
+    The log level and publish settings apply live. Broker, credential and
+    topic changes reconnect to the server, driver changes also set rebuild
+    so the buses are created again once disconnected. Anything else takes
+    effect on restart.
+    """
+    logger.info("Configuration changed: %s", ", ".join(sorted(changes)))
+    if CONF_LOG_LEVEL in changes:
+        apply_log_level(config.log_level)
+    restart = changes - CONFIG_LIVE_KEYS - CONFIG_RECONNECT_KEYS - CONFIG_BUS_KEYS
+    if restart:
+        logger.warning("Restart to apply the changes of %s", ", ".join(sorted(restart)))
+    driver_changed = bool(changes & CONFIG_BUS_KEYS) and rebuild is not None
+    if driver_changed:
+        rebuild.set()
+    if mqtt_client is None:
+        return
+    mqtt_client.bulk_window = config.publish_window
+    mqtt_client.bulk_qos = config.publish_qos
+    if driver_changed or changes & CONFIG_RECONNECT_KEYS:
+        logger.info("Reconnecting to server")
+        mqtt_client.disconnect()
+
+
+def on_message_ha_online(mqtt_client, data_objects, msg):
     """Callback on Home Assistant online message."""
     if HA_STATUS_ONLINE in msg.payload:
         logger.info("Home Assistant online on %s: %s", msg.topic, msg.payload)
-        initialize_lamps(data_object, mqtt_client)
+        # Home Assistant lost everything not retained, publish it all again
+        mqtt_client.publish_cache.clear()
+        initialize_buses(
+            mqtt_client,
+            [data_object for data_object in data_objects if owns_bus(data_object)],
+        )
+
+
+def on_message_lease(mqtt_client, data_object, msg):  # pylint: disable=W0613
+    """Callback on the lease of a bus."""
+    data_object["lease"].on_lease(data_object["base_topic"], msg.payload)
+
 
+def on_message_lamp_cmd(mqtt_client, data_object, msg):
+    """Callback on MQTT command message for a lamp, routed by exact topic."""
+    route = data_object["router"].resolve(msg.topic)
+    if route is None:
+        logger.error("Lamp for %s doesn't exists", msg.topic)
+        return
+    lamp_object, action = route
+    action(mqtt_client, data_object, msg, lamp_object)
 
-def on_message_cmd(mqtt_client, data_object, msg):
-    """Callback on MQTT command message."""
+
+def start_trace(data_object, kind, msg):
+    """Start tracing a command, if tracing is enabled."""
+    if data_object.get("tracer") is None:
+        return None
+    return data_object["tracer"].start(kind, msg)
+
+
+def on_message_cmd(mqtt_client, data_object, msg, lamp_object):
+    """Handle MQTT command message."""
     logger.debug("Command on %s: %s", msg.topic, msg.payload)
-    light = re.search(
-        MQTT_COMMAND_TOPIC.format(data_object["base_topic"], "(.+?)"), msg.topic
-    ).group(1)
     if msg.payload == MQTT_PAYLOAD_OFF:
-        try:
-            lamp_object = data_object["all_lamps"][light]
-            logger.debug("Set light <%s> to %s", light, msg.payload)
-            lamp_object.off()
-            mqtt_client.publish(
-                MQTT_STATE_TOPIC.format(data_object["base_topic"], light),
-                MQTT_PAYLOAD_OFF,
-                retain=True,
-            )
-        except DALIError as err:
-            logger.error("Failed to set light <%s> to OFF: %s", light, err)
-        except KeyError:
-            logger.error("Lamp %s doesn't exists", light)
+        logger.debug("Set light <%s> to %s", lamp_object.device_name, msg.payload)
+        trace = start_trace(data_object, "switch", msg)
+        data_object["coalescer"].push(
+            str(lamp_object.short_address), (lamp_object, 0, trace, None)
+        )
+        tracing.mark(trace, "queued")
 
 
 def on_message_reinitialize_lamps_cmd(mqtt_client, data_object, msg):
     """Callback on MQTT scan lamps command message."""
     logger.debug("Reinitialize Command on %s", msg.topic)
-    initialize_lamps(data_object, mqtt_client)
+    data_object["devices_names_config"].load_devices_names_file()
+    bulk = mqtt_client.bulk()
+    bulk.close_after(
+        [data_object["bus"].submit(BUS_PRIORITY_SCAN, rescan_lamps(bulk, data_object))]
+    )
 
 
-def get_lamp_object(data_object, light):
-    """Retrieve lamp object from data object."""
-    if "group_" in light:
-        """Check if the comand is for a dali group"""
-        group = int(re.search(r"group_(\d+)", light).group(1))
-        lamp_object = data_object["all_lamps"][group]
-    else:
-        """The command is for a single lamp"""
-        if light not in data_object["all_lamps"]:
-            raise KeyError
-        lamp_object = data_object["all_lamps"][light]
-    return lamp_object
+def on_message_scene_cmd(mqtt_client, data_object, msg):
+    """Callback on MQTT scene command message."""
+    logger.debug("Scene Command on %s: %s", msg.topic, msg.payload)
+    _, scene, action = msg.topic[len(data_object["base_topic"]) + 1:].split("/")
+    try:
+        scene = int(scene)
+        if not 0 <= scene < DALI_SCENES:
+            raise ValueError
+    except ValueError:
+        logger.error("Scene %s doesn't exists, use 0..%d", scene, DALI_SCENES - 1)
+        return
+    data_object["bus"].submit(
+        BUS_PRIORITY_COMMAND, scene_command(mqtt_client, data_object, scene, action)
+    )
 
 
-def on_message_brightness_cmd(mqtt_client, data_object, msg):
-    """Callback on MQTT brightness command message."""
+def on_message_brightness_cmd(mqtt_client, data_object, msg, lamp_object):
+    """Handle MQTT brightness command message."""
     logger.debug("Brightness Command on %s: %s", msg.topic, msg.payload)
-    light = re.search(
-        MQTT_BRIGHTNESS_COMMAND_TOPIC.format(data_object["base_topic"], "(.+?)"),
-        msg.topic,
-    ).group(1)
     try:
-        lamp_object = get_lamp_object(data_object, light)
-
-        try:
-            lamp_object.level = int(msg.payload.decode("utf-8"))
-            if lamp_object.level == 0:
-                # 0 in DALI is turn off with fade out
-                lamp_object.off()
-                logger.debug("Set light <%s> to OFF", light)
-
-            mqtt_client.publish(
-                MQTT_STATE_TOPIC.format(data_object["base_topic"], light),
-                MQTT_PAYLOAD_ON if lamp_object.level != 0 else MQTT_PAYLOAD_OFF,
-                retain=False,
-            )
-            mqtt_client.publish(
-                MQTT_BRIGHTNESS_STATE_TOPIC.format(data_object["base_topic"], light),
-                lamp_object.level,
-                retain=True,
-            )
-        except ValueError as err:
-            logger.error(
-                "Can't convert <%s> to integer %d..%d: %s",
-                msg.payload.decode("utf-8"),
-                lamp_object.min_level,
-                lamp_object.max_level,
-                err,
-            )
-    except KeyError:
-        logger.error("Lamp %s doesn't exists", light)
+        level = int(msg.payload.decode("utf-8"))
+        trace = start_trace(data_object, "brightness", msg)
+        data_object["coalescer"].push(
+            str(lamp_object.short_address), (lamp_object, level, trace, None)
+        )
+        tracing.mark(trace, "queued")
+    except ValueError as err:
+        logger.error(
+            "Can't convert <%s> to integer %s..%s: %s",
+            msg.payload.decode("utf-8"),
+            lamp_object.min_level,
+            lamp_object.max_level,
+            err,
+        )
 
 
-def on_message_brightness_get_cmd(mqtt_client, data_object, msg):
-    """Callback on MQTT brightness get command message."""
+def on_message_brightness_get_cmd(mqtt_client, data_object, msg, lamp_object):
+    """Handle MQTT brightness get command message."""
     logger.debug("Brightness Get Command on %s: %s", msg.topic, msg.payload)
-    light = re.search(
-        MQTT_BRIGHTNESS_GET_COMMAND_TOPIC.format(data_object["base_topic"], "(.+?)"),
-        msg.topic,
-    ).group(1)
-    try:
-        lamp_object = get_lamp_object(data_object, light)
+    trace = start_trace(data_object, "brightness_get", msg)
+    data_object["bus"].submit(
+        BUS_PRIORITY_QUERY,
+        get_lamp_level(mqtt_client, data_object, lamp_object, trace),
+    )
+    tracing.mark(trace, "queued")
 
-        try:
-            lamp_object.actual_level()
-            logger.debug("Get light <%s> results in %d", light, lamp_object.level)
 
-            mqtt_client.publish(
-                MQTT_BRIGHTNESS_STATE_TOPIC.format(data_object["base_topic"], light),
-                lamp_object.level,
-                retain=False,
-            )
+def on_message_json_cmd(mqtt_client, data_object, msg, lamp_object):
+    """Handle MQTT json schema command message, switching and dimming at once.
 
-            mqtt_client.publish(
-                MQTT_STATE_TOPIC.format(data_object["base_topic"], light),
-                MQTT_PAYLOAD_ON if lamp_object.level != 0 else MQTT_PAYLOAD_OFF,
-                retain=False,
+    A transition in seconds is done by the gear, at the closest DALI fade time.
+    """
+    logger.debug("JSON Command on %s: %s", msg.topic, msg.payload)
+    try:
+        command = json.loads(msg.payload)
+        if command.get("state") == MQTT_PAYLOAD_OFF.decode("utf-8"):
+            level = 0
+        else:
+            level = int(
+                command.get("brightness", lamp_object.max_level or DALI_MAX_LEVEL)
             )
+        fade_time = None
+        if "transition" in command:
+            fade_time = fade_time_code(float(command["transition"]))
+    except (ValueError, TypeError, AttributeError) as err:
+        logger.error("Can't parse <%s> as a light command: %s", msg.payload, err)
+        return
+    trace = start_trace(data_object, "json", msg)
+    data_object["coalescer"].push(
+        str(lamp_object.short_address), (lamp_object, level, trace, fade_time)
+    )
+    tracing.mark(trace, "queued")
 
-        except ValueError as err:
-            logger.error(
-                "Can't convert <%s> to integer %d..%d: %s",
-                lamp_object.level,
-                lamp_object.min_level,
-                lamp_object.max_level,
-                err,
-            )
-    except KeyError:
-        logger.error("Lamp %s doesn't exists", light)
+
+def lamp_actions(light_schema):
+    """Return the command topic templates of a lamp and their actions."""
+    if light_schema == LIGHT_SCHEMA_JSON:
+        return {
+            MQTT_JSON_COMMAND_TOPIC: on_message_json_cmd,
+            MQTT_BRIGHTNESS_GET_COMMAND_TOPIC: on_message_brightness_get_cmd,
+        }
+    return {
+        MQTT_COMMAND_TOPIC: on_message_cmd,
+        MQTT_BRIGHTNESS_COMMAND_TOPIC: on_message_brightness_cmd,
+        MQTT_BRIGHTNESS_GET_COMMAND_TOPIC: on_message_brightness_get_cmd,
+    }
 
 
 def on_message(mqtt_client, data_object, msg):  # pylint: disable=W0613
@@ -350,114 +1059,328 @@ def on_message(mqtt_client, data_object, msg):  # pylint: disable=W0613
     logger.error("Don't publish to %s", msg.topic)
 
 
+def bus_topics(data_object):
+    """Return the command subscriptions of a bus."""
+    mqtt_base_topic = data_object["base_topic"]
+    return [
+        (template.format(mqtt_base_topic, "+"), 0)
+        for template in lamp_actions(data_object["light_schema"])
+    ] + [
+        (MQTT_SCAN_LAMPS_COMMAND_TOPIC.format(mqtt_base_topic), 0),
+        (MQTT_SCENE_STORE_COMMAND_TOPIC.format(mqtt_base_topic, "+"), 0),
+        (MQTT_SCENE_RECALL_COMMAND_TOPIC.format(mqtt_base_topic, "+"), 0),
+        (MQTT_SCENE_REMOVE_COMMAND_TOPIC.format(mqtt_base_topic, "+"), 0),
+    ]
+
+
+def owns_bus(data_object):
+    """Return True if this instance drives the bus."""
+    lease = data_object["lease"]
+    return lease is None or lease.owns(data_object["base_topic"])
+
+
+def initialize_buses(client, data_objects):
+    """Initialize the lamps of buses, publishing them in one flow controlled bulk.
+
+    Returns the BulkPublisher, done once every lamp is delivered. Buses
+    published from their inventory don't wait for its verification, its
+    corrections go out later through the same bulk.
+    """
+    bulk = client.bulk()
+    futures = [initialize_lamps(data_object, bulk) for data_object in data_objects]
+    bulk.close_after([future for future in futures if future is not None])
+    return bulk
+
+
+def take_bus(client, data_object):
+    """Start serving the commands and lamps of a bus."""
+    logger.info("Serving bus on %s", data_object["base_topic"])
+    client.subscribe(bus_topics(data_object))
+    return initialize_buses(client, [data_object])
+
+
+def release_bus(client, data_object):
+    """Stop serving a bus now driven by another instance.
+
+    Only the discovery topics of this instance are cleared, the state
+    topics of the bus belong to its new owner.
+    """
+    logger.info("Releasing bus on %s", data_object["base_topic"])
+    client.unsubscribe([topic for topic, _ in bus_topics(data_object)])
+    for name in list(data_object["all_lamps"]):
+        client.publish(discovery_topic(data_object, name), "", retain=True)
+    for scene in known_scenes(data_object["all_lamps"]):
+        client.publish(scene_discovery_topic(data_object, scene), "", retain=True)
+    data_object["all_lamps"].clear()
+    data_object["groups"] = {}
+    data_object["router"].rebuild(data_object["all_lamps"])
+    if data_object["snapshot"] is not None:
+        data_object["snapshot"].clear()
+
+
 def on_connect(
     client,
-    data_object,
+    data_objects,
     flags,
     result,
     ha_prefix=DEFAULT_HA_DISCOVERY_PREFIX,
 ):  # pylint: disable=W0613,R0913
     """Callback on connection to MQTT server."""
-    mqtt_base_topic = data_object["base_topic"]
-    client.subscribe(
-        [
-            (MQTT_COMMAND_TOPIC.format(mqtt_base_topic, "+"), 0),
-            (MQTT_BRIGHTNESS_COMMAND_TOPIC.format(mqtt_base_topic, "+"), 0),
-            (MQTT_BRIGHTNESS_GET_COMMAND_TOPIC.format(mqtt_base_topic, "+"), 0),
-            (MQTT_SCAN_LAMPS_COMMAND_TOPIC.format(mqtt_base_topic), 0),
-            (HA_STATUS_TOPIC.format(ha_prefix), 0),
-        ]
+    client.publish_cache.clear()
+    lease = data_objects[0]["lease"]
+    topics = [(HA_STATUS_TOPIC.format(ha_prefix), 0)]
+    if lease is not None:
+        leased = {data_object["base_topic"]: data_object for data_object in data_objects}
+        lease.watch(
+            leased,
+            lambda key, payload: client.publish(
+                MQTT_LEASE_TOPIC.format(key), payload, retain=True
+            ),
+            lambda key: take_bus(client, leased[key]),
+            lambda key: release_bus(client, leased[key]),
+        )
+        topics += [(MQTT_LEASE_TOPIC.format(key), 1) for key in leased]
+    client.subscribe(topics)
+    owned = [data_object for data_object in data_objects if owns_bus(data_object)]
+    for data_object in owned:
+        logger.info("Serving bus on %s", data_object["base_topic"])
+        client.subscribe(bus_topics(data_object))
+    # available only once Home Assistant has heard of every lamp
+    initialize_buses(client, owned).when_done(
+        lambda: client.publish(
+            data_objects[0]["availability_topic"], MQTT_AVAILABLE, retain=True
+        )
     )
-    client.publish(
-        MQTT_DALI2MQTT_STATUS.format(mqtt_base_topic), MQTT_AVAILABLE, retain=True
+
+
+def bind(callback, data_object):
+    """Return an MQTT message callback called with the data of one bus."""
+    return lambda client, userdata, msg: callback(client, data_object, msg)
+
+
+def create_bus_data(
+    mqttc,
+    bus_config,
+    mqtt_base_topic,
+    ha_prefix,
+    log_level,
+    metrics,
+    tracer,
+    instance=None,
+    lease=None,
+    light_schema=DEFAULT_LIGHT_SCHEMA,
+):
+    """Return the data of one bus, registering its message callbacks.
+
+    The lamps and groups known from an earlier connection are kept, so
+    reconnecting publishes them again without any bus traffic.
+    """
+    previous = bus_config.get("data_object") or {}
+    bus = bus_config["bus"]
+    bus_name = bus_config[CONF_BUS_NAME]
+    bus_topic = f"{mqtt_base_topic}/{bus_name}" if bus_name else mqtt_base_topic
+    data_object = {
+        "driver": bus.driver,
+        "model": bus.model,
+        "bus": bus,
+        "bus_name": bus_name,
+        "base_topic": bus_topic,
+        "availability_topic": availability_topic(mqtt_base_topic, instance),
+        "instance": instance,
+        "lease": lease,
+        "ha_prefix": ha_prefix,
+        "light_schema": light_schema,
+        "devices_names_config": bus_config["devices_names_config"],
+        "inventory": bus_config["inventory"],
+        "log_level": log_level,
+        "all_lamps": previous.get("all_lamps", {}),
+        "groups": previous.get("groups", {}),
+        "metrics": metrics,
+        "tracer": tracer,
+        "snapshot": bus_config.get("snapshot"),
+        "monitor": bus_config.get("monitor"),
+    }
+    data_object["coalescer"] = CommandCoalescer(
+        bus,
+        BUS_PRIORITY_COMMAND,
+        lambda batch: set_lamp_levels(mqttc, data_object, batch),
+    )
+    if metrics is not None:
+        metrics.watch(data_object)
+    snapshot = data_object["snapshot"]
+    if snapshot is not None:
+        snapshot.watch(
+            lambda: data_object["groups"],
+            lambda payload: mqttc.publish(
+                MQTT_SNAPSHOT_TOPIC.format(bus_topic), payload, retain=True
+            ),
+        )
+    monitor = data_object["monitor"]
+    if monitor is not None:
+        monitor.watch(
+            data_object["all_lamps"],
+            lambda: data_object["groups"],
+            lambda lamp_object: publish_lamp_state(
+                mqttc, data_object, lamp_object, retain=True
+            ),
+            lambda lamp_object: bus.submit(
+                BUS_PRIORITY_QUERY, get_lamp_level(mqttc, data_object, lamp_object)
+            ),
+        )
+    poller = bus_config.get("poller")
+    if poller is not None:
+        poller.watch(
+            data_object["all_lamps"],
+            lambda lamp_object: publish_lamp_state(
+                mqttc, data_object, lamp_object, retain=True
+            ),
+            lambda lamp_object, answered: note_lamp(
+                data_object, lamp_object, failed=not answered
+            ),
+        )
+    data_object["devices_names_config"].on_rename = lambda addresses: rename_lamps(
+        mqttc, data_object, addresses
+    )
+
+    actions = lamp_actions(light_schema)
+    data_object["router"] = TopicRouter(bus_topic, actions)
+    data_object["router"].rebuild(data_object["all_lamps"])
+    bus_config["data_object"] = data_object
+
+    # Add message callbacks that will only trigger on a specific subscription match.
+    for lamp_topic in actions:
+        mqttc.message_callback_add(
+            lamp_topic.format(bus_topic, "+"), bind(on_message_lamp_cmd, data_object)
+        )
+    mqttc.message_callback_add(
+        MQTT_SCAN_LAMPS_COMMAND_TOPIC.format(bus_topic),
+        bind(on_message_reinitialize_lamps_cmd, data_object),
     )
-    initialize_lamps(data_object, client)
+
+    for scene_topic in (
+        MQTT_SCENE_STORE_COMMAND_TOPIC,
+        MQTT_SCENE_RECALL_COMMAND_TOPIC,
+        MQTT_SCENE_REMOVE_COMMAND_TOPIC,
+    ):
+        mqttc.message_callback_add(
+            scene_topic.format(bus_topic, "+"), bind(on_message_scene_cmd, data_object)
+        )
+    if lease is not None:
+        mqttc.message_callback_add(
+            MQTT_LEASE_TOPIC.format(bus_topic), bind(on_message_lease, data_object)
+        )
+    return data_object
+
+
+def availability_topic(mqtt_base_topic, instance=None):
+    """Return the availability topic of an instance."""
+    if instance:
+        return MQTT_DALI2MQTT_STATUS.format(f"{mqtt_base_topic}/{instance}")
+    return MQTT_DALI2MQTT_STATUS.format(mqtt_base_topic)
 
 
 def create_mqtt_client(
-    driver,
+    buses,
     mqtt_server,
     mqtt_port,
     mqtt_username,
     mqtt_password,
     mqtt_base_topic,
-    devices_names_config,
     ha_prefix,
     log_level,
+    metrics=None,
+    tracer=None,
+    instance=None,
+    lease=None,
+    use_asyncio=False,
+    publish_window=DEFAULT_PUBLISH_WINDOW,
+    publish_qos=DEFAULT_PUBLISH_QOS,
+    light_schema=DEFAULT_LIGHT_SCHEMA,
 ):
-    """Create MQTT client object, setup callbacks and connection to server."""
+    """Create MQTT client object, setup callbacks and connection to server.
+
+    Each of ``buses`` is a dict with the bus name, its BusWorker, devices
+    names, inventory and optional poller; all share the connection. A
+    named instance gets its own client id, availability topic and
+    discovery node id, and serves only the buses its lease owns. With
+    use_asyncio the client is driven by the running event loop through
+    ``mqttc.hooks``. Lamps are published in bulks of publish_window
+    messages in flight, at publish_qos. Lights are announced with the
+    default or json light_schema of Home Assistant.
+    """
     logger.debug("Connecting to %s:%s", mqtt_server, mqtt_port)
-    mqttc = mqtt.Client(
-        client_id="dali2mqtt",
-        userdata={
-            "driver": driver,
-            "base_topic": mqtt_base_topic,
-            "ha_prefix": ha_prefix,
-            "devices_names_config": devices_names_config,
-            "log_level": log_level,
-            "all_lamps": {},
-        },
+    mqttc = DedupClient(client_id=f"dali2mqtt-{instance}" if instance else "dali2mqtt")
+    mqttc.bulk_window = publish_window
+    mqttc.bulk_qos = publish_qos
+    if metrics is not None:
+        mqttc.metrics = metrics
+    if tracer is not None:
+        tracer.watch(
+            lambda payload: mqttc.publish(
+                MQTT_DIAGNOSTICS_LATENCY_TOPIC.format(mqtt_base_topic), payload
+            )
+        )
+    mqttc.user_data_set(
+        [
+            create_bus_data(
+                mqttc,
+                bus_config,
+                mqtt_base_topic,
+                ha_prefix,
+                log_level,
+                metrics,
+                tracer,
+                instance,
+                lease,
+                light_schema,
+            )
+            for bus_config in buses
+        ]
     )
     mqttc.will_set(
-        MQTT_DALI2MQTT_STATUS.format(mqtt_base_topic), MQTT_NOT_AVAILABLE, retain=True
+        availability_topic(mqtt_base_topic, instance), MQTT_NOT_AVAILABLE, retain=True
     )
     mqttc.on_connect = lambda a, b, c, d: on_connect(a, b, c, d, ha_prefix)
 
-    # Add message callbacks that will only trigger on a specific subscription match.
-    mqttc.message_callback_add(
-        MQTT_COMMAND_TOPIC.format(mqtt_base_topic, "+"), on_message_cmd
-    )
-    mqttc.message_callback_add(
-        MQTT_BRIGHTNESS_COMMAND_TOPIC.format(mqtt_base_topic, "+"),
-        on_message_brightness_cmd,
-    )
-    mqttc.message_callback_add(
-        MQTT_BRIGHTNESS_GET_COMMAND_TOPIC.format(mqtt_base_topic, "+"),
-        on_message_brightness_get_cmd,
-    )
-    mqttc.message_callback_add(
-        MQTT_SCAN_LAMPS_COMMAND_TOPIC.format(mqtt_base_topic),
-        on_message_reinitialize_lamps_cmd,
-    )
-
     mqttc.message_callback_add(
         HA_STATUS_TOPIC.format(ha_prefix), on_message_ha_online
     )  # Default callback for unmatched topics
     logging.info("Monitoring HA on %s", HA_STATUS_TOPIC.format(ha_prefix))
 
     mqttc.on_message = on_message
+    if use_asyncio:
+        mqttc.hooks = MQTTSocketHooks(mqttc)
     if mqtt_username:
         mqttc.username_pw_set(mqtt_username, mqtt_password)
     mqttc.connect(mqtt_server, mqtt_port, 60)
     return mqttc
 
 
-def main(args):
-    """Main loop."""
-    mqttc = None
-    config = Config(args, lambda: on_detect_changes_in_config(mqttc))
-
-    if config.log_color:
-        logging.addLevelName(
-            logging.WARNING,
-            "{}{}".format(YELLOW_COLOR, logging.getLevelName(logging.WARNING)),
-        )
-        logging.addLevelName(
-            logging.ERROR, "{}{}".format(RED_COLOR, logging.getLevelName(logging.ERROR))
-        )
-
-    logger.setLevel(ALL_SUPPORTED_LOG_LEVELS[config.log_level])
-    devices_names_config = DevicesNamesConfig(
-        config.log_level, config.devices_names_file
-    )
+def create_dali_driver(bus_config, log_level, runtime=RUNTIME_THREADS):
+    """Create the DALI driver of a bus.
 
+    The asyncio runtime uses the asyncio hid drivers of python-dali for
+    the USB interfaces, found through the udev symlinks of python-dali
+    unless dali_device gives another path (or glob pattern).
+    """
     dali_driver = None
-    logger.debug("Using <%s> driver", config.dali_driver)
-
-    if config.dali_driver == HASSEB:
+    dali_device = bus_config[CONF_DALI_DEVICE]
+    logger.debug("Using <%s> driver", bus_config[CONF_DALI_DRIVER])
+
+    if runtime == RUNTIME_ASYNCIO and bus_config[CONF_DALI_DRIVER] in (HASSEB, TRIDONIC):
+        from dali.driver import hid
+
+        if bus_config[CONF_DALI_DRIVER] == HASSEB:
+            dali_driver = hid.hasseb(dali_device or HASSEB_HID_PATH, glob=True)
+        else:
+            dali_driver = hid.tridonic(dali_device or TRIDONIC_HID_PATH, glob=True)
+        dali_driver.connect()
+    elif bus_config[CONF_DALI_DRIVER] == HASSEB:
         from dali.driver.hasseb import SyncHassebDALIUSBDriver
 
-        dali_driver = SyncHassebDALIUSBDriver()
+        dali_driver = SyncHassebDALIUSBDriver(
+            path=dali_device.encode() if dali_device else None
+        )
 
         firmware_version = float(dali_driver.readFirmwareVersion())
         if firmware_version < MIN_HASSEB_FIRMWARE_VERSION:
@@ -466,24 +1389,263 @@ def main(args):
                 "Please, look at https://github.com/hasseb/python-dali/tree/master/dali/driver/hasseb_firmware"
             )
             quit(1)
-    elif config.dali_driver == TRIDONIC:
+    elif bus_config[CONF_DALI_DRIVER] == TRIDONIC:
         from dali.driver.tridonic import SyncTridonicDALIUSBDriver
 
+        if dali_device:
+            logger.warning("Tridonic driver ignores device <%s>", dali_device)
         dali_driver = SyncTridonicDALIUSBDriver()
-    elif config.dali_driver == DALI_SERVER:
+    elif bus_config[CONF_DALI_DRIVER] == DALI_SERVER:
         from dali.driver.daliserver import DaliServer
 
-        dali_driver = DaliServer("localhost", 55825)
+        host, _, port = (dali_device or "localhost").partition(":")
+        dali_driver = DaliServer(host, int(port or 55825))
+    elif bus_config[CONF_DALI_DRIVER] == DUMMY:
+        dali_driver = BusEmulator(log_level, range(bus_config[CONF_DALI_LAMPS]))
+    return dali_driver
+
+
+def create_buses(config, metrics=None):
+    """Create the bus, poller, names and inventory of every configured bus.
+
+    Nothing is started: BusWorker, StatePoller and BusSnapshot threads in
+    the threads runtime, AsyncBus, poller and snapshot tasks in the asyncio
+    one.
+    """
+    buses = []
+    for bus_config in config.buses:
+        bus_name = bus_config[CONF_BUS_NAME]
+        thread_name = f"-{bus_name}" if bus_name else ""
+        dali_driver = create_dali_driver(bus_config, config.log_level, config.runtime)
+        if config.runtime == RUNTIME_ASYNCIO:
+            bus = AsyncBus(
+                dali_driver,
+                config.log_level,
+                bus_config[CONF_DALI_FRAME_RATE],
+                config.dali_timeout,
+                name=f"dali-bus{thread_name}",
+            )
+        else:
+            bus = BusWorker(
+                dali_driver,
+                config.log_level,
+                bus_config[CONF_DALI_FRAME_RATE],
+                name=f"dali-bus{thread_name}",
+            )
+        poller = None
+        if config.poll_budget > 0:
+            poller = StatePoller(
+                bus,
+                config.poll_budget,
+                config.log_level,
+                name=f"dali-poller{thread_name}",
+            )
+        snapshot = None
+        if config.snapshot_interval > 0:
+            snapshot = BusSnapshot(
+                config.log_level,
+                config.snapshot_interval,
+                name=f"dali-snapshot{thread_name}",
+            )
+        monitor = None
+        if config.bus_monitor:
+            if hasattr(dali_driver, "bus_traffic"):
+                monitor = BusMonitor(
+                    config.log_level,
+                    asyncio.get_running_loop()
+                    if config.runtime == RUNTIME_ASYNCIO
+                    else None,
+                )
+                dali_driver.bus_traffic.register(monitor.on_traffic)
+            else:
+                logger.warning(
+                    "The %s driver can't monitor bus traffic in the %s runtime",
+                    bus_config[CONF_DALI_DRIVER],
+                    config.runtime,
+                )
+        if metrics is not None:
+            metrics.watch_bus(bus, bus_name)
+        buses.append(
+            {
+                CONF_BUS_NAME: bus_name,
+                "driver": dali_driver,
+                "bus": bus,
+                "poller": poller,
+                "snapshot": snapshot,
+                "monitor": monitor,
+                "devices_names_config": DevicesNamesConfig(
+                    config.log_level, bus_config[CONF_DEVICES_NAMES_FILE]
+                ),
+                "inventory": BusInventory(
+                    config.log_level, bus_config[CONF_INVENTORY_FILE]
+                ),
+            }
+        )
+    return buses
+
+
+def start_buses(buses, runtime=RUNTIME_THREADS):
+    """Start the bus, poller and snapshot of every bus, as threads or tasks.
+
+    The devices names file of every bus is watched for renames.
+    """
+    for bus_config in buses:
+        bus_config["bus"].start()
+        workers = [
+            worker
+            for worker in (bus_config["poller"], bus_config["snapshot"])
+            if worker is not None
+        ]
+        if runtime == RUNTIME_ASYNCIO:
+            bus_config["tasks"] = [
+                asyncio.create_task(worker.run_async()) for worker in workers
+            ]
+            bus_config["devices_names_config"].watch(loop=asyncio.get_running_loop())
+        else:
+            for worker in workers:
+                worker.start()
+            bus_config["devices_names_config"].watch()
+
+
+def stop_buses(buses):
+    """Stop every bus, its poller and snapshot, releasing asyncio drivers."""
+    for bus_config in buses:
+        for worker in (bus_config["poller"], bus_config["snapshot"]):
+            if worker is not None:
+                worker.stop()
+        for task in bus_config.get("tasks", []):
+            task.cancel()
+        bus_config["devices_names_config"].unwatch()
+        bus_config["bus"].stop()
+        if hasattr(bus_config["driver"], "disconnect"):
+            bus_config["driver"].disconnect()
+
+
+def rebuild_buses(buses, config, metrics=None):
+    """Return the buses created again from config, the old ones stopped."""
+    logger.info("Rebuilding buses for the new driver settings")
+    stop_buses(buses)
+    buses = create_buses(config, metrics)
+    start_buses(buses, config.runtime)
+    return buses
+
+
+async def main_async(config, metrics=None, tracer=None):
+    """Main loop of the asyncio runtime.
+
+    Buses, pollers, the lease, config watching and the MQTT client all
+    run as tasks of one event loop.
+    """
+    mqttc = None
+    rebuild = threading.Event()
+    buses = create_buses(config, metrics)
+    start_buses(buses, RUNTIME_ASYNCIO)
+    tasks = []
+    lease = None
+    if config.instance:
+        lease = BusLease(config.instance, config.log_level, config.lease_duration)
+        tasks.append(asyncio.create_task(lease.run_async()))
+    tasks.append(
+        asyncio.create_task(
+            config.watch_async(
+                lambda changes: on_detect_changes_in_config(
+                    mqttc, config, changes, rebuild
+                )
+            )
+        )
+    )
+
+    retries = 0
+    while retries < MAX_RETRIES:
+        try:
+            if rebuild.is_set():
+                buses = rebuild_buses(buses, config, metrics)
+                rebuild.clear()
+            mqttc = create_mqtt_client(
+                buses,
+                *config.mqtt_conf,
+                config.ha_discovery_prefix,
+                config.log_level,
+                metrics,
+                tracer,
+                config.instance,
+                lease,
+                use_asyncio=True,
+                publish_window=config.publish_window,
+                publish_qos=config.publish_qos,
+                light_schema=config.light_schema,
+            )
+            result = await mqttc.hooks.disconnected
+            logger.info("Disconnected from MQTT server: %s", result)
+            retries = 0
+        except Exception as e:
+            logger.error("%s: %s", type(e).__name__, e)
+            await asyncio.sleep(random.randint(MIN_BACKOFF_TIME, MAX_BACKOFF_TIME))
+            retries += 1
+
+    logger.error("Maximum retries of %d reached, exiting...", retries)
+    for task in tasks:
+        task.cancel()
+    stop_buses(buses)
+
+
+def main(args):
+    """Main loop."""
+    mqttc = None
+    rebuild = threading.Event()
+    config = Config(
+        args, lambda changes: on_detect_changes_in_config(mqttc, config, changes, rebuild)
+    )
+
+    if config.log_color:
+        logging.addLevelName(
+            logging.WARNING,
+            "{}{}".format(YELLOW_COLOR, logging.getLevelName(logging.WARNING)),
+        )
+        logging.addLevelName(
+            logging.ERROR, "{}{}".format(RED_COLOR, logging.getLevelName(logging.ERROR))
+        )
+
+    logger.setLevel(ALL_SUPPORTED_LOG_LEVELS[config.log_level])
+
+    metrics = None
+    if config.metrics_port:
+        metrics = BridgeMetrics(config.log_level)
+        start_metrics_server(metrics, config.metrics_port)
+    tracer = None
+    if config.trace_latency:
+        tracer = Tracer(config.log_level, config.trace_file)
+
+    if config.runtime == RUNTIME_ASYNCIO:
+        asyncio.run(main_async(config, metrics, tracer))
+        return
+
+    config.watch()
+    buses = create_buses(config, metrics)
+    start_buses(buses)
+    lease = None
+    if config.instance:
+        lease = BusLease(config.instance, config.log_level, config.lease_duration)
+        lease.start()
 
     retries = 0
     while retries < MAX_RETRIES:
         try:
+            if rebuild.is_set():
+                buses = rebuild_buses(buses, config, metrics)
+                rebuild.clear()
             mqttc = create_mqtt_client(
-                dali_driver,
+                buses,
                 *config.mqtt_conf,
-                devices_names_config,
                 config.ha_discovery_prefix,
                 config.log_level,
+                metrics,
+                tracer,
+                config.instance,
+                lease,
+                publish_window=config.publish_window,
+                publish_qos=config.publish_qos,
+                light_schema=config.light_schema,
             )
             mqttc.loop_forever()
             retries = (
@@ -495,6 +1657,9 @@ def main(args):
             retries += 1
 
     logger.error("Maximum retries of %d reached, exiting...", retries)
+    if lease is not None:
+        lease.stop()
+    stop_buses(buses)
 
 
 if __name__ == "__main__":
@@ -525,7 +1690,7 @@ if __name__ == "__main__":
     )
     parser.add_argument(
         f"--{CONF_DALI_LAMPS.replace('_', '-')}",
-        help="Number of lamps to scan",
+        help="Number of lamps emulated by the dummy driver",
         type=int,
     )
     parser.add_argument(
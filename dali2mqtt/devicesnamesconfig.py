@@ -2,7 +2,8 @@
 import logging
 
 import yaml
-from dali2mqtt.consts import ALL_SUPPORTED_LOG_LEVELS, LOG_FORMAT
+from dali2mqtt.consts import ALL_SUPPORTED_LOG_LEVELS, CONFIG_DEBOUNCE_TIME, LOG_FORMAT
+from dali2mqtt.watcher import FileWatcher
 
 logging.basicConfig(format=LOG_FORMAT)
 logger = logging.getLogger(__name__)
@@ -15,12 +16,18 @@ class DevicesNamesConfigLoadError(Exception):
 
 
 class DevicesNamesConfig:
-    """Devices Names Configuration."""
+    """Devices Names Configuration.
+
+    While watched, on_rename(addresses) is called with the short addresses
+    whose friendly name changed in the file.
+    """
 
     def __init__(self, log_level, filename):
         """Initialize devices names config."""
         self._path = filename
         self._devices_names = {}
+        self._watcher = None
+        self.on_rename = None
 
         logger.setLevel(ALL_SUPPORTED_LOG_LEVELS[log_level])
         # Load from file
@@ -46,10 +53,48 @@ class DevicesNamesConfig:
                 self._path,
             )
 
+    def watch(self, debounce=CONFIG_DEBOUNCE_TIME, loop=None):
+        """Reload the devices names file when it changes, see FileWatcher."""
+        self._watcher = FileWatcher(self._path, self.reload, debounce, loop)
+        self._watcher.start()
+
+    def unwatch(self):
+        """Stop watching the devices names file."""
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+
+    def reload(self):
+        """Reload the devices names file, returning the addresses renamed."""
+        names = dict(self._devices_names)
+        try:
+            self.load_devices_names_file()
+        except DevicesNamesConfigLoadError:
+            return set()
+        renamed = {
+            number
+            for number in set(names) | set(self._devices_names)
+            if self._name(names, number) != self.get_friendly_name(number)
+        }
+        if renamed:
+            logger.info("Devices renamed in <%s>: %s", self._path, sorted(renamed))
+            if self.on_rename is not None:
+                self.on_rename(renamed)
+        return renamed
+
+    @staticmethod
+    def _name(devices_names, short_address_value):
+        """Return the friendly name of an address in devices names."""
+        return (devices_names.get(short_address_value) or {}).get(
+            "friendly_name", f"{short_address_value}"
+        )
+
     def save_devices_names_file(self, all_lamps):
         """Save configuration back to yaml file."""
         self._devices_names = {}
         for lamp_object in all_lamps.values():
+            if lamp_object.is_group:
+                continue
             self._devices_names[lamp_object.short_address.address] = {
                 "friendly_name": str(lamp_object.short_address.address)
             }
@@ -70,8 +115,4 @@ class DevicesNamesConfig:
 
     def get_friendly_name(self, short_address_value) -> str:
         """Retrieve friendly_name."""
-        if short_address_value in self._devices_names:
-            return self._devices_names[short_address_value].get(
-                "friendly_name", f"{short_address_value}"
-            )
-        return str(short_address_value)
+        return self._name(self._devices_names, short_address_value)
@@ -0,0 +1,220 @@
+"""In-process DALI bus emulator used by the "dummy" driver."""
+import logging
+import threading
+import time
+
+import dali.address as address
+import dali.gear.general as gear
+from dali.frame import BackwardFrame, BackwardFrameError
+from dali2mqtt.consts import (
+    ALL_SUPPORTED_LOG_LEVELS,
+    DALI_MASK,
+    DALI_MAX_LEVEL,
+    DALI_SCENES,
+    DALI_SHORT_ADDRESSES,
+    LOG_FORMAT,
+)
+from dali2mqtt.lamp import fade_seconds
+
+logging.basicConfig(format=LOG_FORMAT)
+logger = logging.getLogger(__name__)
+
+# 1200 baud: forward frame of 19 bits, backward frame of 11 bits
+FORWARD_FRAME_TIME = 19 / 1200
+BACKWARD_FRAME_TIME = 11 / 1200
+SETTLING_TIME = 0.0055
+
+
+class ControlGear:
+    """State of one emulated control gear."""
+
+    def __init__(
+        self, short_address, min_physical_level=1, min_level=1, max_level=DALI_MAX_LEVEL
+    ):
+        """Initialize control gear."""
+        self.short_address = short_address
+        self.min_physical_level = min_physical_level
+        self.min_level = min_level
+        self.max_level = max_level
+        self.groups = set()
+        self.scenes = [DALI_MASK] * DALI_SCENES
+        self.fade_time = 0
+        self.dtr0 = 0
+        self._fade = (0, 0, 0, 0)  # from level, to level, started, duration
+
+    def level(self, now):
+        """Return the actual level, part way through a fade if fading."""
+        start, target, started, duration = self._fade
+        if duration == 0 or now >= started + duration:
+            return target
+        return round(start + (target - start) * (now - started) / duration)
+
+    def go_to(self, level, now, fade=True):
+        """Start going to a level, clamped to the limits."""
+        if level == DALI_MASK:
+            return
+        if level != 0:
+            level = min(max(level, self.min_level), self.max_level)
+        duration = fade_seconds(self.fade_time) if fade else 0
+        self._fade = (self.level(now), level, now, duration)
+
+
+class BusTraffic:
+    """Callbacks on every frame of a bus, as ``bus_traffic`` of the hid drivers."""
+
+    def __init__(self, driver):
+        """Initialize bus traffic callbacks."""
+        self._driver = driver
+        self._callbacks = []
+
+    def register(self, func):
+        """Call func(driver, command, response, config_command_error) on frames."""
+        self._callbacks.append(func)
+
+    def invoke(self, command, response):
+        """Report a frame to the callbacks."""
+        for func in list(self._callbacks):
+            func(self._driver, command, response, False)
+
+
+class BusEmulator:
+    """Driver answering like a bus of up to 64 control gear.
+
+    The ``dali.gear.general`` commands used by dali2mqtt are modelled:
+    presence, limits, levels with fade times, groups, scenes and DTR0.
+    Every frame takes the time it would take on the wire, multiplied by
+    ``time_scale`` (0 answers instantly). Identical answers of several
+    gear read as one backward frame, different ones as a framing error.
+    Frames are reported to ``bus_traffic``, whoever sends them, so a
+    test sending commands plays another master on the bus.
+    """
+
+    def __init__(self, log_level, lamps=(), time_scale=1, clock=time.monotonic):
+        """Initialize emulator with control gear at the given short addresses."""
+        self.gear = {number: ControlGear(number) for number in lamps}
+        self.time_scale = time_scale
+        self.clock = clock
+        self.frames = 0
+        self.bus_traffic = BusTraffic(self)
+        self._lock = threading.Lock()
+
+        logger.setLevel(ALL_SUPPORTED_LOG_LEVELS[log_level])
+
+    def add_gear(self, short_address, **limits):
+        """Add (or replace) a control gear."""
+        if not 0 <= short_address < DALI_SHORT_ADDRESSES:
+            raise ValueError(f"Short address {short_address} out of range")
+        self.gear[short_address] = ControlGear(short_address, **limits)
+        return self.gear[short_address]
+
+    def _targets(self, destination):
+        """Return the control gear addressed."""
+        if isinstance(destination, address.Broadcast):
+            return list(self.gear.values())
+        if isinstance(destination, address.Group):
+            return [
+                control_gear
+                for control_gear in self.gear.values()
+                if destination.group in control_gear.groups
+            ]
+        if isinstance(destination, address.Short):
+            return [self.gear[destination.address]] if destination.address in self.gear else []
+        return []
+
+    def _wait(self, frames, answered):
+        """Spend the time the frames take on the wire."""
+        if self.time_scale:
+            duration = frames * (FORWARD_FRAME_TIME + SETTLING_TIME)
+            if answered:
+                duration += BACKWARD_FRAME_TIME + SETTLING_TIME
+            time.sleep(duration * self.time_scale)
+
+    def send(self, command):
+        """Send a command to the emulated bus, returning its response."""
+        with self._lock:
+            frames = 2 if command.sendtwice else 1
+            self.frames += frames
+            answers = self._execute(command, self.clock())
+            self._wait(frames, bool(answers))
+        response = None
+        if command.response is not None:
+            if not answers:
+                response = command.response(None)
+            elif len(set(answers)) > 1:
+                response = command.response(BackwardFrameError(DALI_MASK))
+            else:
+                response = command.response(BackwardFrame(answers[0]))
+        self.bus_traffic.invoke(command, response)
+        return response
+
+    def _execute(self, command, now):
+        """Apply a command, returning the answers of the gear addressed."""
+        if isinstance(command, gear.DTR0):
+            for control_gear in self.gear.values():
+                control_gear.dtr0 = command.param
+            return []
+
+        targets = self._targets(getattr(command, "destination", None))
+        if isinstance(command, gear.QueryControlGearPresent):
+            return [DALI_MASK for _ in targets]
+        query = QUERIES.get(type(command))
+        if query is not None:
+            return [query(control_gear, command, now) for control_gear in targets]
+
+        for control_gear in targets:
+            if isinstance(command, gear.DAPC):
+                control_gear.go_to(command.power, now)
+            elif isinstance(command, gear.Off):
+                control_gear.go_to(0, now, fade=False)
+            elif isinstance(command, gear.RecallMaxLevel):
+                control_gear.go_to(control_gear.max_level, now, fade=False)
+            elif isinstance(command, gear.RecallMinLevel):
+                control_gear.go_to(control_gear.min_level, now, fade=False)
+            elif isinstance(command, gear.GoToScene):
+                control_gear.go_to(control_gear.scenes[command.param], now)
+            elif isinstance(command, gear.StoreActualLevelInDTR0):
+                control_gear.dtr0 = control_gear.level(now)
+            elif isinstance(command, gear.SetScene):
+                control_gear.scenes[command.param] = control_gear.dtr0
+            elif isinstance(command, gear.RemoveFromScene):
+                control_gear.scenes[command.param] = DALI_MASK
+            elif isinstance(command, gear.AddToGroup):
+                control_gear.groups.add(command.param)
+            elif isinstance(command, gear.RemoveFromGroup):
+                control_gear.groups.discard(command.param)
+            elif isinstance(command, gear.SetFadeTime):
+                control_gear.fade_time = min(control_gear.dtr0, 15)
+            elif isinstance(command, gear.SetMaxLevel):
+                control_gear.max_level = min(
+                    max(control_gear.dtr0, control_gear.min_level), DALI_MAX_LEVEL
+                )
+            elif isinstance(command, gear.SetMinLevel):
+                control_gear.min_level = min(
+                    max(control_gear.dtr0, control_gear.min_physical_level),
+                    control_gear.max_level,
+                )
+            else:
+                logger.debug("Emulator ignores %s", command)
+        return []
+
+
+def _group_bits(control_gear, first):
+    """Return the membership bits of 8 groups from first."""
+    return sum(
+        1 << (group - first)
+        for group in control_gear.groups
+        if first <= group < first + 8
+    )
+
+
+QUERIES = {
+    gear.QueryActualLevel: lambda control_gear, command, now: control_gear.level(now),
+    gear.QueryPhysicalMinimum: lambda control_gear, command, now: control_gear.min_physical_level,
+    gear.QueryMinLevel: lambda control_gear, command, now: control_gear.min_level,
+    gear.QueryMaxLevel: lambda control_gear, command, now: control_gear.max_level,
+    gear.QueryContentDTR0: lambda control_gear, command, now: control_gear.dtr0,
+    gear.QueryFadeTimeFadeRate: lambda control_gear, command, now: control_gear.fade_time << 4 | 7,
+    gear.QuerySceneLevel: lambda control_gear, command, now: control_gear.scenes[command.param],
+    gear.QueryGroupsZeroToSeven: lambda control_gear, command, now: _group_bits(control_gear, 0),
+    gear.QueryGroupsEightToFifteen: lambda control_gear, command, now: _group_bits(control_gear, 8),
+}
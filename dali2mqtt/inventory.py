@@ -0,0 +1,116 @@
+"""Persistent cache of the DALI bus inventory."""
+import logging
+import threading
+
+import yaml
+from dali2mqtt.consts import ALL_SUPPORTED_LOG_LEVELS, INVENTORY_SAVE_DELAY, LOG_FORMAT
+
+logging.basicConfig(format=LOG_FORMAT)
+logger = logging.getLogger(__name__)
+
+LAMP_FIELDS = ("min_physical_level", "min_level", "max_level", "level")
+
+
+class BusInventory:
+    """Addresses, groups, limits and last level of every lamp on the bus."""
+
+    def __init__(self, log_level, filename, save_delay=INVENTORY_SAVE_DELAY):
+        """Initialize bus inventory."""
+        self._path = filename
+        self._lamps = {}
+        self._groups = {}
+        self._save_delay = save_delay
+        self._timer = None
+        self._lock = threading.Lock()
+
+        logger.setLevel(ALL_SUPPORTED_LOG_LEVELS[log_level])
+        self.load_inventory_file()
+
+    @property
+    def lamps(self):
+        """Cached lamps, indexed by short address."""
+        return self._lamps
+
+    @property
+    def groups(self):
+        """Cached groups, indexed by group number."""
+        return self._groups
+
+    def load_inventory_file(self):
+        """Load inventory from yaml file."""
+        try:
+            with open(self._path, "r") as infile:
+                logger.debug("Loading bus inventory from <%s>", self._path)
+                inventory = yaml.safe_load(infile) or {}
+            self._lamps = inventory.get("lamps") or {}
+            self._groups = inventory.get("groups") or {}
+        except FileNotFoundError:
+            logger.info("No bus inventory <%s>, a full scan is required", self._path)
+        except (yaml.YAMLError, AttributeError) as error:
+            logger.error("Ignoring invalid bus inventory %s: %s", self._path, error)
+            self._lamps = {}
+            self._groups = {}
+
+    def save_inventory_file(self):
+        """Save inventory back to yaml file."""
+        try:
+            with self._lock, open(self._path, "w") as outfile:
+                yaml.dump(
+                    {"lamps": self._lamps, "groups": self._groups},
+                    outfile,
+                    default_flow_style=False,
+                    allow_unicode=True,
+                )
+        except Exception as err:
+            logger.error("Could not save bus inventory: %s", err)
+
+    def update_level(self, lamp_object):
+        """Record the last level of a cached lamp, saved within save_delay seconds."""
+        entries = self._groups if lamp_object.is_group else self._lamps
+        entry = entries.get(lamp_object.number)
+        if entry is None or entry.get("level") == lamp_object.level:
+            return
+        with self._lock:
+            entry["level"] = lamp_object.level
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(self._save_delay, self._save_later)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _save_later(self):
+        """Save the levels recorded since the last save."""
+        with self._lock:
+            self._timer = None
+        self.save_inventory_file()
+
+    def is_empty(self) -> bool:
+        """Check if we have any lamp cached."""
+        return len(self._lamps) == 0
+
+    def lamp_groups(self):
+        """Rebuild the group membership map from the cached lamps."""
+        groups = {}
+        for lamp, entry in sorted(self._lamps.items()):
+            for group in entry.get("groups", []):
+                groups.setdefault(group, []).append(lamp)
+        return groups
+
+    def update(self, all_lamps, groups):
+        """Replace the cached content with the lamps currently known."""
+        membership = {}
+        for group, lamps in groups.items():
+            for lamp in lamps:
+                membership.setdefault(lamp, []).append(group)
+
+        self._lamps = {}
+        self._groups = {}
+        for lamp_object in all_lamps.values():
+            entry = {field: getattr(lamp_object, field) for field in LAMP_FIELDS}
+            if lamp_object.is_group:
+                self._groups[lamp_object.short_address.group] = entry
+            else:
+                number = lamp_object.short_address.address
+                entry["groups"] = sorted(membership.get(number, []))
+                entry["scenes"] = dict(lamp_object.scenes)
+                self._lamps[number] = entry
@@ -1,18 +1,28 @@
 """Class to represent dali lamps."""
 import json
 import logging
+import math
 
+import dali.address as address
 import dali.gear.general as gear
+from dali.exceptions import DALIError
 from dali2mqtt.consts import (
     ALL_SUPPORTED_LOG_LEVELS,
+    DALI_FADE_TIMES,
+    DALI_MAX_LEVEL,
+    LIGHT_SCHEMA_DEFAULT,
+    LIGHT_SCHEMA_JSON,
     LOG_FORMAT,
     MQTT_AVAILABLE,
     MQTT_BRIGHTNESS_COMMAND_TOPIC,
     MQTT_BRIGHTNESS_STATE_TOPIC,
     MQTT_COMMAND_TOPIC,
     MQTT_DALI2MQTT_STATUS,
+    MQTT_JSON_COMMAND_TOPIC,
+    MQTT_JSON_STATE_TOPIC,
     MQTT_NOT_AVAILABLE,
     MQTT_PAYLOAD_OFF,
+    MQTT_PAYLOAD_ON,
     MQTT_STATE_TOPIC,
     __version__,
 )
@@ -22,18 +32,79 @@ logging.basicConfig(format=LOG_FORMAT)
 logger = logging.getLogger(__name__)
 
 
+LIMIT_QUERIES = (
+    ("min_physical_level", gear.QueryPhysicalMinimum),
+    ("min_level", gear.QueryMinLevel),
+    ("max_level", gear.QueryMaxLevel),
+)
+
+
+def fade_seconds(fade_time):
+    """Return the duration of a DALI fade time code."""
+    if fade_time == 0:
+        return 0
+    return 0.5 * 2 ** (fade_time / 2)
+
+
+def fade_time_code(seconds):
+    """Return the DALI fade time code (0..15) closest to a transition in seconds."""
+    if seconds < fade_seconds(1) / 2:
+        return 0
+    return min(
+        range(1, DALI_FADE_TIMES),
+        key=lambda fade_time: abs(math.log(seconds / fade_seconds(fade_time))),
+    )
+
+
+def gen_ha_device_config(model, bus_name=None):
+    """Generate the Home Assistant device shared by all entities of a bus."""
+    return {
+        "ids": f"dali2mqtt_{bus_name}" if bus_name else "dali2mqtt",
+        "name": f"DALI Lights {bus_name}" if bus_name else "DALI Lights",
+        "sw": f"dali2mqtt {__version__}",
+        "mdl": model,
+        "mf": "dali2mqtt",
+    }
+
+
 class Lamp:
-    """Representation of a DALI Lamp."""
+    """Representation of a DALI Lamp.
+
+    Limits and level may be given ahead of time (e.g. from the bus
+    inventory) or left as None, in which case the missing ones are read in
+    a single bus transaction the first time they are needed. The fade time
+    set in the gear is cached once read or written, with the one it had
+    before dali2mqtt changed it.
+    """
+
+    __slots__ = (
+        "model",
+        "short_address",
+        "friendly_name",
+        "device_name",
+        "min_physical_level",
+        "min_level",
+        "max_level",
+        "_level",
+        "scenes",
+        "fade_time",
+        "default_fade_time",
+    )
 
     def __init__(
         self,
         log_level,
-        driver,
+        model,
         friendly_name,
         short_address,
+        min_physical_level=None,
+        min_level=None,
+        max_level=None,
+        level=None,
+        scenes=None,
     ):
-        """Initialize Lamp."""
-        self.driver = driver
+        """Initialize Lamp from known values, without any bus traffic."""
+        self.model = model
         self.short_address = short_address
         self.friendly_name = friendly_name
 
@@ -41,79 +112,217 @@ class Lamp:
 
         logger.setLevel(ALL_SUPPORTED_LOG_LEVELS[log_level])
 
-        _min_physical_level = driver.send(gear.QueryPhysicalMinimum(short_address))
-
-        try:
-            self.min_physical_level = _min_physical_level.value
-        except Exception as err:
-            self.min_physical_level = None
-            logger.warning(
-                "Set min_physical_level to None as %s failed: %s",
-                _min_physical_level,
-                err,
-            )
-        self.min_level = driver.send(gear.QueryMinLevel(short_address)).value
-        self.max_level = driver.send(gear.QueryMaxLevel(short_address)).value
-        self.level = driver.send(gear.QueryActualLevel(short_address)).value
-
-    def gen_ha_config(self, mqtt_base_topic):
-        """Generate a automatic configuration for Home Assistant."""
+        self.min_physical_level = min_physical_level
+        self.min_level = min_level
+        self.max_level = max_level
+        self._level = level
+        self.scenes = dict(scenes or {})
+        self.fade_time = None
+        self.default_fade_time = None
+
+    def rename(self, friendly_name):
+        """Change the name of the lamp, and with it the name of its topics."""
+        self.friendly_name = friendly_name
+        self.device_name = slugify(friendly_name)
+
+    @property
+    def is_group(self):
+        """Return True if the lamp represents a DALI group."""
+        return isinstance(self.short_address, address.Group)
+
+    @property
+    def number(self):
+        """Return the short address or group number."""
+        if self.is_group:
+            return self.short_address.group
+        return self.short_address.address
+
+    @property
+    def missing_values(self):
+        """Return the limits and level not read yet."""
+        missing = [field for field, _ in LIMIT_QUERIES if getattr(self, field) is None]
+        if self._level is None:
+            missing.append("level")
+        return missing
+
+    def query_values(self, fields=None):
+        """Sequence reading limits and actual level in one bus transaction.
+
+        Only ``fields`` are read when given, all of them otherwise.
+        """
+        queries = [
+            (field, query)
+            for field, query in LIMIT_QUERIES + (("level", gear.QueryActualLevel),)
+            if fields is None or field in fields
+        ]
+        if not queries:
+            return
+        responses = yield [query(self.short_address) for _, query in queries]
+        for (field, _), response in zip(queries, responses):
+            value = response.value
+            if not isinstance(value, int):
+                if field != "min_physical_level":
+                    raise DALIError(f"{field} of {self.short_address} is {value}")
+                logger.warning(
+                    "Set min_physical_level to None as %s failed: %s", response, value
+                )
+                value = None
+            setattr(self, "_level" if field == "level" else field, value)
+
+    def ensure_limits(self):
+        """Sequence reading the limits still missing, if any."""
+        yield from self.query_values(
+            [field for field in self.missing_values if field != "level"]
+        )
+
+    def gen_ha_config(
+        self,
+        mqtt_base_topic,
+        bus_name=None,
+        availability_topic=None,
+        schema=LIGHT_SCHEMA_DEFAULT,
+    ):
+        """Generate a automatic configuration for Home Assistant.
+
+        Entities of a named bus get its name in their ids, the availability
+        topic defaults to the one under mqtt_base_topic. With the json
+        schema the light has a single state and a single command topic.
+        """
+        object_id = f"{bus_name}_{self.device_name}" if bus_name else self.device_name
+        unique_id = (
+            f"{self.model}_{bus_name}_{self.short_address}"
+            if bus_name
+            else f"{self.model}_{self.short_address}"
+        )
+        if schema == LIGHT_SCHEMA_JSON:
+            topics = {
+                "schema": LIGHT_SCHEMA_JSON,
+                "stat_t": MQTT_JSON_STATE_TOPIC.format(mqtt_base_topic, self.device_name),
+                "cmd_t": MQTT_JSON_COMMAND_TOPIC.format(
+                    mqtt_base_topic, self.device_name
+                ),
+                "sup_clrm": ["brightness"],
+                "bri_scl": self.max_level or DALI_MAX_LEVEL,
+            }
+        else:
+            topics = {
+                "stat_t": MQTT_STATE_TOPIC.format(mqtt_base_topic, self.device_name),
+                "cmd_t": MQTT_COMMAND_TOPIC.format(mqtt_base_topic, self.device_name),
+                "pl_off": MQTT_PAYLOAD_OFF.decode("utf-8"),
+                "bri_stat_t": MQTT_BRIGHTNESS_STATE_TOPIC.format(
+                    mqtt_base_topic, self.device_name
+                ),
+                "bri_cmd_t": MQTT_BRIGHTNESS_COMMAND_TOPIC.format(
+                    mqtt_base_topic, self.device_name
+                ),
+                "bri_scl": self.max_level or DALI_MAX_LEVEL,
+                "on_cmd_type": "brightness",
+            }
         json_config = {
             "name": self.friendly_name,
-            "def_ent_id": f"dali_light_{self.device_name}",
-            "uniq_id": f"{type(self.driver).__name__}_{self.short_address}",
-            "stat_t": MQTT_STATE_TOPIC.format(mqtt_base_topic, self.device_name),
-            "cmd_t": MQTT_COMMAND_TOPIC.format(mqtt_base_topic, self.device_name),
-            "pl_off": MQTT_PAYLOAD_OFF.decode("utf-8"),
-            "bri_stat_t": MQTT_BRIGHTNESS_STATE_TOPIC.format(
-                mqtt_base_topic, self.device_name
-            ),
-            "bri_cmd_t": MQTT_BRIGHTNESS_COMMAND_TOPIC.format(
-                mqtt_base_topic, self.device_name
-            ),
-            "bri_scl": self.max_level,
-            "on_cmd_type": "brightness",
-            "avty_t": MQTT_DALI2MQTT_STATUS.format(mqtt_base_topic),
+            "def_ent_id": f"dali_light_{object_id}",
+            "uniq_id": unique_id,
+            **topics,
+            "avty_t": availability_topic
+            or MQTT_DALI2MQTT_STATUS.format(mqtt_base_topic),
             "pl_avail": MQTT_AVAILABLE,
             "pl_not_avail": MQTT_NOT_AVAILABLE,
-            "device": {
-                "ids": "dali2mqtt",
-                "name": "DALI Lights",
-                "sw": f"dali2mqtt {__version__}",
-                "mdl": f"{type(self.driver).__name__}",
-                "mf": "dali2mqtt",
-            },
+            "device": gen_ha_device_config(self.model, bus_name),
         }
         return json.dumps(json_config)
 
+    def json_state(self):
+        """Return state, brightness and limits as one json schema payload."""
+        return json.dumps(
+            {
+                "state": (MQTT_PAYLOAD_ON if self.level else MQTT_PAYLOAD_OFF).decode(
+                    "utf-8"
+                ),
+                "brightness": self.level,
+                "max_level": self.max_level,
+                "min_level": self.min_level,
+                "physical_minimum": self.min_physical_level,
+            }
+        )
+
     def actual_level(self):
-        """Retrieve actual level from ballast."""
-        self.__level = self.driver.send(gear.QueryActualLevel(self.short_address))
+        """Sequence retrieving actual level from ballast."""
+        yield from self.query_values(["level"])
+
+    def valid_level(self, value):
+        """Return True if value is off or within the known limits."""
+        if value == 0:
+            return True
+        return (self.min_level is None or self.min_level <= value) and (
+            self.max_level is None or value <= self.max_level
+        )
 
     @property
     def level(self):
         """Return brightness level."""
-        return self.__level
+        return self._level
 
     @level.setter
     def level(self, value):
-        """Commit level to ballast."""
-        if not self.min_level <= value <= self.max_level and value != 0:
+        """Record level, use set_level() to commit it to the ballast."""
+        if not self.valid_level(value):
+            raise ValueError
+        self._level = value
+
+    def read_fade_time(self):
+        """Sequence reading the fade time set in the gear."""
+        response = yield gear.QueryFadeTimeFadeRate(self.short_address)
+        if not isinstance(response.value, int):
+            raise DALIError(f"fade time of {self.short_address} is {response.value}")
+        self.fade_time = self.default_fade_time = response.fade_time
+
+    def fade_to(self, fade_time):
+        """Sequence setting the fade time of the next level changes.
+
+        None restores the fade time the gear had before. Nothing is sent
+        if the gear already has it.
+        """
+        if fade_time is None:
+            fade_time = self.default_fade_time
+            if fade_time is None:
+                return
+        if fade_time == self.fade_time:
+            return
+        if self.default_fade_time is None:
+            yield from self.read_fade_time()
+            if fade_time == self.fade_time:
+                return
+        # back to back, no other sequence may use DTR0 in between
+        yield [gear.DTR0(fade_time), gear.SetFadeTime(self.short_address)]
+        self.fade_time = fade_time
+
+    def set_level(self, value, fade=False):
+        """Sequence committing level to ballast, 0 turns it off.
+
+        With fade the gear goes to the level, or off, in its fade time.
+        """
+        if value == 0 and not fade:
+            yield from self.off()
+            return
+        if value != 0:
+            yield from self.ensure_limits()
+        if not self.valid_level(value):
             raise ValueError
-        self.__level = value
-        self.driver.send(gear.DAPC(self.short_address, self.level))
+        yield gear.DAPC(self.short_address, value)
+        self._level = value
         logger.debug(
             "Set lamp <%s> brightness level to %s", self.friendly_name, self.level
         )
 
     def off(self):
-        """Turn off ballast."""
-        self.driver.send(gear.Off(self.short_address))
+        """Sequence turning off ballast."""
+        yield gear.Off(self.short_address)
+        self._level = 0
 
     def __str__(self):
         """Serialize lamp information."""
         return (
-            f"{self.device_name} - address: {self.short_address.address}, "
+            f"{self.device_name} - address: {self.number}, "
             f"actual brightness level: {self.level} (minimum: {self.min_level}, "
             f"max: {self.max_level}, physical minimum: {self.min_physical_level})"
         )
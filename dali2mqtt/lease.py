@@ -0,0 +1,151 @@
+"""Ownership of DALI buses shared between dali2mqtt instances."""
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from dali2mqtt.consts import (
+    ALL_SUPPORTED_LOG_LEVELS,
+    DEFAULT_LEASE_DURATION,
+    LEASE_SETTLE_TIME,
+    LOG_FORMAT,
+)
+
+logging.basicConfig(format=LOG_FORMAT)
+logger = logging.getLogger(__name__)
+
+
+def lease_payload(owner, expires):
+    """Return the retained payload of a lease."""
+    return json.dumps({"owner": owner, "expires": round(expires, 3)})
+
+
+def parse_lease(payload):
+    """Return the owner and expiry of a lease payload, (None, 0) if released."""
+    try:
+        lease = json.loads(payload)
+        return str(lease["owner"]), float(lease["expires"])
+    except (ValueError, TypeError, KeyError):
+        return None, 0
+
+
+class BusLease(threading.Thread):
+    """Thread claiming and renewing the lease of every bus of an instance.
+
+    A lease is a retained message naming the instance driving a bus and
+    when the claim expires. After (re)connecting, an instance waits
+    ``settle`` seconds to hear the retained leases, then claims the buses
+    whose lease is missing, expired or its own, renewing them every third
+    of ``duration``. A bus is taken once the broker echoes the claim, and
+    given up as soon as a live lease of another instance arrives, so
+    when two instances race the last claim delivered wins. Expiry times
+    are wall clock times, the clocks of the instances must roughly agree.
+    """
+
+    def __init__(
+        self,
+        instance,
+        log_level,
+        duration=DEFAULT_LEASE_DURATION,
+        settle=LEASE_SETTLE_TIME,
+        clock=time.time,
+    ):
+        """Initialize bus lease."""
+        super().__init__(name="dali-lease", daemon=True)
+        self.instance = instance
+        self._duration = duration
+        self._settle = settle
+        self._clock = clock
+        self._publish = None
+        self._on_acquire = None
+        self._on_release = None
+        self._leases = {}
+        self._owned = set()
+        self._settled_at = 0
+        self._renew_at = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+        logger.setLevel(ALL_SUPPORTED_LOG_LEVELS[log_level])
+
+    def watch(self, keys, publish, on_acquire, on_release):
+        """Lease the buses in keys, publish(key, payload) claims and report changes.
+
+        on_acquire(key) and on_release(key) are called when a bus is taken
+        or given up. Leases heard so far are forgotten, as after connecting.
+        """
+        with self._lock:
+            self._publish = publish
+            self._on_acquire = on_acquire
+            self._on_release = on_release
+            self._leases = {key: (None, 0) for key in keys}
+            self._settled_at = self._clock() + self._settle
+            self._renew_at = self._settled_at
+
+    def owns(self, key):
+        """Return True if this instance drives the bus."""
+        return key in self._owned
+
+    def on_lease(self, key, payload):
+        """Handle a lease heard on the broker."""
+        owner, expires = parse_lease(payload)
+        with self._lock:
+            if key not in self._leases:
+                return
+            self._leases[key] = (owner, expires)
+            if owner == self.instance:
+                if key in self._owned:
+                    return
+                self._owned.add(key)
+                callback = self._on_acquire
+                logger.info("Instance <%s> owns bus <%s>", self.instance, key)
+            elif key in self._owned and owner is not None and expires > self._clock():
+                self._owned.discard(key)
+                callback = self._on_release
+                logger.warning("Bus <%s> taken over by <%s>", key, owner)
+            else:
+                return
+        callback(key)
+
+    def renew_once(self):
+        """Claim the free buses and renew the owned ones."""
+        now = self._clock()
+        with self._lock:
+            if self._publish is None or now < self._settled_at:
+                return
+            renew = now >= self._renew_at
+            if renew:
+                self._renew_at = now + self._duration / 3
+            claims = [
+                key
+                for key, (owner, expires) in self._leases.items()
+                if (renew and key in self._owned)
+                or (key not in self._owned and (owner is None or expires <= now))
+            ]
+            publish = self._publish
+        for key in claims:
+            publish(key, lease_payload(self.instance, now + self._duration))
+
+    def stop(self):
+        """Stop renewing the leases."""
+        self._stopped.set()
+
+    def run(self):
+        """Claim and renew leases until stopped."""
+        logger.info("Leasing buses as <%s> for %ds", self.instance, self._duration)
+        while not self._stopped.wait(self._settle):
+            try:
+                self.renew_once()
+            except Exception as err:
+                logger.error("Lease renewal failed, %s: %s", type(err).__name__, err)
+
+    async def run_async(self):
+        """Claim and renew leases as an event loop task until stopped."""
+        logger.info("Leasing buses as <%s> for %ds", self.instance, self._duration)
+        while not self._stopped.is_set():
+            await asyncio.sleep(self._settle)
+            try:
+                self.renew_once()
+            except Exception as err:
+                logger.error("Lease renewal failed, %s: %s", type(err).__name__, err)
@@ -0,0 +1,429 @@
+"""Bridge and bus metrics in the Prometheus text format."""
+import logging
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import dali.address as address
+from dali.command import Response, YesNoResponse
+from dali.exceptions import CommunicationError, MissingResponse
+from dali2mqtt.consts import (
+    ALL_SUPPORTED_LOG_LEVELS,
+    HA_DISCOVERY_PREFIX,
+    HA_NODE_DISCOVERY_PREFIX,
+    HA_NODE_SCENE_DISCOVERY_PREFIX,
+    HA_SCENE_DISCOVERY_PREFIX,
+    HA_STATUS_TOPIC,
+    LOG_FORMAT,
+    METRICS_LATENCY_BUCKETS,
+    METRICS_SCAN_BUCKETS,
+    MQTT_BRIGHTNESS_COMMAND_TOPIC,
+    MQTT_BRIGHTNESS_GET_COMMAND_TOPIC,
+    MQTT_BRIGHTNESS_MAX_LEVEL_TOPIC,
+    MQTT_BRIGHTNESS_MIN_LEVEL_TOPIC,
+    MQTT_BRIGHTNESS_PHYSICAL_MINIMUM_LEVEL_TOPIC,
+    MQTT_BRIGHTNESS_STATE_TOPIC,
+    MQTT_COMMAND_TOPIC,
+    MQTT_DALI2MQTT_STATUS,
+    MQTT_DIAGNOSTICS_LATENCY_TOPIC,
+    MQTT_JSON_COMMAND_TOPIC,
+    MQTT_JSON_STATE_TOPIC,
+    MQTT_LEASE_TOPIC,
+    MQTT_SCAN_LAMPS_COMMAND_TOPIC,
+    MQTT_SCAN_LAMPS_RESULT_TOPIC,
+    MQTT_SCENE_RECALL_COMMAND_TOPIC,
+    MQTT_SCENE_REMOVE_COMMAND_TOPIC,
+    MQTT_SCENE_STORE_COMMAND_TOPIC,
+    MQTT_SNAPSHOT_TOPIC,
+    MQTT_STATE_TOPIC,
+)
+
+logging.basicConfig(format=LOG_FORMAT)
+logger = logging.getLogger(__name__)
+
+TOPIC_FAMILIES = [
+    MQTT_STATE_TOPIC,
+    MQTT_COMMAND_TOPIC,
+    MQTT_BRIGHTNESS_STATE_TOPIC,
+    MQTT_BRIGHTNESS_COMMAND_TOPIC,
+    MQTT_BRIGHTNESS_GET_COMMAND_TOPIC,
+    MQTT_JSON_STATE_TOPIC,
+    MQTT_JSON_COMMAND_TOPIC,
+    MQTT_BRIGHTNESS_MAX_LEVEL_TOPIC,
+    MQTT_BRIGHTNESS_MIN_LEVEL_TOPIC,
+    MQTT_BRIGHTNESS_PHYSICAL_MINIMUM_LEVEL_TOPIC,
+    MQTT_SCAN_LAMPS_COMMAND_TOPIC,
+    MQTT_SCAN_LAMPS_RESULT_TOPIC,
+    MQTT_SCENE_STORE_COMMAND_TOPIC,
+    MQTT_SCENE_RECALL_COMMAND_TOPIC,
+    MQTT_SCENE_REMOVE_COMMAND_TOPIC,
+    MQTT_DIAGNOSTICS_LATENCY_TOPIC,
+    MQTT_LEASE_TOPIC,
+    MQTT_SNAPSHOT_TOPIC,
+    HA_DISCOVERY_PREFIX,
+    HA_SCENE_DISCOVERY_PREFIX,
+    HA_NODE_DISCOVERY_PREFIX,
+    HA_NODE_SCENE_DISCOVERY_PREFIX,
+    MQTT_DALI2MQTT_STATUS,
+    HA_STATUS_TOPIC,
+]
+
+
+def topic_family(topic):
+    """Return the topic template (with + wildcards) a topic belongs to."""
+    for template, pattern in _FAMILY_PATTERNS:
+        if pattern.match(topic):
+            return template
+    return "other"
+
+
+def address_label(destination):
+    """Return a short label for a DALI address."""
+    if isinstance(destination, address.Broadcast):
+        return "broadcast"
+    if isinstance(destination, address.Group):
+        return f"group {destination.group}"
+    if isinstance(destination, address.Short):
+        return f"short {destination.address}"
+    return "none"
+
+
+def missing_answer(response):
+    """Tell whether a query expecting data got no backward frame.
+
+    No answer is a valid "no" to yes/no queries.
+    """
+    return (
+        isinstance(response, Response)
+        and not isinstance(response, YesNoResponse)
+        and response.raw_value is None
+    )
+
+
+def _escape(value):
+    """Escape a label value."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    """Format a label set, leaving out empty values as Prometheus does."""
+    pairs = [pair for pair in zip(names, values) if pair[1] != ""] + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """Monotonic counter per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        """Initialize counter."""
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        """Add amount to the counter of a label set."""
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        """Return the counter of a label set."""
+        return self._values.get(label_values, 0)
+
+    def samples(self):
+        """Yield the exposition lines of the counter."""
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            yield f"{self.name}{_labels(self.labels, label_values)} {value}"
+
+
+class Histogram:
+    """Histogram of observations per label set, with cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets, labels=()):
+        """Initialize histogram."""
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = sorted(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        """Record an observation for a label set."""
+        with self._lock:
+            counts, total, count = self._values.get(
+                label_values, ([0] * len(self.buckets), 0, 0)
+            )
+            counts = [
+                bucket + (value <= bound) for bucket, bound in zip(counts, self.buckets)
+            ]
+            self._values[label_values] = (counts, total + value, count + 1)
+
+    def count(self, *label_values):
+        """Return the number of observations of a label set."""
+        return self._values.get(label_values, (None, 0, 0))[2]
+
+    def samples(self):
+        """Yield the exposition lines of the histogram."""
+        with self._lock:
+            values = dict(self._values)
+        for label_values, (counts, total, count) in sorted(values.items()):
+            for bound, bucket in zip(self.buckets + ["+Inf"], counts + [count]):
+                labels = _labels(self.labels, label_values, [("le", bound)])
+                yield f"{self.name}_bucket{labels} {bucket}"
+            yield f"{self.name}_sum{_labels(self.labels, label_values)} {total}"
+            yield f"{self.name}_count{_labels(self.labels, label_values)} {count}"
+
+
+class Gauge:
+    """Value read when the metrics are collected."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, read, labels=(), label_values=()):
+        """Initialize gauge."""
+        self.name = name
+        self.help = help_text
+        self.read = read
+        self.labels = labels
+        self.label_values = label_values
+
+    def samples(self):
+        """Yield the exposition line of the gauge."""
+        yield f"{self.name}{_labels(self.labels, self.label_values)} {self.read()}"
+
+
+class ReadCounter(Gauge):
+    """Monotonic count read when the metrics are collected."""
+
+    kind = "counter"
+
+
+def _family_pattern(template):
+    """Compile a topic template, a leading base topic may span levels."""
+    pattern = "[^/]+".join(map(re.escape, template.split("{}")))
+    if template.startswith("{}"):
+        pattern = ".+" + pattern[len("[^/]+"):]
+    return re.compile(f"^{pattern}$")
+
+
+_FAMILY_PATTERNS = [
+    (template.replace("{}", "+"), _family_pattern(template))
+    for template in dict.fromkeys(TOPIC_FAMILIES)
+]
+
+
+class BridgeMetrics:
+    """Metrics of the DALI bus and of the MQTT bridge."""
+
+    def __init__(self, log_level):
+        """Initialize metrics."""
+        self.dali_latency = Histogram(
+            "dali_command_duration_seconds",
+            "DALI round trip time per command type",
+            METRICS_LATENCY_BUCKETS,
+            ("command",),
+        )
+        self.dali_errors = Counter(
+            "dali_command_errors_total",
+            "DALI commands failed per bus and address",
+            ("bus", "address", "kind"),
+        )
+        self.mqtt_messages = Counter(
+            "mqtt_messages_total",
+            "MQTT messages per direction and topic family",
+            ("direction", "family"),
+        )
+        self.mqtt_skipped = Counter(
+            "mqtt_publishes_skipped_total",
+            "MQTT publishes skipped as repeating the last one on their topic",
+            ("family",),
+        )
+        self.commands_coalesced = Counter(
+            "dali_commands_coalesced_total",
+            "DALI commands superseded by a newer one before reaching the bus",
+            ("bus",),
+        )
+        self.scan_duration = Histogram(
+            "dali_scan_duration_seconds",
+            "Duration of bus scans",
+            METRICS_SCAN_BUCKETS,
+            ("kind",),
+        )
+        self._gauges = []
+        self._data_objects = {}
+
+        logger.setLevel(ALL_SUPPORTED_LOG_LEVELS[log_level])
+
+    def observe_frame(self, command, seconds, error, bus_name=None, response=None):
+        """Record a DALI frame sent on a bus and its outcome.
+
+        Synchronous drivers report a missing answer as a response without
+        a backward frame rather than raising, both count as timeouts.
+        """
+        self.dali_latency.observe(seconds, type(command).__name__)
+        kind = None
+        if error is not None:
+            kind = (
+                "timeout"
+                if isinstance(error, (MissingResponse, CommunicationError))
+                else "error"
+            )
+        elif missing_answer(response):
+            kind = "timeout"
+        if kind is not None:
+            self.dali_errors.inc(
+                bus_name or "", address_label(getattr(command, "destination", None)), kind
+            )
+
+    def count_message(self, direction, topic):
+        """Count an MQTT message received ("in") or published ("out")."""
+        self.mqtt_messages.inc(direction, topic_family(topic))
+
+    def count_skipped(self, topic):
+        """Count a publish skipped as a duplicate of the last one."""
+        self.mqtt_skipped.inc(topic_family(topic))
+
+    def observe_scan(self, kind, seconds):
+        """Record how long a bus scan took."""
+        self.scan_duration.observe(seconds, kind)
+
+    def watch_bus(self, bus, bus_name=None):
+        """Export the queue depth and frame accounting of a bus worker.
+
+        A bus rebuilt under the same name replaces the gauges of the old one.
+        """
+        bus.driver.on_frame = lambda command, seconds, error, response: (
+            self.observe_frame(command, seconds, error, bus_name, response)
+        )
+        label = (bus_name or "",)
+        self._gauges = [gauge for gauge in self._gauges if gauge.label_values != label]
+        self._gauges += [
+            Gauge(
+                "dali_queue_depth",
+                "Sequences waiting for the bus",
+                bus.pending,
+                ("bus",),
+                label,
+            ),
+            ReadCounter(
+                "dali_frames_sent_total",
+                "DALI frames sent since start",
+                lambda: bus.driver.frames,
+                ("bus",),
+                label,
+            ),
+            Gauge(
+                "dali_bus_utilization",
+                "Share of time spent sending DALI frames since start",
+                lambda: bus.driver.stats()["utilization"],
+                ("bus",),
+                label,
+            ),
+            Gauge(
+                "dali_queue_delay_seconds_max",
+                "Longest wait of a frame for the frame rate limit",
+                lambda: bus.driver.max_queue_delay,
+                ("bus",),
+                label,
+            ),
+        ]
+
+    def watch(self, data_object):
+        """Export the number of lamps and groups known on a bus.
+
+        Commands superseded by its coalescer are counted too. The data of a
+        bus watched again, after reconnecting, replaces the old.
+        """
+        bus_name = data_object.get("bus_name") or ""
+        self._data_objects[bus_name] = data_object
+        coalescer = data_object.get("coalescer")
+        if coalescer is not None:
+            coalescer.on_collapse = lambda: self.commands_coalesced.inc(bus_name)
+
+    @staticmethod
+    def _count_lamps(data_object, groups):
+        """Return the number of lamps (or groups) known on a bus."""
+        return sum(
+            1
+            for lamp_object in list(data_object.get("all_lamps", {}).values())
+            if lamp_object.is_group == groups
+        )
+
+    def collect(self):
+        """Return all the metrics."""
+        metrics = [
+            self.dali_latency,
+            self.dali_errors,
+            self.mqtt_messages,
+            self.mqtt_skipped,
+            self.commands_coalesced,
+            self.scan_duration,
+        ]
+        for data_object in list(self._data_objects.values()) or [{}]:
+            label = (data_object.get("bus_name") or "",)
+            metrics += [
+                Gauge(
+                    "dali_lamps",
+                    "Lamps known on the bus",
+                    lambda data_object=data_object: self._count_lamps(data_object, False),
+                    ("bus",),
+                    label,
+                ),
+                Gauge(
+                    "dali_groups",
+                    "Groups known on the bus",
+                    lambda data_object=data_object: self._count_lamps(data_object, True),
+                    ("bus",),
+                    label,
+                ),
+            ]
+        return metrics + self._gauges
+
+    def render(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        families = {}
+        for metric in self.collect():
+            families.setdefault(metric.name, []).append(metric)
+        lines = []
+        for name, metrics in families.items():
+            lines.append(f"# HELP {name} {metrics[0].help}")
+            lines.append(f"# TYPE {name} {metrics[0].kind}")
+            for metric in metrics:
+                lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(metrics, port, host=""):
+    """Serve metrics over HTTP on /metrics from a daemon thread."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug("Metrics request: " + format, *args)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(
+        target=server.serve_forever, name="dali-metrics", daemon=True
+    ).start()
+    logger.info("Serving metrics on port %d", port)
+    return server
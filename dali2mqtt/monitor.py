@@ -0,0 +1,141 @@
+"""Passive monitoring of the level changes made by other bus masters."""
+import asyncio
+import logging
+
+import dali.address as address
+import dali.gear.general as gear
+from dali2mqtt.consts import ALL_SUPPORTED_LOG_LEVELS, DALI_MASK, LOG_FORMAT
+
+logging.basicConfig(format=LOG_FORMAT)
+logger = logging.getLogger(__name__)
+
+# Commands changing levels to values that can't be known without asking
+RELATIVE_COMMANDS = (
+    gear.Up,
+    gear.Down,
+    gear.StepUp,
+    gear.StepDown,
+    gear.OnAndStepUp,
+    gear.StepDownAndOff,
+    gear.GoToLastActiveLevel,
+)
+
+
+def observed_level(lamp_object, command):
+    """Return the level a lamp goes to on a command, DALI_MASK if unchanged.
+
+    None is returned when the level can't be told from the command.
+    """
+    if isinstance(command, gear.DAPC):
+        return command.power
+    if isinstance(command, gear.Off):
+        return 0
+    if isinstance(command, gear.RecallMaxLevel):
+        return lamp_object.max_level
+    if isinstance(command, gear.RecallMinLevel):
+        return lamp_object.min_level
+    if isinstance(command, gear.GoToScene):
+        return lamp_object.scenes.get(command.param, DALI_MASK)
+    if isinstance(command, RELATIVE_COMMANDS):
+        return None
+    return DALI_MASK
+
+
+class BusMonitor:
+    """Follow the frames seen on a bus to keep the lamp levels up to date.
+
+    Registered on the ``bus_traffic`` callbacks of a driver, it decodes
+    level commands sent by any master (wall panels, sensors, another
+    controller) to short addresses, groups or the whole bus, updates the
+    lamps addressed and publishes the ones whose level changed. Lamps
+    given a relative command (up, down, steps) are refreshed from the bus.
+    Drivers only report the frames their interface can see: the tridonic
+    DALI-USB observes the whole bus, the hasseb only its own frames.
+    With loop, frames reported from another thread (synchronous drivers
+    run in the executor) are handled in that event loop.
+    """
+
+    def __init__(self, log_level, loop=None):
+        """Initialize bus monitor."""
+        self._loop = loop
+        self._lamps = {}
+        self._groups = dict
+        self._publish = None
+        self._refresh = None
+        self.observed = 0
+
+        logger.setLevel(ALL_SUPPORTED_LOG_LEVELS[log_level])
+
+    def watch(self, all_lamps, groups, publish, refresh):
+        """Follow the lamps in all_lamps, groups() returns the group members.
+
+        publish(lamp) is called for lamps whose level changed, refresh(lamp)
+        for lamps whose new level must be read from the bus.
+        """
+        self._lamps = all_lamps
+        self._groups = groups
+        self._publish = publish
+        self._refresh = refresh
+
+    def _targets(self, destination):
+        """Return the lamps and groups addressed by a destination."""
+        lamps = list(self._lamps.values())
+        if isinstance(destination, address.Broadcast):
+            return lamps
+        if isinstance(destination, address.Group):
+            members = set(self._groups().get(destination.group, []))
+            return [
+                lamp_object
+                for lamp_object in lamps
+                if (lamp_object.is_group and lamp_object.number == destination.group)
+                or (not lamp_object.is_group and lamp_object.number in members)
+            ]
+        if isinstance(destination, address.Short):
+            return [
+                lamp_object
+                for lamp_object in lamps
+                if not lamp_object.is_group
+                and lamp_object.number == destination.address
+            ]
+        return []
+
+    def on_traffic(self, driver, command, response, config_command_error):  # pylint: disable=W0613
+        """Handle a frame seen on the bus."""
+        if self._publish is None or config_command_error:
+            return
+        if self._loop is not None and not self._in_loop():
+            self._loop.call_soon_threadsafe(self._observe, command)
+            return
+        self._observe(command)
+
+    def _in_loop(self):
+        """Tell whether the caller runs in the event loop of the monitor."""
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def _observe(self, command):
+        """Update the lamps addressed by a command."""
+        destination = getattr(command, "destination", None)
+        if destination is None:
+            return
+        for lamp_object in self._targets(destination):
+            level = observed_level(lamp_object, command)
+            if level == DALI_MASK:
+                continue
+            self.observed += 1
+            if level is None:
+                logger.debug("Refreshing <%s> after %s", lamp_object.device_name, command)
+                self._refresh(lamp_object)
+                continue
+            if level == lamp_object.level:
+                continue
+            try:
+                lamp_object.level = level
+            except ValueError:
+                # clamped by the gear to limits we don't know right
+                self._refresh(lamp_object)
+                continue
+            logger.debug("Observed <%s> going to %s", lamp_object.device_name, level)
+            self._publish(lamp_object)
@@ -0,0 +1,37 @@
+"""Plan the fewest DALI frames for a batch of lamp levels."""
+import dali.address as address
+
+
+def plan_levels(levels, groups, bus_addresses):
+    """Plan the frames committing ``levels`` (short address -> level).
+
+    When the pending levels cover every lamp on the bus with the same value
+    a single broadcast frame is planned. Otherwise every group whose exact
+    members all wait for the same level is folded into one group frame, the
+    largest groups first, and the remaining lamps get unicast frames.
+
+    Returns a list of (dali address, level, short addresses covered).
+    """
+    if not levels:
+        return []
+
+    remaining = dict(levels)
+    if set(remaining) == set(bus_addresses) and len(set(remaining.values())) == 1:
+        return [(address.Broadcast(), next(iter(remaining.values())), sorted(remaining))]
+
+    plan = []
+    for group, members in sorted(
+        groups.items(), key=lambda item: (-len(item[1]), item[0])
+    ):
+        if len(members) < 2 or not all(member in remaining for member in members):
+            continue
+        group_levels = {remaining[member] for member in members}
+        if len(group_levels) != 1:
+            continue
+        plan.append((address.Group(group), group_levels.pop(), sorted(members)))
+        for member in members:
+            del remaining[member]
+
+    for lamp, level in sorted(remaining.items()):
+        plan.append((address.Short(lamp), level, [lamp]))
+    return plan
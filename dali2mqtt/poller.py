@@ -0,0 +1,162 @@
+"""Background polling of lamp levels changed outside dali2mqtt."""
+import asyncio
+import logging
+import threading
+import time
+
+from dali.exceptions import DALIError
+from dali2mqtt.consts import (
+    ALL_SUPPORTED_LOG_LEVELS,
+    BUS_PRIORITY_POLL,
+    LOG_FORMAT,
+    POLL_MAX_INTERVAL,
+    POLL_MIN_INTERVAL,
+)
+
+logging.basicConfig(format=LOG_FORMAT)
+logger = logging.getLogger(__name__)
+
+
+class StatePoller(threading.Thread):
+    """Thread cycling through the lamps with QueryActualLevel.
+
+    Polls run on the lowest bus priority. After each poll the poller idles
+    long enough for polling to stay within ``budget``, its share of bus
+    time; the time a poll waits behind other traffic counts as its own, so
+    a busy bus is polled less. A lamp whose level changed is polled again
+    after ``min_interval``, a stable one twice as late each time up to
+    ``max_interval``, and one not answering after ``max_interval``.
+    """
+
+    def __init__(
+        self,
+        bus,
+        budget,
+        log_level,
+        min_interval=POLL_MIN_INTERVAL,
+        max_interval=POLL_MAX_INTERVAL,
+        name="dali-poller",
+    ):
+        """Initialize state poller."""
+        super().__init__(name=name, daemon=True)
+        self._bus = bus
+        self._budget = budget
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._lamps = {}
+        self._publish = None
+        self._report = None
+        self._schedule = {}
+        self._stopped = threading.Event()
+
+        logger.setLevel(ALL_SUPPORTED_LOG_LEVELS[log_level])
+
+    def watch(self, all_lamps, publish, report=None):
+        """Poll the lamps in all_lamps, calling publish(lamp) on changes.
+
+        report(lamp, answered), when given, is called after every poll.
+        """
+        self._lamps = all_lamps
+        self._publish = publish
+        self._report = report
+        self._schedule = {}
+
+    def stop(self):
+        """Stop polling."""
+        self._stopped.set()
+
+    def interval(self, name):
+        """Return the current polling interval of a lamp."""
+        return self._schedule.get(name, (0, self._min_interval))[1]
+
+    def _next_due(self):
+        """Return the name and due time of the lamp to poll next."""
+        now = time.monotonic()
+        names = [
+            name
+            for name, lamp_object in list(self._lamps.items())
+            if not lamp_object.is_group
+        ]
+        for name in set(self._schedule) - set(names):
+            del self._schedule[name]
+        if not names:
+            return None, now + self._max_interval
+        for name in names:
+            self._schedule.setdefault(name, (now, self._min_interval))
+        name = min(names, key=lambda name: self._schedule[name][0])
+        return name, self._schedule[name][0]
+
+    def _poll(self, lamp_object):
+        """Sequence reading a lamp level, returning whether it changed."""
+        level = lamp_object.level
+        try:
+            yield from lamp_object.actual_level()
+        except DALIError as err:
+            logger.debug("Polling <%s> failed: %s", lamp_object.device_name, err)
+            return None
+        return lamp_object.level != level
+
+    def _due(self):
+        """Return the name of the lamp to poll now, or None and how long to wait."""
+        name, due = self._next_due()
+        now = time.monotonic()
+        if name is None or due > now:
+            return None, due - now
+        return name, 0
+
+    def _polled(self, name, lamp_object, changed, elapsed):
+        """Reschedule a polled lamp, returning how long to idle afterwards."""
+        if changed is None:
+            interval = self._max_interval
+        elif changed:
+            interval = self._min_interval
+            logger.debug("Polled <%s> changed to %s", name, lamp_object.level)
+            self._publish(lamp_object)
+        else:
+            interval = min(self.interval(name) * 2, self._max_interval)
+        if self._report is not None:
+            self._report(lamp_object, changed is not None)
+        self._schedule[name] = (time.monotonic() + interval, interval)
+        return elapsed * (1 - self._budget) / self._budget
+
+    def poll_once(self):
+        """Poll the lamp due next, returning how long to idle afterwards."""
+        name, delay = self._due()
+        if name is None:
+            return delay
+        lamp_object = self._lamps[name]
+        started = time.monotonic()
+        changed = self._bus.submit(BUS_PRIORITY_POLL, self._poll(lamp_object)).result()
+        return self._polled(name, lamp_object, changed, time.monotonic() - started)
+
+    async def poll_once_async(self):
+        """Poll the lamp due next on an AsyncBus, returning how long to idle."""
+        name, delay = self._due()
+        if name is None:
+            return delay
+        lamp_object = self._lamps[name]
+        started = time.monotonic()
+        changed = await self._bus.submit(BUS_PRIORITY_POLL, self._poll(lamp_object))
+        return self._polled(name, lamp_object, changed, time.monotonic() - started)
+
+    def run(self):
+        """Poll lamps until stopped."""
+        logger.info("Polling lamp levels with %d%% of bus time", self._budget * 100)
+        delay = 0
+        while not self._stopped.wait(delay):
+            try:
+                delay = self.poll_once()
+            except Exception as err:
+                logger.error("Polling failed, %s: %s", type(err).__name__, err)
+                delay = self._min_interval
+
+    async def run_async(self):
+        """Poll lamps as an event loop task until stopped."""
+        logger.info("Polling lamp levels with %d%% of bus time", self._budget * 100)
+        while not self._stopped.is_set():
+            try:
+                delay = await self.poll_once_async()
+            except Exception as err:
+                logger.error("Polling failed, %s: %s", type(err).__name__, err)
+                delay = self._min_interval
+            await asyncio.sleep(delay)
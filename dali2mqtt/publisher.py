@@ -0,0 +1,282 @@
+"""MQTT publish layer skipping payloads that did not change."""
+import collections
+import logging
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+from dali2mqtt.consts import (
+    DEFAULT_PUBLISH_QOS,
+    DEFAULT_PUBLISH_WINDOW,
+    LOG_FORMAT,
+    PUBLISH_EARLY_DELIVERIES,
+    PUBLISH_PROGRESS_EVERY,
+)
+
+logging.basicConfig(format=LOG_FORMAT)
+logger = logging.getLogger(__name__)
+
+
+def encode_payload(payload):
+    """Encode a payload the way paho sends it."""
+    if payload is None:
+        return b""
+    if isinstance(payload, bytes):
+        return payload
+    if isinstance(payload, str):
+        return payload.encode("utf-8")
+    return str(payload).encode("utf-8")
+
+
+class PublishCache:
+    """Last payload and retain flag published on every topic."""
+
+    def __init__(self):
+        """Initialize publish cache."""
+        self._last = {}
+        self._lock = threading.Lock()
+        self.published = 0
+        self.skipped = 0
+
+    def changed(self, topic, payload, retain, force=False):
+        """Record a publish, returning False if it repeats the last one."""
+        message = (encode_payload(payload), bool(retain))
+        with self._lock:
+            if not force and self._last.get(topic) == message:
+                self.skipped += 1
+                return False
+            self._last[topic] = message
+            self.published += 1
+            return True
+
+    def forget(self, topic):
+        """Forget a topic whose publish failed."""
+        with self._lock:
+            self._last.pop(topic, None)
+
+    def clear(self):
+        """Forget every topic, so the next publishes all go out."""
+        with self._lock:
+            self._last = {}
+
+
+class DedupClient(mqtt.Client):
+    """MQTT client not repeating a publish identical to the last on a topic.
+
+    Messages received, published and skipped are counted in ``metrics``
+    when set.
+    A publish can report its delivery to an ``on_delivered`` callback,
+    the client owns ``on_publish`` for that.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Initialize client."""
+        super().__init__(*args, **kwargs)
+        self.publish_cache = PublishCache()
+        self.metrics = None
+        self.bulk_window = DEFAULT_PUBLISH_WINDOW
+        self.bulk_qos = DEFAULT_PUBLISH_QOS
+        self._deliveries = {}
+        # deliveries reported before their publish() returned
+        self._early = collections.deque(maxlen=PUBLISH_EARLY_DELIVERIES)
+        self._delivery_lock = threading.Lock()
+        self.on_publish = self._report_delivery
+
+    def bulk(self):
+        """Return a BulkPublisher with the window and QoS of the client."""
+        return BulkPublisher(self, self.bulk_window, self.bulk_qos)
+
+    def _report_delivery(self, client, userdata, mid):  # pylint: disable=W0613
+        """Report a delivered message to its callback."""
+        with self._delivery_lock:
+            callback = self._deliveries.pop(mid, None)
+            if callback is None:
+                self._early.append(mid)
+                return
+        callback()
+
+    def message_callback_add(self, sub, callback):
+        """Register a message callback, counting the messages it gets."""
+        if self.metrics is None:
+            super().message_callback_add(sub, callback)
+            return
+
+        def counted(client, userdata, msg):
+            self.metrics.count_message("in", msg.topic)
+            callback(client, userdata, msg)
+
+        super().message_callback_add(sub, counted)
+
+    def publish(
+        self,
+        topic,
+        payload=None,
+        qos=0,
+        retain=False,
+        properties=None,
+        force=False,
+        on_delivered=None,
+    ):
+        """Publish a message, unless identical to the last one (or forced).
+
+        on_delivered() is called once the message is written to the
+        socket (QoS 0) or acknowledged (QoS 1), not when it is skipped.
+        """
+        if not self.publish_cache.changed(topic, payload, retain, force):
+            logger.debug("Skipping unchanged publish on %s", topic)
+            if self.metrics is not None:
+                self.metrics.count_skipped(topic)
+            return None
+        info = super().publish(topic, payload, qos, retain, properties)
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            self.publish_cache.forget(topic)
+            return info
+        if self.metrics is not None:
+            self.metrics.count_message("out", topic)
+        if on_delivered is not None:
+            with self._delivery_lock:
+                delivered = info.mid in self._early
+                if delivered:
+                    self._early.remove(info.mid)
+                else:
+                    self._deliveries[info.mid] = on_delivered
+            if delivered:
+                on_delivered()
+        return info
+
+
+class BulkPublisher:
+    """Publish many messages with at most ``window`` of them in flight.
+
+    Messages are queued and sent as the earlier ones are delivered, so a
+    burst such as the discovery of a whole bus cannot flood the client.
+    Once closed, the callbacks of when_done() run after the last message
+    is delivered. Duplicates skipped by the client and failed publishes
+    count as done at once.
+    """
+
+    def __init__(self, client, window=DEFAULT_PUBLISH_WINDOW, qos=DEFAULT_PUBLISH_QOS):
+        """Initialize bulk publisher."""
+        self.client = client
+        self.window = window
+        self.qos = qos
+        self.queued = 0
+        self.delivered = 0
+        self.skipped = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self._queue = collections.deque()
+        self._in_flight = 0
+        self._waiting = 0
+        self._closed = False
+        self._finished = False
+        self._pumping = False
+        self._done = []
+        self._lock = threading.Lock()
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        """Queue a message, sent as soon as the window allows."""
+        with self._lock:
+            self._queue.append((topic, payload, max(qos, self.qos), retain))
+            self.queued += 1
+        self._pump()
+
+    def close(self):
+        """Accept no more messages, finishing once the queued ones are delivered."""
+        with self._lock:
+            self._closed = True
+        self._pump()
+
+    def close_after(self, futures):
+        """Close once every future (of the sequences publishing) is done."""
+        futures = list(futures)
+        if not futures:
+            self.close()
+            return
+        with self._lock:
+            self._waiting += len(futures)
+        for future in futures:
+            future.add_done_callback(self._future_done)
+
+    def when_done(self, callback):
+        """Call callback() once closed and every message is delivered."""
+        with self._lock:
+            if not self._finished:
+                self._done.append(callback)
+                return
+        callback()
+
+    def progress(self):
+        """Return the number of messages done and queued so far."""
+        with self._lock:
+            return self.delivered + self.skipped + self.failed, self.queued
+
+    def _future_done(self, future):  # pylint: disable=W0613
+        """Close when the last of the futures is done."""
+        with self._lock:
+            self._waiting -= 1
+            last = self._waiting == 0
+        if last:
+            self.close()
+
+    def _delivered(self):
+        """Free the window slot of a delivered message."""
+        with self._lock:
+            self._in_flight -= 1
+            self.delivered += 1
+            if self.delivered % PUBLISH_PROGRESS_EVERY == 0:
+                logger.debug("Bulk publish %d/%d delivered", self.delivered, self.queued)
+        self._pump()
+
+    def _send(self, topic, payload, qos, retain):
+        """Publish one message, freeing its slot at once if nothing will be delivered."""
+        try:
+            info = self.client.publish(
+                topic, payload, qos, retain, on_delivered=self._delivered
+            )
+            failed = info is not None and info.rc != mqtt.MQTT_ERR_SUCCESS
+        except (ValueError, OSError) as err:
+            logger.error("Bulk publish on %s failed: %s", topic, err)
+            info, failed = None, True
+        if info is not None and not failed:
+            return
+        with self._lock:
+            self._in_flight -= 1
+            if failed:
+                self.failed += 1
+            else:
+                self.skipped += 1
+
+    def _pump(self):
+        """Send queued messages while the window has room, finish when drained."""
+        with self._lock:
+            if self._pumping:
+                return
+            self._pumping = True
+        while True:
+            with self._lock:
+                if not self._queue or self._in_flight >= self.window:
+                    self._pumping = False
+                    finished = (
+                        self._closed
+                        and not self._finished
+                        and not self._queue
+                        and self._in_flight == 0
+                    )
+                    if finished:
+                        self._finished = True
+                        callbacks, self._done = self._done, []
+                    break
+                message = self._queue.popleft()
+                self._in_flight += 1
+            self._send(*message)
+        if finished:
+            logger.info(
+                "Bulk publish of %d messages done in %.2fs, %d skipped, %d failed",
+                self.queued,
+                time.monotonic() - self.started,
+                self.skipped,
+                self.failed,
+            )
+            for callback in callbacks:
+                callback()
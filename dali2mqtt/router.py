@@ -0,0 +1,34 @@
+"""Route MQTT command topics to lamps without parsing them."""
+
+
+class TopicRouter:
+    """Map the exact command topics of every lamp to a (lamp, action) pair.
+
+    ``actions`` maps a topic template, formatted with the base topic and the
+    lamp device name, to the action to dispatch for it.
+    """
+
+    def __init__(self, base_topic, actions):
+        """Initialize router."""
+        self._base_topic = base_topic
+        self._actions = actions
+        self._routes = {}
+
+    def rebuild(self, all_lamps):
+        """Rebuild the routes for the lamps given, replacing them at once."""
+        routes = {}
+        for lamp_object in list(all_lamps.values()):
+            for template, action in self._actions.items():
+                routes[template.format(self._base_topic, lamp_object.device_name)] = (
+                    lamp_object,
+                    action,
+                )
+        self._routes = routes
+
+    def resolve(self, topic):
+        """Return the (lamp, action) routed for a topic, or None."""
+        return self._routes.get(topic)
+
+    def __len__(self):
+        """Return the number of routes."""
+        return len(self._routes)
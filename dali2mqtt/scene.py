@@ -0,0 +1,97 @@
+"""DALI scenes shared by all the lamps on the bus."""
+import json
+import logging
+
+import dali.address as address
+import dali.gear.general as gear
+from dali2mqtt.consts import (
+    DALI_MASK,
+    LOG_FORMAT,
+    MQTT_AVAILABLE,
+    MQTT_DALI2MQTT_STATUS,
+    MQTT_NOT_AVAILABLE,
+    MQTT_PAYLOAD_ON,
+    MQTT_SCENE_RECALL_COMMAND_TOPIC,
+)
+from dali2mqtt.lamp import gen_ha_device_config
+
+logging.basicConfig(format=LOG_FORMAT)
+logger = logging.getLogger(__name__)
+
+
+def bus_lamps(all_lamps):
+    """Return the lamps (not groups) known on the bus."""
+    return [lamp_object for lamp_object in all_lamps.values() if not lamp_object.is_group]
+
+
+def known_scenes(all_lamps):
+    """Return the scenes stored in at least one lamp."""
+    return sorted(
+        {scene for lamp_object in bus_lamps(all_lamps) for scene in lamp_object.scenes}
+    )
+
+
+def store_scene(all_lamps, scene):
+    """Sequence storing the actual level of every lamp into a scene.
+
+    The scene table is read back from the lamps afterwards, as the cached
+    levels may miss group commands or changes made outside the bridge.
+    Lamps not answering are left out of the scene.
+    """
+    yield [
+        gear.StoreActualLevelInDTR0(address.Broadcast()),
+        gear.SetScene(address.Broadcast(), scene),
+    ]
+    for lamp_object in bus_lamps(all_lamps):
+        response = yield gear.QuerySceneLevel(lamp_object.short_address, scene)
+        level = response.value if isinstance(response.value, int) else DALI_MASK
+        if level == DALI_MASK:
+            lamp_object.scenes.pop(scene, None)
+        else:
+            lamp_object.scenes[scene] = level
+    logger.info("Stored scene %d", scene)
+
+
+def recall_scene(all_lamps, scene):
+    """Sequence recalling a scene, returning the lamps whose level changed."""
+    yield gear.GoToScene(address.Broadcast(), scene)
+    changed = []
+    for lamp_object in bus_lamps(all_lamps):
+        level = lamp_object.scenes.get(scene, DALI_MASK)
+        if level is not None and level != DALI_MASK:
+            lamp_object.level = level
+            changed.append(lamp_object)
+    logger.debug("Recalled scene %d on %d lamps", scene, len(changed))
+    return changed
+
+
+def remove_scene(all_lamps, scene):
+    """Sequence removing every lamp from a scene."""
+    yield gear.RemoveFromScene(address.Broadcast(), scene)
+    for lamp_object in bus_lamps(all_lamps):
+        lamp_object.scenes.pop(scene, None)
+    logger.info("Removed scene %d", scene)
+
+
+def scene_object_id(scene, bus_name=None):
+    """Return the Home Assistant object id of a scene of a bus."""
+    return f"{bus_name}_{scene}" if bus_name else str(scene)
+
+
+def gen_ha_scene_config(
+    scene, model, mqtt_base_topic, bus_name=None, availability_topic=None
+):
+    """Generate a automatic configuration of a scene for Home Assistant."""
+    object_id = scene_object_id(scene, bus_name)
+    json_config = {
+        "name": f"DALI scene {bus_name} {scene}" if bus_name else f"DALI scene {scene}",
+        "def_ent_id": f"dali_scene_{object_id}",
+        "uniq_id": f"{model}_scene_{object_id}",
+        "cmd_t": MQTT_SCENE_RECALL_COMMAND_TOPIC.format(mqtt_base_topic, scene),
+        "pl_on": MQTT_PAYLOAD_ON.decode("utf-8"),
+        "avty_t": availability_topic or MQTT_DALI2MQTT_STATUS.format(mqtt_base_topic),
+        "pl_avail": MQTT_AVAILABLE,
+        "pl_not_avail": MQTT_NOT_AVAILABLE,
+        "device": gen_ha_device_config(model, bus_name),
+    }
+    return json.dumps(json_config)
@@ -0,0 +1,202 @@
+"""Compact retained snapshot of the state of a whole bus."""
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from dali2mqtt.consts import (
+    ALL_SUPPORTED_LOG_LEVELS,
+    DALI_MASK,
+    DALI_SHORT_ADDRESSES,
+    LOG_FORMAT,
+    SNAPSHOT_INTERVAL,
+)
+
+logging.basicConfig(format=LOG_FORMAT)
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+
+def _mask(addresses):
+    """Return a set of short addresses as a 64 bit hex mask."""
+    return f"{sum(1 << number for number in addresses):016x}"
+
+
+def _unmask(mask):
+    """Return the short addresses of a 64 bit hex mask."""
+    bits = int(mask, 16)
+    return [number for number in range(DALI_SHORT_ADDRESSES) if bits >> number & 1]
+
+
+def encode_snapshot(levels, present, faults, groups, timestamp):
+    """Return the payload of a snapshot.
+
+    levels holds one byte per short address (255 when unknown), present
+    and faults are sets of short addresses and groups maps a group
+    number to its members. Address sets are 64 bit hex masks, bit n for
+    short address n, levels a hex string of 2 digits per address.
+    """
+    return json.dumps(
+        {
+            "v": SNAPSHOT_VERSION,
+            "ts": round(timestamp, 3),
+            "present": _mask(present),
+            "on": _mask(
+                number for number in present if levels[number] not in (0, DALI_MASK)
+            ),
+            "fault": _mask(faults),
+            "levels": bytes(levels).hex(),
+            "groups": {
+                str(group): _mask(members)
+                for group, members in sorted(groups.items())
+                if members
+            },
+        },
+        separators=(",", ":"),
+    )
+
+
+def parse_snapshot(payload):
+    """Return the lamps {address: (level, on, fault)} and groups of a snapshot."""
+    snapshot = json.loads(payload)
+    levels = bytes.fromhex(snapshot["levels"])
+    on = set(_unmask(snapshot["on"]))
+    faults = set(_unmask(snapshot["fault"]))
+    lamps = {
+        number: (
+            None if levels[number] == DALI_MASK else levels[number],
+            number in on,
+            number in faults,
+        )
+        for number in _unmask(snapshot["present"])
+    }
+    groups = {int(group): _unmask(mask) for group, mask in snapshot["groups"].items()}
+    return lamps, groups
+
+
+class BusSnapshot(threading.Thread):
+    """Thread publishing a retained snapshot of every lamp of a bus.
+
+    Lamp changes update the snapshot in place, it is encoded and published
+    at most once per ``interval`` seconds and only when something changed.
+    A lamp is flagged faulty when a command or query to it fails, until
+    its state is published again.
+    """
+
+    def __init__(self, log_level, interval=SNAPSHOT_INTERVAL, name="dali-snapshot"):
+        """Initialize bus snapshot."""
+        super().__init__(name=name, daemon=True)
+        self._interval = interval
+        self._levels = bytearray([DALI_MASK] * DALI_SHORT_ADDRESSES)
+        self._present = set()
+        self._faults = set()
+        self._groups = dict
+        self._publish = None
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+        logger.setLevel(ALL_SUPPORTED_LOG_LEVELS[log_level])
+
+    def watch(self, groups, publish):
+        """Snapshot a bus, groups() returns its group members, publish(payload) sends it.
+
+        Lamps known so far are forgotten, as after connecting.
+        """
+        with self._lock:
+            self._groups = groups
+            self._publish = publish
+            self._clear()
+
+    def _clear(self):
+        """Forget every lamp."""
+        self._levels[:] = bytes([DALI_MASK] * DALI_SHORT_ADDRESSES)
+        self._present = set()
+        self._faults = set()
+        self._dirty = False
+
+    def clear(self):
+        """Forget every lamp, without publishing, when the bus is given up."""
+        with self._lock:
+            self._clear()
+
+    def update(self, lamp_object):
+        """Record the level of a lamp, clearing its fault."""
+        with self._lock:
+            self._dirty = True
+            if lamp_object.is_group:
+                return
+            number = lamp_object.number
+            level = lamp_object.level
+            self._levels[number] = DALI_MASK if level is None else level
+            self._present.add(number)
+            self._faults.discard(number)
+
+    def remove(self, lamp_object):
+        """Forget a lamp that left the bus."""
+        with self._lock:
+            self._dirty = True
+            if lamp_object.is_group:
+                return
+            self._levels[lamp_object.number] = DALI_MASK
+            self._present.discard(lamp_object.number)
+            self._faults.discard(lamp_object.number)
+
+    def fault(self, lamp_object, failed=True):
+        """Flag (or clear) a lamp whose last command or query failed."""
+        if lamp_object.is_group:
+            return
+        with self._lock:
+            if (lamp_object.number in self._faults) == failed:
+                return
+            self._dirty = True
+            if failed:
+                self._faults.add(lamp_object.number)
+            else:
+                self._faults.discard(lamp_object.number)
+
+    def payload(self):
+        """Return the snapshot as published."""
+        with self._lock:
+            return self._encode()
+
+    def _encode(self):
+        """Encode the snapshot, with the lock held."""
+        return encode_snapshot(
+            self._levels, self._present, self._faults, self._groups(), time.time()
+        )
+
+    def publish_once(self):
+        """Publish the snapshot if it changed since last published."""
+        with self._lock:
+            if not self._dirty or self._publish is None:
+                return
+            self._dirty = False
+            payload = self._encode()
+            publish = self._publish
+        publish(payload)
+
+    def stop(self):
+        """Stop publishing."""
+        self._stopped.set()
+
+    def run(self):
+        """Publish changes until stopped."""
+        logger.info("Publishing bus snapshot at most every %ss", self._interval)
+        while not self._stopped.wait(self._interval):
+            try:
+                self.publish_once()
+            except Exception as err:
+                logger.error("Snapshot failed, %s: %s", type(err).__name__, err)
+
+    async def run_async(self):
+        """Publish changes as an event loop task until stopped."""
+        logger.info("Publishing bus snapshot at most every %ss", self._interval)
+        while not self._stopped.is_set():
+            await asyncio.sleep(self._interval)
+            try:
+                self.publish_once()
+            except Exception as err:
+                logger.error("Snapshot failed, %s: %s", type(err).__name__, err)
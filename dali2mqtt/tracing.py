@@ -0,0 +1,159 @@
+"""Latency tracing of commands from MQTT receive to state publish."""
+import collections
+import heapq
+import json
+import logging
+import threading
+import time
+import uuid
+
+from dali2mqtt.consts import (
+    ALL_SUPPORTED_LOG_LEVELS,
+    LOG_FORMAT,
+    TRACE_REPORT_INTERVAL,
+    TRACE_SLOWEST,
+    TRACE_WINDOW,
+)
+
+logging.basicConfig(format=LOG_FORMAT)
+logger = logging.getLogger(__name__)
+
+
+class Trace:
+    """Timestamps of the stages a command went through."""
+
+    __slots__ = ("tracer", "trace_id", "kind", "topic", "stages")
+
+    def __init__(self, tracer, kind, topic, received):
+        """Initialize trace."""
+        self.tracer = tracer
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.topic = topic
+        self.stages = [("received", received)]
+
+    @property
+    def total(self):
+        """Return seconds from receive to the last stage."""
+        return self.stages[-1][1] - self.stages[0][1]
+
+    def as_dict(self):
+        """Return the trace with stage offsets in milliseconds."""
+        received = self.stages[0][1]
+        return {
+            "id": self.trace_id,
+            "kind": self.kind,
+            "topic": self.topic,
+            "total_ms": round(self.total * 1000, 3),
+            "stages": {
+                stage: round((stamp - received) * 1000, 3)
+                for stage, stamp in self.stages
+            },
+        }
+
+
+def mark(trace, stage):
+    """Timestamp a stage of a trace, if the command is traced."""
+    if trace is not None:
+        trace.stages.append((stage, time.monotonic()))
+
+
+def finish(trace, stage="published"):
+    """Timestamp the last stage of a trace and hand it to its tracer."""
+    if trace is not None:
+        mark(trace, stage)
+        trace.tracer.finish(trace)
+
+
+def percentile(values, share):
+    """Return the nearest-rank percentile of sorted values."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, round(share * len(values)) - 1))]
+
+
+class Tracer:
+    """Collect finished traces and report the slowest and the percentiles.
+
+    Reports go to ``path`` as JSON lines when given, otherwise to the
+    publish callback set with watch(), at most every ``report_interval``
+    seconds.
+    """
+
+    def __init__(
+        self,
+        log_level,
+        path=None,
+        slowest=TRACE_SLOWEST,
+        window=TRACE_WINDOW,
+        report_interval=TRACE_REPORT_INTERVAL,
+    ):
+        """Initialize tracer."""
+        self._path = path
+        self._slowest_count = slowest
+        self._report_interval = report_interval
+        self._publish = None
+        self._totals = collections.deque(maxlen=window)
+        self._slowest = []
+        self._count = 0
+        self._reported = time.monotonic()
+        self._lock = threading.Lock()
+
+        logger.setLevel(ALL_SUPPORTED_LOG_LEVELS[log_level])
+
+    def watch(self, publish):
+        """Send reports to publish(payload) unless writing to a file."""
+        self._publish = publish
+
+    def start(self, kind, msg):
+        """Start a trace for an MQTT message."""
+        trace = Trace(self, kind, msg.topic, msg.timestamp or time.monotonic())
+        mark(trace, "dispatched")
+        return trace
+
+    def finish(self, trace):
+        """Record a finished trace, reporting if it is time to."""
+        logger.debug("Trace %s", trace.as_dict())
+        with self._lock:
+            self._count += 1
+            self._totals.append(trace.total)
+            entry = (trace.total, trace.trace_id, trace)
+            if len(self._slowest) < self._slowest_count:
+                heapq.heappush(self._slowest, entry)
+            else:
+                heapq.heappushpop(self._slowest, entry)
+            due = time.monotonic() - self._reported >= self._report_interval
+            if due:
+                self._reported = time.monotonic()
+        if due:
+            self.report()
+
+    def summary(self):
+        """Return the percentiles of the recent traces and the slowest ones."""
+        with self._lock:
+            totals = sorted(self._totals)
+            slowest = sorted(self._slowest, reverse=True)
+            count = self._count
+
+        def ms(value):
+            return None if value is None else round(value * 1000, 3)
+
+        return {
+            "count": count,
+            "p50_ms": ms(percentile(totals, 0.5)),
+            "p90_ms": ms(percentile(totals, 0.9)),
+            "p99_ms": ms(percentile(totals, 0.99)),
+            "slowest": [trace.as_dict() for _, _, trace in slowest],
+        }
+
+    def report(self):
+        """Write or publish the summary of the traces."""
+        payload = json.dumps(self.summary())
+        if self._path:
+            try:
+                with open(self._path, "a", encoding="utf8") as outfile:
+                    outfile.write(payload + "\n")
+            except OSError as err:
+                logger.error("Could not write traces to %s: %s", self._path, err)
+        elif self._publish is not None:
+            self._publish(payload)
@@ -0,0 +1,68 @@
+"""Debounced watching of a file through watchdog."""
+import os
+import threading
+
+from dali2mqtt.consts import CONFIG_DEBOUNCE_TIME
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+
+class FileWatcher:
+    """Call back once a file stops changing.
+
+    Changes are noticed through inotify where the platform has it. The
+    directory holding the file is watched, so editors replacing the file
+    are seen too. A burst of events, as an editor saving in several steps
+    makes, calls back once, debounce seconds after the last. With loop,
+    the callback runs in that event loop instead of a timer thread.
+    """
+
+    def __init__(self, path, callback, debounce=CONFIG_DEBOUNCE_TIME, loop=None):
+        """Initialize file watcher."""
+        self._path = os.path.abspath(path)
+        self._callback = callback
+        self._debounce = debounce
+        self._loop = loop
+        self._observer = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start watching."""
+        event_handler = FileSystemEventHandler()
+        event_handler.on_any_event = self._on_event
+        self._observer = Observer()
+        self._observer.schedule(event_handler, os.path.dirname(self._path))
+        self._observer.start()
+
+    def stop(self):
+        """Stop watching, dropping a pending callback."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+        if self._observer is not None:
+            self._observer.stop()
+            if self._observer.is_alive():
+                self._observer.join()
+
+    def _on_event(self, event):
+        """Schedule the callback when an event concerns the file."""
+        paths = {event.src_path, getattr(event, "dest_path", "")}
+        if self._path not in {os.path.abspath(os.fsdecode(path)) for path in paths if path}:
+            return
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._schedule)
+        else:
+            self._schedule()
+
+    def _schedule(self):
+        """(Re)start the debounce timer of the callback."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            if self._loop is not None:
+                self._timer = self._loop.call_later(self._debounce, self._callback)
+            else:
+                self._timer = threading.Timer(self._debounce, self._callback)
+                self._timer.daemon = True
+                self._timer.start()
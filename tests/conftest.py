@@ -0,0 +1,49 @@
+"""Helpers shared by the tests."""
+
+from concurrent.futures import Future
+
+from dali2mqtt.bus import run_sequence
+
+
+class FakeClock:
+    """Clock moving only when told to, callable or as a time module."""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.now += delay
+
+
+class EchoDriver:
+    """Driver answering every command with the command in upper case."""
+
+    def send(self, command):
+        return command.upper()
+
+
+class SyncBus:
+    """Bus running sequences right away on a driver."""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.model = type(driver).__name__
+
+    def submit(self, priority, sequence):
+        future = Future()
+        future.set_result(run_sequence(self.driver, sequence))
+        return future
+
+
+def sequence(name, frames, log):
+    """Sequence of frames commands named after it, logging the responses."""
+    for frame in range(frames):
+        response = yield f"{name}{frame}"
+        log.append(response)
+    return name
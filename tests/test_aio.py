@@ -0,0 +1,98 @@
+"""Tests for the asyncio runtime."""
+
+import asyncio
+
+import dali.gear.general as gear
+from dali.address import Short
+from dali.exceptions import CommunicationError
+from dali2mqtt.aio import AsyncBus
+from dali2mqtt.consts import BUS_PRIORITY_COMMAND, BUS_PRIORITY_SCAN
+from dali2mqtt.emulator import BusEmulator
+from dali2mqtt.lamp import Lamp
+from dali2mqtt.poller import StatePoller
+from tests.conftest import EchoDriver, sequence
+
+
+class SilentDriver:
+    """Async driver never answering."""
+
+    async def send(self, command, in_transaction=False):
+        await asyncio.sleep(10)
+
+
+def test_async_bus_runs_sequences_by_priority():
+    async def run():
+        bus = AsyncBus(EchoDriver(), "debug")
+        log = []
+        scan = bus.submit(BUS_PRIORITY_SCAN, sequence("scan", 2, log))
+        command = bus.submit(BUS_PRIORITY_COMMAND, sequence("command", 1, log))
+        bus.start()
+        results = await asyncio.gather(scan, command)
+        bus.stop()
+        return results, log, bus.driver.frames
+
+    results, log, frames = asyncio.run(run())
+    assert results == ["scan", "command"]
+    assert log == ["COMMAND0", "SCAN0", "SCAN1"]
+    assert frames == 3
+
+
+def test_async_bus_reads_lamp_values():
+    async def run():
+        emulator = BusEmulator("debug", [3], time_scale=0)
+        emulator.gear[3].go_to(120, 0)
+        bus = AsyncBus(emulator, "debug")
+        bus.start()
+        lamp = Lamp("debug", "Mock", "3", Short(3))
+        await bus.submit(BUS_PRIORITY_SCAN, lamp.query_values())
+        return lamp
+
+    lamp = asyncio.run(run())
+    assert lamp.level == 120
+    assert lamp.max_level == 254
+
+
+def test_async_bus_times_out_transactions():
+    def waiting():
+        try:
+            yield gear.Off(Short(1))
+        except CommunicationError as err:
+            return str(err)
+
+    async def run():
+        bus = AsyncBus(SilentDriver(), "debug", timeout=0.05)
+        bus.start()
+        return await bus.submit(BUS_PRIORITY_COMMAND, waiting())
+
+    assert asyncio.run(run()) == "No answer from the bus within 0.05s"
+
+
+def test_async_bus_drops_cancelled_sequences():
+    async def run():
+        bus = AsyncBus(EchoDriver(), "debug")
+        log = []
+        cancelled = bus.submit(BUS_PRIORITY_COMMAND, sequence("cancelled", 1, log))
+        kept = bus.submit(BUS_PRIORITY_SCAN, sequence("kept", 1, log))
+        cancelled.cancel()
+        bus.start()
+        await kept
+        return log
+
+    assert asyncio.run(run()) == ["KEPT0"]
+
+
+def test_poll_on_async_bus():
+    async def run():
+        emulator = BusEmulator("debug", [1], time_scale=0)
+        bus = AsyncBus(emulator, "debug")
+        bus.start()
+        published = []
+        lamp = Lamp("debug", "Mock", "1", Short(1), level=0)
+        poller = StatePoller(bus, 0.5, "debug", min_interval=0, max_interval=8)
+        poller.watch({"1": lamp}, published.append)
+        emulator.gear[1].go_to(80, 0)
+        await poller.poll_once_async()
+        return published
+
+    published = asyncio.run(run())
+    assert [lamp.level for lamp in published] == [80]
@@ -0,0 +1,258 @@
+"""Benchmarks of the hot paths against a simulated bus.
+
+Frame and publish counts are asserted against their budgets, wall
+times are printed (run with ``pytest -s tests/test_benchmark.py``) and
+only checked against generous bounds.
+"""
+
+import re
+import time
+import timeit
+from unittest import mock
+
+import dali.address as address
+import dali.gear.general as gear
+import pytest
+from dali.command import YesNoResponse
+from dali.frame import BackwardFrame
+from dali2mqtt import dali2mqtt
+from dali2mqtt.bus import run_sequence
+from dali2mqtt.consts import (
+    MQTT_BRIGHTNESS_COMMAND_TOPIC,
+    MQTT_BRIGHTNESS_GET_COMMAND_TOPIC,
+    MQTT_COMMAND_TOPIC,
+)
+from dali2mqtt.devicesnamesconfig import DevicesNamesConfig
+from dali2mqtt.inventory import BusInventory
+from dali2mqtt.lamp import Lamp
+from dali2mqtt.router import TopicRouter
+from tests.conftest import SyncBus
+
+FRAME_LATENCY = 0.0002
+BUS_SIZE = 64
+
+LAYOUTS = {
+    "small": (4, {0: [0, 1]}),
+    "medium": (16, {0: list(range(8)), 1: list(range(8, 16)), 2: [0, 8]}),
+    "full": (64, {group: list(range(group * 4, group * 4 + 4)) for group in range(16)}),
+}
+
+
+class SimulatedDriver:
+    """Driver answering like a bus of lamps, sleeping latency per frame."""
+
+    def __init__(self, lamps, groups, latency=FRAME_LATENCY):
+        self.levels = {lamp: 0 for lamp in range(lamps)}
+        self.groups = groups
+        self.latency = latency
+        self.frames = 0
+
+    def _targets(self, destination):
+        if isinstance(destination, address.Broadcast):
+            return list(self.levels)
+        if isinstance(destination, address.Group):
+            return self.groups.get(destination.group, [])
+        return [destination.address] if destination.address in self.levels else []
+
+    def _group_mask(self, lamp, first):
+        mask = 0
+        for group, members in self.groups.items():
+            if lamp in members and first <= group < first + 8:
+                mask |= 1 << (group - first)
+        return mask
+
+    def send(self, command):
+        self.frames += 1
+        time.sleep(self.latency)
+        targets = self._targets(command.destination)
+        if isinstance(command, gear.QueryControlGearPresent):
+            return YesNoResponse(BackwardFrame(0xFF) if targets else None)
+        if not targets:
+            return command.response(None) if command.response else None
+        if isinstance(command, gear.QueryGroupsZeroToSeven):
+            return command.response(BackwardFrame(self._group_mask(targets[0], 0)))
+        if isinstance(command, gear.QueryGroupsEightToFifteen):
+            return command.response(BackwardFrame(self._group_mask(targets[0], 8)))
+        if isinstance(command, (gear.QueryPhysicalMinimum, gear.QueryMinLevel)):
+            return command.response(BackwardFrame(1))
+        if isinstance(command, gear.QueryMaxLevel):
+            return command.response(BackwardFrame(254))
+        if isinstance(command, gear.QueryActualLevel):
+            return command.response(BackwardFrame(self.levels[targets[0]]))
+        if isinstance(command, gear.DAPC):
+            for target in targets:
+                self.levels[target] = command.power
+        elif isinstance(command, gear.Off):
+            for target in targets:
+                self.levels[target] = 0
+        return None
+
+
+def make_bridge(tmp_path, layout):
+    lamps, groups = LAYOUTS[layout]
+    driver = SimulatedDriver(lamps, groups)
+    data_object = {
+        "driver": driver,
+        "model": "SimulatedDriver",
+        "bus": SyncBus(driver),
+        "bus_name": None,
+        "instance": None,
+        "lease": None,
+        "base_topic": "dali2mqtt",
+        "availability_topic": "dali2mqtt/status",
+        "ha_prefix": "homeassistant",
+        "light_schema": "default",
+        "log_level": "info",
+        "devices_names_config": DevicesNamesConfig(
+            "info", str(tmp_path / "devices.yaml")
+        ),
+        "inventory": BusInventory("info", str(tmp_path / "inventory.yaml")),
+        "all_lamps": {},
+        "groups": {},
+        "router": TopicRouter(
+            "dali2mqtt",
+            {
+                MQTT_COMMAND_TOPIC: dali2mqtt.on_message_cmd,
+                MQTT_BRIGHTNESS_COMMAND_TOPIC: dali2mqtt.on_message_brightness_cmd,
+                MQTT_BRIGHTNESS_GET_COMMAND_TOPIC: dali2mqtt.on_message_brightness_get_cmd,
+            },
+        ),
+    }
+    return driver, data_object
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_benchmark_scan(layout):
+    lamps, groups = LAYOUTS[layout]
+    driver = SimulatedDriver(lamps, groups)
+
+    found, scan_time = timed(dali2mqtt.dali_scan, driver)
+    scan_frames, driver.frames = driver.frames, 0
+    found_groups, groups_time = timed(dali2mqtt.scan_groups, driver, found)
+
+    print(
+        f"\n{layout}: dali_scan {scan_frames} frames in {scan_time * 1000:.1f} ms, "
+        f"scan_groups {driver.frames} frames in {groups_time * 1000:.1f} ms"
+    )
+    assert found == list(range(lamps))
+    assert scan_frames <= BUS_SIZE
+    assert driver.frames == 2 * len(found)
+    assert {group: sorted(members) for group, members in found_groups.items()} == {
+        group: [member for member in members if member in found]
+        for group, members in groups.items()
+    }
+    assert scan_time < scan_frames * FRAME_LATENCY * 10 + 1
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_benchmark_initialize_lamps(tmp_path, layout):
+    driver, data_object = make_bridge(tmp_path, layout)
+    client = mock.Mock()
+
+    _, cold_time = timed(dali2mqtt.initialize_lamps, data_object, client)
+    cold_frames, cold_publishes = driver.frames, client.publish.call_count
+    lamps = sum(1 for lamp in data_object["all_lamps"].values() if not lamp.is_group)
+    groups = len(data_object["groups"])
+
+    # lamps announced before and after their values are read, groups once
+    assert cold_frames <= BUS_SIZE + lamps * (4 + 2) + groups * 4
+    assert cold_publishes <= 7 * lamps + 6 * groups
+
+    driver.frames = 0
+    client.reset_mock()
+    data_object["all_lamps"] = {}
+    data_object["inventory"].load_inventory_file()
+    _, warm_time = timed(dali2mqtt.initialize_lamps, data_object, client)
+
+    print(
+        f"\n{layout}: cold start {cold_frames} frames, {cold_publishes} publishes "
+        f"in {cold_time * 1000:.1f} ms; from inventory {driver.frames} frames, "
+        f"{client.publish.call_count} publishes in {warm_time * 1000:.1f} ms"
+    )
+    # the inventory check reads the bus again but publishes nothing new
+    assert driver.frames <= cold_frames
+    assert client.publish.call_count == 6 * (lamps + groups)
+
+    # Home Assistant coming back: the live lamps are published again
+    driver.frames = 0
+    client.reset_mock()
+    lamp_object = next(lamp for lamp in data_object["all_lamps"].values() if not lamp.is_group)
+    lamp_object.level = 42
+    assert dali2mqtt.initialize_lamps(data_object, client) is None
+    assert driver.frames == 0
+    topic = dali2mqtt.MQTT_BRIGHTNESS_STATE_TOPIC.format(
+        data_object["base_topic"], lamp_object.device_name
+    )
+    assert (topic, 42) in [call.args for call in client.publish.call_args_list]
+
+
+def test_benchmark_command_dispatch(tmp_path):
+    _, data_object = make_bridge(tmp_path, "full")
+    dali2mqtt.initialize_lamps(data_object, mock.Mock())
+    data_object["coalescer"] = mock.Mock()
+    client = mock.Mock()
+    msg = mock.Mock()
+    msg.topic = "dali2mqtt/63/light/brightness/set"
+    msg.payload = b"100"
+
+    dispatches = 10000
+    _, elapsed = timed(
+        lambda: [
+            dali2mqtt.on_message_lamp_cmd(client, data_object, msg)
+            for _ in range(dispatches)
+        ]
+    )
+
+    print(f"\ncommand dispatch {elapsed / dispatches * 1e6:.2f} us per message")
+    assert data_object["coalescer"].push.call_count == dispatches
+    assert elapsed / dispatches < 0.001
+
+
+def test_benchmark_topic_routing():
+    all_lamps = {
+        lamp.device_name: lamp
+        for lamp in (
+            Lamp("info", "Mock", f"Lamp {number}", address.Short(number))
+            for number in range(BUS_SIZE)
+        )
+    }
+    router = TopicRouter("dali2mqtt", {MQTT_BRIGHTNESS_COMMAND_TOPIC: "brightness"})
+    router.rebuild(all_lamps)
+    topic = "dali2mqtt/lamp-63/light/brightness/set"
+    pattern = re.compile("^dali2mqtt/(?P<device_name>[^/]*)/light/brightness/set$")
+
+    def regex_dispatch():
+        name = pattern.search(topic).group("device_name")
+        return next(lamp for lamp in all_lamps.values() if lamp.device_name == name)
+
+    assert regex_dispatch() is router.resolve(topic)[0]
+
+    routed = min(timeit.repeat(lambda: router.resolve(topic), number=2000, repeat=5))
+    parsed = min(timeit.repeat(regex_dispatch, number=2000, repeat=5))
+    print(f"\nrouter {routed / 2000 * 1e9:.0f} ns, regex {parsed / 2000 * 1e9:.0f} ns")
+    assert routed / 2000 < 0.001
+
+
+def test_benchmark_coalesced_commands(tmp_path):
+    driver, data_object = make_bridge(tmp_path, "full")
+    dali2mqtt.initialize_lamps(data_object, mock.Mock())
+    driver.frames = 0
+    client = mock.Mock()
+
+    batch = {
+        str(lamp.short_address): (lamp, 100, None, None)
+        for lamp in data_object["all_lamps"].values()
+        if not lamp.is_group
+    }
+    _, elapsed = timed(
+        run_sequence, driver, dali2mqtt.set_lamp_levels(client, data_object, batch)
+    )
+
+    print(f"\n64 lamps to one level: {driver.frames} frames in {elapsed * 1000:.1f} ms")
+    assert driver.frames == 1
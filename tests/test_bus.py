@@ -0,0 +1,114 @@
+"""Tests for the DALI bus worker."""
+
+from dali2mqtt.bus import BusWorker, CommandCoalescer, PacedDriver, run_sequence
+from dali2mqtt.consts import BUS_PRIORITY_COMMAND, BUS_PRIORITY_SCAN
+from dali.exceptions import DALIError
+from unittest import mock
+import threading
+
+import pytest
+from tests.conftest import FakeClock, sequence
+
+
+def test_run_sequence():
+    driver = mock.Mock()
+    driver.send = lambda command: command.upper()
+    log = []
+
+    assert run_sequence(driver, sequence("a", 2, log)) == "a"
+    assert log == ["A0", "A1"]
+
+
+def test_run_sequence_throws_errors():
+    def failing():
+        try:
+            yield "frame"
+        except DALIError:
+            return "handled"
+
+    driver = mock.Mock()
+    driver.send.side_effect = DALIError("timeout")
+
+    assert run_sequence(driver, failing()) == "handled"
+
+
+def test_command_jumps_ahead_of_scan():
+    sent = []
+    released = threading.Event()
+
+    def send(command):
+        released.wait()
+        sent.append(command)
+
+    driver = mock.Mock()
+    driver.send = send
+    bus = BusWorker(driver, "debug")
+    bus.start()
+
+    scan = bus.submit(BUS_PRIORITY_SCAN, sequence("scan", 3, []))
+    command = bus.submit(BUS_PRIORITY_COMMAND, sequence("set", 1, []))
+    released.set()
+
+    assert scan.result(timeout=5) == "scan"
+    assert command.result(timeout=5) == "set"
+    assert sent.index("set0") < sent.index("scan2")
+    bus.stop()
+
+
+def test_coalescer_keeps_newest_command():
+    flushed = []
+
+    def flush(batch):
+        flushed.append(batch)
+        yield "frame"
+
+    bus = mock.Mock()
+    coalescer = CommandCoalescer(bus, BUS_PRIORITY_COMMAND, flush)
+    for level in (10, 20, 30):
+        coalescer.push("lamp1", level)
+    coalescer.push("lamp2", 40)
+
+    assert bus.submit.call_count == 1
+    assert coalescer.collapsed == 2
+
+    driver = mock.Mock()
+    run_sequence(driver, bus.submit.call_args[0][1])
+    assert flushed == [{"lamp1": 30, "lamp2": 40}]
+    assert driver.send.call_count == 1
+
+    coalescer.push("lamp1", 50)
+    assert bus.submit.call_count == 2
+
+
+def test_coalescer_keeps_arrival_order():
+    flushed = []
+
+    def flush(batch):
+        flushed.append(list(batch.items()))
+        yield "frame"
+
+    bus = mock.Mock()
+    coalescer = CommandCoalescer(bus, BUS_PRIORITY_COMMAND, flush)
+    coalescer.push("lamp1", 100)
+    coalescer.push("group0", 0)
+    coalescer.push("lamp1", 50)
+
+    run_sequence(mock.Mock(), bus.submit.call_args[0][1])
+    assert flushed == [[("group0", 0), ("lamp1", 50)]]
+
+
+def test_paced_driver_limits_frame_rate():
+    clock = FakeClock()
+    driver = mock.Mock()
+    with mock.patch("dali2mqtt.bus.time", clock):
+        paced = PacedDriver(driver, rate=10, burst=2)
+        for _ in range(6):
+            paced.send("frame")
+        stats = paced.stats()
+
+    assert driver.send.call_count == 6
+    # two frames of burst, then one every 100 ms
+    assert clock.now == pytest.approx(0.4)
+    assert stats["frames"] == 6
+    assert stats["max_queue_delay"] == pytest.approx(0.1)
+    assert stats["mean_queue_delay"] == pytest.approx(0.4 / 6)
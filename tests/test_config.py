@@ -1,6 +1,12 @@
 """Tests for config."""
 
+import argparse
+import os
+import threading
+import time
+
 from dali2mqtt.config import Config
+from dali2mqtt.dali2mqtt import on_detect_changes_in_config
 from unittest import mock
 
 def test_load_config():
@@ -14,4 +20,92 @@ def test_load_config():
     assert cfg.ha_discovery_prefix == "homeassistant"
     assert cfg.log_level == "info"
     assert cfg.log_color == False
-    assert cfg.devices_names_file == "devices.yaml"
\ No newline at end of file
+    assert cfg.devices_names_file == "devices.yaml"
+    assert cfg.poll_budget == 0
+    assert cfg.snapshot_interval == 0
+
+def test_buses(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text(
+        "dali_driver: dummy\n"
+        "devices_names: devices.yaml\n"
+        "buses:\n"
+        "  - name: east\n"
+        "  - name: west\n"
+        "    dali_driver: dali_server\n"
+        "    dali_device: 10.0.0.2:55825\n"
+        "    devices_names: west.yaml\n"
+    )
+    args = mock.Mock()
+    args.config = str(path)
+
+    east, west = Config(args).buses
+
+    assert east["name"] == "east"
+    assert east["dali_driver"] == "dummy"
+    assert east["devices_names"] == "devices-east.yaml"
+    assert west["dali_driver"] == "dali_server"
+    assert west["dali_device"] == "10.0.0.2:55825"
+    assert west["devices_names"] == "west.yaml"
+
+
+def test_single_bus_without_name():
+    args = mock.Mock()
+    args.config = "tests/data/config.yaml"
+
+    (bus,) = Config(args).buses
+
+    assert bus["name"] is None
+    assert bus["devices_names"] == "devices.yaml"
+
+
+def test_reload_reports_changes(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text("dali_driver: dummy\nlog_level: info\n")
+    changes = []
+    cfg = Config(argparse.Namespace(config=str(path)), changes.append)
+
+    path.write_text("dali_driver: dummy\nlog_level: debug\nmqtt_port: 1884\n")
+    cfg.reload()
+    path.write_text("dali_driver: [not, a, driver]\n")
+    cfg.reload()
+
+    assert changes == [{"log_level", "mqtt_port"}]
+    assert cfg.log_level == "debug"
+    assert cfg.mqtt_conf[1] == 1884
+
+
+def test_watch_debounces(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text("dali_driver: dummy\n")
+    changes = []
+    cfg = Config(argparse.Namespace(config=str(path)), changes.append)
+    cfg.watch(debounce=0.2)
+
+    # an editor saving through a temporary file
+    for level in ("warning", "error", "debug"):
+        temporary = tmp_path / ".config.yaml.swp"
+        temporary.write_text(f"dali_driver: dummy\nlog_level: {level}\n")
+        os.replace(temporary, path)
+    time.sleep(1)
+
+    assert changes == [{"log_level"}]
+    assert cfg.log_level == "debug"
+
+
+def test_changes_applied(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text("dali_driver: dummy\n")
+    cfg = Config(argparse.Namespace(config=str(path)))
+    client = mock.Mock()
+    rebuild = threading.Event()
+
+    on_detect_changes_in_config(client, cfg, {"log_level", "publish_window"}, rebuild)
+    client.disconnect.assert_not_called()
+
+    on_detect_changes_in_config(client, cfg, {"mqtt_server"}, rebuild)
+    client.disconnect.assert_called_once()
+    assert not rebuild.is_set()
+
+    on_detect_changes_in_config(client, cfg, {"dali_driver"}, rebuild)
+    assert rebuild.is_set()
@@ -0,0 +1,121 @@
+"""Tests for the bridge between the DALI buses and MQTT."""
+
+from unittest import mock
+
+from dali.address import Short
+from dali2mqtt.bus import run_sequence
+from dali2mqtt.dali2mqtt import (
+    create_bus_data,
+    initialize_buses,
+    initialize_lamps,
+    lamp_actions,
+    on_message_brightness_cmd,
+    register_lamp,
+    rescan_lamps,
+    retire_lamp,
+)
+from dali2mqtt.devicesnamesconfig import DevicesNamesConfig
+from dali2mqtt.emulator import BusEmulator
+from dali2mqtt.inventory import BusInventory
+from dali2mqtt.lamp import Lamp
+from dali2mqtt.publisher import BulkPublisher
+from dali2mqtt.router import TopicRouter
+
+
+def make_bus_config(tmp_path):
+    return {
+        "name": None,
+        "bus": mock.Mock(driver=mock.Mock(), model="Mock"),
+        "devices_names_config": DevicesNamesConfig("debug", str(tmp_path / "devices.yaml")),
+        "inventory": BusInventory("debug", str(tmp_path / "inventory.yaml")),
+    }
+
+
+def test_reconnect_keeps_known_lamps(tmp_path):
+    bus_config = make_bus_config(tmp_path)
+    bus = bus_config["bus"]
+    first = create_bus_data(mock.Mock(), bus_config, "test", "homeassistant", "debug", None, None)
+    register_lamp(first, Lamp("debug", "Mock", "Hall", Short(1), 1, 1, 254, 100))
+    first["groups"] = {0: [1]}
+
+    client = mock.Mock()
+    second = create_bus_data(client, bus_config, "test", "homeassistant", "debug", None, None)
+    assert initialize_lamps(second, client) is None
+
+    assert list(second["all_lamps"]) == ["hall"]
+    assert second["groups"] == {0: [1]}
+    assert second["router"].resolve("test/hall/light/brightness/set") is not None
+    assert ("test/hall/light/brightness/status", 100) in [
+        call.args for call in client.publish.call_args_list
+    ]
+    bus.submit.assert_not_called()
+    bus.driver.send.assert_not_called()
+
+
+def test_retired_lamp_clears_retained_topics():
+    client = mock.Mock()
+    lamp = Lamp("debug", "Mock", "Hall", Short(1), 1, 1, 254, 100)
+    data_object = {
+        "base_topic": "test",
+        "bus_name": None,
+        "instance": None,
+        "ha_prefix": "homeassistant",
+        "light_schema": "default",
+        "all_lamps": {"hall": lamp},
+        "router": TopicRouter("test", lamp_actions("default")),
+    }
+
+    retire_lamp(client, data_object, "hall")
+
+    topics = [call.args[0] for call in client.publish.call_args_list]
+    assert "homeassistant/light/hall/config" in topics
+    assert "test/hall/light/brightness/status" in topics
+    for call in client.publish.call_args_list:
+        assert call.args[1:] == ("",)
+        assert call.kwargs == {"retain": True}
+    assert data_object["all_lamps"] == {}
+
+
+def test_warm_start_done_before_verification(tmp_path):
+    bus_config = make_bus_config(tmp_path)
+    bus_config["inventory"].update(
+        {"1": Lamp("debug", "Mock", "1", Short(1), 1, 1, 254, 100)}, {}
+    )
+    data_object = create_bus_data(
+        mock.Mock(), bus_config, "test", "homeassistant", "debug", None, None
+    )
+    client = mock.Mock()
+    client.publish.side_effect = lambda *args, on_delivered, **kwargs: (
+        on_delivered() or mock.Mock(rc=0)
+    )
+    client.bulk.side_effect = lambda: BulkPublisher(client)
+    done = []
+
+    bulk = initialize_buses(client, [data_object])
+    bulk.when_done(lambda: done.append(bulk.progress()))
+
+    # the verification of the inventory is queued, never run
+    assert bus_config["bus"].submit.call_count == 1
+    assert done == [(client.publish.call_count,) * 2]
+
+
+def test_bad_level_logged_without_known_limits(caplog):
+    msg = mock.Mock(topic="test/hall/light/brightness/set", payload=b"bright")
+    lamp = Lamp("debug", "Mock", "Hall", Short(1))
+
+    on_message_brightness_cmd(mock.Mock(), {}, msg, lamp)
+
+    assert "Can't convert <bright> to integer None..None" in caplog.text
+
+
+def test_rescan_summary_is_not_retained(tmp_path):
+    data_object = create_bus_data(
+        mock.Mock(), make_bus_config(tmp_path), "test", "homeassistant", "debug", None, None
+    )
+    client = mock.Mock()
+
+    run_sequence(BusEmulator("debug", time_scale=0), rescan_lamps(client, data_object))
+
+    client.publish.assert_called_once_with(
+        "test/find/result", '{"added": [], "removed": [], "changed": []}', retain=False
+    )
@@ -0,0 +1,60 @@
+"""Tests for devices names."""
+
+from unittest import mock
+
+from dali.address import Short
+from dali2mqtt.dali2mqtt import lamp_actions, register_lamp, rename_lamps
+from dali2mqtt.devicesnamesconfig import DevicesNamesConfig
+from dali2mqtt.lamp import Lamp
+from dali2mqtt.router import TopicRouter
+
+
+def test_reload_reports_renames(tmp_path):
+    path = tmp_path / "devices.yaml"
+    path.write_text("1:\n  friendly_name: Kitchen\n2:\n  friendly_name: Hall\n")
+    devices_names = DevicesNamesConfig("debug", str(path))
+    renamed = []
+    devices_names.on_rename = renamed.append
+
+    path.write_text("1:\n  friendly_name: Kitchen\n2:\n  friendly_name: Porch\n3:\n  friendly_name: Attic\n")
+
+    assert devices_names.reload() == {2, 3}
+    assert devices_names.reload() == set()
+    assert renamed == [{2, 3}]
+    assert devices_names.get_friendly_name(2) == "Porch"
+
+
+def test_rename_lamps_without_bus_traffic(tmp_path):
+    path = tmp_path / "devices.yaml"
+    path.write_text("1:\n  friendly_name: Hall\n")
+    client = mock.Mock()
+    driver = mock.Mock()
+    data_object = {
+        "base_topic": "test",
+        "bus_name": None,
+        "instance": None,
+        "ha_prefix": "homeassistant",
+        "availability_topic": "test/status",
+        "light_schema": "default",
+        "devices_names_config": DevicesNamesConfig("debug", str(path)),
+        "driver": driver,
+        "all_lamps": {},
+        "router": TopicRouter("test", lamp_actions("default")),
+    }
+    register_lamp(data_object, Lamp("debug", "Mock", "Hall", Short(1), 1, 1, 254, 100))
+
+    path.write_text("1:\n  friendly_name: Front Porch\n")
+    rename_lamps(client, data_object, data_object["devices_names_config"].reload())
+
+    published = {
+        call.args[0]: (call.args[1], call.kwargs.get("retain"))
+        for call in client.publish.call_args_list
+    }
+    assert published["homeassistant/light/hall/config"] == ("", True)
+    assert published["test/hall/light/brightness/status"] == ("", True)
+    assert published["homeassistant/light/front-porch/config"][1] is True
+    assert published["test/front-porch/light/brightness/status"] == (100, False)
+    assert list(data_object["all_lamps"]) == ["front-porch"]
+    assert data_object["router"].resolve("test/front-porch/light/brightness/set") is not None
+    assert data_object["router"].resolve("test/hall/light/brightness/set") is None
+    driver.send.assert_not_called()
@@ -0,0 +1,100 @@
+"""Tests for the DALI bus emulator."""
+
+import dali.gear.general as gear
+import pytest
+from dali.address import Broadcast, Group, Short
+from dali2mqtt.bus import run_sequence
+from dali2mqtt.dali2mqtt import dali_scan, scan_groups
+from dali2mqtt.emulator import BusEmulator, fade_seconds
+from dali2mqtt.lamp import Lamp, fade_time_code
+from dali2mqtt.scene import recall_scene, store_scene
+from tests.conftest import FakeClock
+
+
+@pytest.fixture
+def emulator():
+    bus = BusEmulator("debug", range(3), time_scale=0, clock=FakeClock(100.0))
+    bus.add_gear(63, min_physical_level=10, min_level=20, max_level=200)
+    return bus
+
+
+def test_scan_and_groups(emulator):
+    for lamp in (0, 1):
+        emulator.send(gear.AddToGroup(Short(lamp), 2))
+    emulator.send(gear.AddToGroup(Short(63), 9))
+
+    lamps = dali_scan(emulator)
+
+    assert lamps == [0, 1, 2, 63]
+    assert scan_groups(emulator, lamps) == {2: [0, 1], 9: [63]}
+    # AddToGroup is a configuration command, sent twice
+    assert emulator.frames == 6 + 64 + 8
+
+
+def test_limits_and_levels(emulator):
+    lamp = Lamp("debug", "BusEmulator", "63", Short(63))
+    run_sequence(emulator, lamp.query_values())
+    assert (lamp.min_physical_level, lamp.min_level, lamp.max_level, lamp.level) == (10, 20, 200, 0)
+
+    emulator.send(gear.DAPC(Short(63), 250))
+    assert emulator.send(gear.QueryActualLevel(Short(63))).value == 200
+
+    emulator.send(gear.DAPC(Broadcast(), 100))
+    assert emulator.send(gear.QueryActualLevel(Broadcast())).value == 100
+    emulator.send(gear.DAPC(Short(0), 50))
+    # different answers collide into a framing error
+    assert emulator.send(gear.QueryActualLevel(Broadcast())).value == "(framing error)"
+    assert emulator.send(gear.QueryActualLevel(Group(5))).raw_value is None
+
+
+def test_fade(emulator):
+    emulator.send(gear.DTR0(4))
+    emulator.send(gear.SetFadeTime(Short(0)))
+    emulator.send(gear.DAPC(Short(0), 200))
+
+    emulator.clock.now += fade_seconds(4) / 2
+    assert emulator.send(gear.QueryActualLevel(Short(0))).value == 100
+    emulator.clock.now += fade_seconds(4)
+    assert emulator.send(gear.QueryActualLevel(Short(0))).value == 200
+    assert emulator.send(gear.QueryFadeTimeFadeRate(Short(0))).fade_time == 4
+
+
+def test_scenes(emulator):
+    lamps = {
+        str(number): Lamp("debug", "BusEmulator", str(number), Short(number), 1, 1, 254, 0)
+        for number in range(3)
+    }
+    emulator.send(gear.DAPC(Short(1), 80))
+    lamps["1"].level = 80
+    run_sequence(emulator, store_scene(lamps, 4))
+    emulator.send(gear.Off(Broadcast()))
+
+    run_sequence(emulator, recall_scene(lamps, 4))
+
+    assert emulator.send(gear.QueryActualLevel(Short(1))).value == 80
+    assert emulator.send(gear.QuerySceneLevel(Short(1), 4)).value == 80
+    assert emulator.send(gear.QuerySceneLevel(Short(63), 4)).value == 0
+    assert emulator.send(gear.QuerySceneLevel(Short(63), 5)).value == "MASK"
+
+
+def test_native_fade(emulator):
+    lamp = Lamp("debug", "Mock", "0", Short(0), 1, 1, 254, 0)
+    emulator.send(gear.DTR0(2))
+    emulator.send(gear.SetFadeTime(Short(0)))
+
+    assert fade_time_code(10) == 9
+    assert fade_time_code(0.1) == 0
+    run_sequence(emulator, lamp.fade_to(fade_time_code(10)))
+    assert emulator.gear[0].fade_time == 9
+    assert (lamp.fade_time, lamp.default_fade_time) == (9, 2)
+
+    # the cached fade time is not written again
+    frames = emulator.frames
+    run_sequence(emulator, lamp.fade_to(9))
+    run_sequence(emulator, lamp.set_level(200, fade=True))
+    assert emulator.frames == frames + 1
+    emulator.clock.now += fade_seconds(9) / 2
+    assert 0 < emulator.send(gear.QueryActualLevel(Short(0))).value < 200
+
+    run_sequence(emulator, lamp.fade_to(None))
+    assert emulator.gear[0].fade_time == 2
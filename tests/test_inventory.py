@@ -0,0 +1,50 @@
+"""Tests for bus inventory."""
+
+import time
+
+from dali2mqtt.inventory import BusInventory
+from dali2mqtt.lamp import Lamp
+from dali.address import Group, Short
+
+
+def test_inventory_round_trip(tmp_path):
+    path = tmp_path / "inventory.yaml"
+    inventory = BusInventory("debug", str(path))
+    assert inventory.is_empty()
+
+    limits = dict(min_physical_level=1, min_level=2, max_level=254, level=100)
+    all_lamps = {
+        "1": Lamp("debug", "Mock", "1", Short(1), **limits),
+        "group_0": Lamp("debug", "Mock", "group_0", Group(0), **limits),
+    }
+    inventory.update(all_lamps, {0: [1]})
+    inventory.save_inventory_file()
+
+    cached = BusInventory("debug", str(path))
+    assert not cached.is_empty()
+    assert cached.lamps == {1: dict(limits, groups=[0], scenes={})}
+    assert cached.groups == {0: limits}
+    assert cached.lamp_groups() == {0: [1]}
+
+
+def test_inventory_invalid_file(tmp_path):
+    path = tmp_path / "inventory.yaml"
+    path.write_text("lamps: [\n")
+
+    assert BusInventory("debug", str(path)).is_empty()
+
+
+def test_levels_saved_after_a_delay(tmp_path):
+    path = tmp_path / "inventory.yaml"
+    inventory = BusInventory("debug", str(path), save_delay=0.05)
+    lamp = Lamp("debug", "Mock", "1", Short(1), 1, 1, 254, 100)
+    inventory.update({"1": lamp}, {})
+    inventory.save_inventory_file()
+
+    lamp.level = 30
+    inventory.update_level(lamp)
+    lamp.level = 40
+    inventory.update_level(lamp)
+    time.sleep(0.2)
+
+    assert BusInventory("debug", str(path)).lamps[1]["level"] == 40
@@ -1,5 +1,6 @@
 """Tests for lamp."""
 
+from dali2mqtt.bus import run_sequence
 from dali2mqtt.lamp import Lamp
 from dali2mqtt.consts import __version__
 from unittest import mock
@@ -42,10 +43,11 @@ def test_ha_config(fake_driver, fake_address):
 
     lamp1 = Lamp(
         log_level="debug",
-        driver=fake_driver,
+        model="Mock",
         friendly_name=friendly_name,
         short_address=addr,
     )
+    run_sequence(fake_driver, lamp1.query_values())
 
     assert lamp1.device_name == slugify(friendly_name)
     assert lamp1.short_address.address == addr_number
@@ -74,3 +76,63 @@ def test_ha_config(fake_driver, fake_address):
             "mf": "dali2mqtt",
         },
     }
+
+
+def test_missing_limits_read_in_one_transaction():
+    lamp = Lamp("debug", "Mock", "lazy lamp", Short(2), min_level=MIN_BRIGHTNESS, level=0)
+
+    assert not hasattr(lamp, "__dict__")
+    assert lamp.missing_values == ["min_physical_level", "max_level"]
+
+    sequence = lamp.set_level(ACTUAL_BRIGHTNESS)
+    queries = next(sequence)
+    assert [type(query).__name__ for query in queries] == [
+        "QueryPhysicalMinimum",
+        "QueryMaxLevel",
+    ]
+    responses = []
+    for value in (MIN__PHYSICAL_BRIGHTNESS, MAX_BRIGHTNESS):
+        responses.append(mock.Mock())
+        responses[-1].value = value
+    assert type(sequence.send(responses)).__name__ == "DAPC"
+    with pytest.raises(StopIteration):
+        sequence.send(None)
+
+    assert lamp.missing_values == []
+    assert lamp.level == ACTUAL_BRIGHTNESS
+    assert lamp.max_level == MAX_BRIGHTNESS
+
+
+def test_ha_config_of_named_bus():
+    lamp = Lamp("debug", "Mock", "my lamp", Short(1), 1, 1, MAX_BRIGHTNESS, 0)
+
+    config = json.loads(lamp.gen_ha_config("test/east", "east", "test/status"))
+
+    assert config["def_ent_id"] == "dali_light_east_my-lamp"
+    assert config["uniq_id"] == f"Mock_east_{Short(1)}"
+    assert config["cmd_t"] == "test/east/my-lamp/light/switch"
+    assert config["avty_t"] == "test/status"
+    assert config["device"]["ids"] == "dali2mqtt_east"
+
+
+def test_json_schema():
+    lamp = Lamp("debug", "Mock", "my lamp", Short(1), 1, 2, MAX_BRIGHTNESS, 0)
+
+    config = json.loads(lamp.gen_ha_config("test", schema="json"))
+
+    assert config["schema"] == "json"
+    assert config["stat_t"] == "test/my-lamp/light/json"
+    assert config["cmd_t"] == "test/my-lamp/light/json/set"
+    assert config["sup_clrm"] == ["brightness"]
+    assert config["bri_scl"] == MAX_BRIGHTNESS
+    assert "bri_cmd_t" not in config
+    assert json.loads(lamp.json_state()) == {
+        "state": "OFF",
+        "brightness": 0,
+        "max_level": MAX_BRIGHTNESS,
+        "min_level": 2,
+        "physical_minimum": 1,
+    }
+
+    lamp.level = ACTUAL_BRIGHTNESS
+    assert json.loads(lamp.json_state())["state"] == "ON"
@@ -0,0 +1,104 @@
+"""Tests for bus leases."""
+
+from unittest import mock
+
+from dali.address import Short
+from dali2mqtt.dali2mqtt import lamp_actions, release_bus
+from dali2mqtt.lamp import Lamp
+from dali2mqtt.lease import BusLease, lease_payload, parse_lease
+from dali2mqtt.router import TopicRouter
+from tests.conftest import FakeClock
+
+
+def make_lease(clock, instance="east"):
+    lease = BusLease(instance, "debug", duration=30, settle=2, clock=clock)
+    published, events = [], []
+    lease.watch(
+        ["dali2mqtt/ground"],
+        lambda key, payload: published.append((key, payload)),
+        lambda key: events.append(("acquire", key)),
+        lambda key: events.append(("release", key)),
+    )
+    return lease, published, events
+
+
+def test_parse_lease():
+    assert parse_lease(lease_payload("east", 1030)) == ("east", 1030)
+    assert parse_lease(b"") == (None, 0)
+    assert parse_lease(b"garbage") == (None, 0)
+
+
+def test_claim_free_bus_after_settling():
+    clock = FakeClock(1000.0)
+    lease, published, events = make_lease(clock)
+
+    lease.renew_once()
+    assert published == []
+
+    clock.now += 2
+    lease.renew_once()
+    assert published == [("dali2mqtt/ground", lease_payload("east", 1032.0))]
+    assert not lease.owns("dali2mqtt/ground")
+
+    lease.on_lease("dali2mqtt/ground", published[0][1])
+    assert lease.owns("dali2mqtt/ground")
+    assert events == [("acquire", "dali2mqtt/ground")]
+
+
+def test_live_lease_of_another_instance_is_respected():
+    clock = FakeClock(1000.0)
+    lease, published, events = make_lease(clock)
+    lease.on_lease("dali2mqtt/ground", lease_payload("west", 1020))
+
+    clock.now += 5
+    lease.renew_once()
+    assert published == []
+
+    clock.now += 20
+    lease.renew_once()
+    assert published == [("dali2mqtt/ground", lease_payload("east", 1055.0))]
+    assert events == []
+
+
+def test_renew_and_give_up():
+    clock = FakeClock(1000.0)
+    lease, published, events = make_lease(clock)
+    lease.on_lease("dali2mqtt/ground", lease_payload("east", 1010))
+    clock.now += 2
+    lease.renew_once()
+    clock.now += 5
+    lease.renew_once()
+    assert len(published) == 1
+
+    clock.now += 5
+    lease.renew_once()
+    assert len(published) == 2
+
+    lease.on_lease("dali2mqtt/ground", lease_payload("west", clock.now + 30))
+    assert not lease.owns("dali2mqtt/ground")
+    assert events == [("acquire", "dali2mqtt/ground"), ("release", "dali2mqtt/ground")]
+
+
+def test_released_bus_clears_its_discovery():
+    client = mock.Mock()
+    lamp = Lamp("debug", "Mock", "Hall", Short(1), 1, 1, 254, 100, scenes={3: 100})
+    data_object = {
+        "base_topic": "dali2mqtt/ground",
+        "bus_name": "ground",
+        "instance": "east",
+        "ha_prefix": "homeassistant",
+        "light_schema": "default",
+        "all_lamps": {"hall": lamp},
+        "groups": {},
+        "router": TopicRouter("dali2mqtt/ground", lamp_actions("default")),
+        "snapshot": None,
+    }
+
+    release_bus(client, data_object)
+
+    cleared = [(call.args, call.kwargs) for call in client.publish.call_args_list]
+    assert cleared == [
+        (("homeassistant/light/east/ground_hall/config", ""), {"retain": True}),
+        (("homeassistant/scene/east/dali_scene_ground_3/config", ""), {"retain": True}),
+    ]
+    assert data_object["all_lamps"] == {}
@@ -0,0 +1,128 @@
+"""Tests for the metrics endpoint."""
+
+import urllib.request
+from unittest import mock
+
+from dali.address import Group, Short
+from dali.exceptions import MissingResponse
+from dali2mqtt.emulator import BusEmulator
+import dali.gear.general as gear
+from dali2mqtt.bus import BusWorker, CommandCoalescer
+from dali2mqtt.consts import BUS_PRIORITY_COMMAND
+from dali2mqtt.lamp import Lamp
+from dali2mqtt.metrics import BridgeMetrics, start_metrics_server, topic_family
+
+
+def test_topic_families():
+    assert topic_family("dali2mqtt/lamp-1/light/brightness/set") == "+/+/light/brightness/set"
+    assert topic_family("dali2mqtt/lamp-1/light/status") == "+/+/light/status"
+    assert topic_family("homeassistant/light/lamp-1/config") == "+/light/+/config"
+    assert topic_family("dali2mqtt/scene/3/recall") == "+/scene/+/recall"
+    assert topic_family("something/else/entirely/here/x/y") == "other"
+
+
+def test_render_metrics():
+    metrics = BridgeMetrics("debug")
+    metrics.observe_frame(gear.DAPC(Short(1), 100), 0.025, None)
+    metrics.observe_frame(gear.QueryActualLevel(Short(2)), 0.04, MissingResponse())
+    metrics.count_message("in", "dali2mqtt/lamp-1/light/switch")
+    metrics.observe_scan("rescan", 3)
+    metrics.watch_bus(BusWorker(mock.Mock(), "debug"))
+    metrics.watch(
+        {
+            "all_lamps": {
+                "1": Lamp("debug", "Mock", "1", Short(1)),
+                "group-0": Lamp("debug", "Mock", "group_0", Group(0)),
+            }
+        }
+    )
+
+    text = metrics.render()
+
+    assert 'dali_command_duration_seconds_bucket{command="DAPC",le="0.03"} 1' in text
+    assert 'dali_command_duration_seconds_bucket{command="DAPC",le="0.02"} 0' in text
+    assert 'dali_command_duration_seconds_count{command="QueryActualLevel"} 1' in text
+    assert 'dali_command_errors_total{address="short 2",kind="timeout"} 1' in text
+    assert 'mqtt_messages_total{direction="in",family="+/+/light/switch"} 1' in text
+    assert 'dali_scan_duration_seconds_sum{kind="rescan"} 3' in text
+    assert "dali_lamps 1\n" in text
+    assert "dali_groups 1\n" in text
+    assert "dali_queue_depth 0\n" in text
+    assert "# TYPE dali_command_errors_total counter" in text
+    assert "# TYPE dali_frames_sent_total counter" in text
+
+
+def test_metrics_server():
+    metrics = BridgeMetrics("debug")
+    server = start_metrics_server(metrics, 0, "127.0.0.1")
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            assert b"# TYPE dali_lamps gauge" in response.read()
+    finally:
+        server.shutdown()
+
+
+def test_render_metrics_per_bus():
+    metrics = BridgeMetrics("debug")
+    metrics.watch_bus(BusWorker(mock.Mock(), "debug"), "east")
+    metrics.watch_bus(BusWorker(mock.Mock(), "debug"), "west")
+    metrics.watch({"bus_name": "east", "all_lamps": {"1": Lamp("debug", "Mock", "1", Short(1))}})
+    metrics.watch({"bus_name": "west", "all_lamps": {}})
+    metrics.observe_frame(gear.QueryActualLevel(Short(2)), 0.04, MissingResponse(), "west")
+
+    text = metrics.render()
+
+    assert 'dali_lamps{bus="east"} 1\n' in text
+    assert 'dali_lamps{bus="west"} 0\n' in text
+    assert 'dali_queue_depth{bus="west"} 0\n' in text
+    assert 'dali_command_errors_total{bus="west",address="short 2",kind="timeout"} 1' in text
+    assert text.count("# TYPE dali_lamps gauge") == 1
+
+
+def test_reconnect_replaces_watched_buses():
+    metrics = BridgeMetrics("debug")
+    for _ in range(2):
+        metrics.watch_bus(BusWorker(mock.Mock(), "debug"), "east")
+        metrics.watch({"bus_name": "east", "all_lamps": {}})
+
+    text = metrics.render()
+
+    assert text.count('dali_lamps{bus="east"}') == 1
+    assert text.count('dali_queue_depth{bus="east"}') == 1
+
+
+def test_topic_families_of_named_buses_and_instances():
+    assert topic_family("dali2mqtt/east/lamp-1/light/switch") == "+/+/light/switch"
+    assert topic_family("dali2mqtt/east/lease") == "+/lease"
+    assert topic_family("dali2mqtt/node-1/status") == "+/status"
+    assert topic_family("homeassistant/light/node-1/east_lamp-1/config") == "+/light/+/+/config"
+
+
+def test_unanswered_queries_count_as_timeouts():
+    metrics = BridgeMetrics("debug")
+    bus = BusWorker(BusEmulator("debug", [1], time_scale=0), "debug")
+    metrics.watch_bus(bus, "east")
+
+    bus.driver.send(gear.QueryActualLevel(Short(1)))
+    bus.driver.send(gear.QueryActualLevel(Short(2)))
+    bus.driver.send(gear.QueryControlGearPresent(Short(3)))
+
+    text = metrics.render()
+
+    assert 'dali_command_errors_total{bus="east",address="short 2",kind="timeout"} 1' in text
+    assert 'address="short 1"' not in text
+    assert 'address="short 3"' not in text
+    assert 'dali_frames_sent_total{bus="east"} 3' in text
+
+
+def test_coalesced_commands_are_counted():
+    metrics = BridgeMetrics("debug")
+    bus = mock.Mock()
+    for _ in range(2):
+        coalescer = CommandCoalescer(bus, BUS_PRIORITY_COMMAND, lambda batch: iter(()))
+        metrics.watch({"bus_name": "east", "all_lamps": {}, "coalescer": coalescer})
+        coalescer.push("lamp1", 10)
+        coalescer.push("lamp1", 20)
+
+    assert 'dali_commands_coalesced_total{bus="east"} 2' in metrics.render()
@@ -0,0 +1,88 @@
+"""Tests for the passive bus monitor."""
+
+import asyncio
+
+import dali.gear.general as gear
+from dali.address import Broadcast, Group, Short
+from dali2mqtt.aio import AsyncBus
+from dali2mqtt.consts import BUS_PRIORITY_COMMAND, BUS_PRIORITY_QUERY
+from dali2mqtt.emulator import BusEmulator
+from dali2mqtt.lamp import Lamp
+from dali2mqtt.monitor import BusMonitor
+
+
+def make_monitor():
+    emulator = BusEmulator("debug", range(3), time_scale=0)
+    all_lamps = {
+        str(number): Lamp("debug", "Mock", str(number), Short(number), 1, 1, 254, 0)
+        for number in range(3)
+    }
+    all_lamps["group_1"] = Lamp("debug", "Mock", "group_1", Group(1), 1, 1, 254, 0)
+    all_lamps["0"].scenes = {2: 80}
+    published, refreshed = [], []
+    monitor = BusMonitor("debug")
+    monitor.watch(
+        all_lamps,
+        lambda: {1: [1, 2]},
+        lambda lamp_object: published.append(lamp_object.device_name),
+        lambda lamp_object: refreshed.append(lamp_object.device_name),
+    )
+    emulator.bus_traffic.register(monitor.on_traffic)
+    return emulator, all_lamps, published, refreshed
+
+
+def test_level_commands_of_other_masters():
+    emulator, all_lamps, published, refreshed = make_monitor()
+
+    emulator.send(gear.DAPC(Short(0), 100))
+    emulator.send(gear.DAPC(Group(1), 50))
+    emulator.send(gear.QueryActualLevel(Short(0)))
+    assert published == ["0", "1", "2", "group-1"]
+    assert all_lamps["2"].level == 50
+
+    published.clear()
+    emulator.send(gear.GoToScene(Broadcast(), 2))
+    assert published == ["0"]
+    assert all_lamps["0"].level == 80
+
+    published.clear()
+    emulator.send(gear.Off(Broadcast()))
+    assert sorted(published) == ["0", "1", "2", "group-1"]
+    assert refreshed == []
+
+
+def test_relative_commands_are_refreshed():
+    emulator, all_lamps, published, refreshed = make_monitor()
+
+    emulator.send(gear.StepUp(Short(1)))
+    emulator.send(gear.DAPC(Short(2), 255))
+    assert (published, refreshed) == ([], ["1"])
+
+
+def test_frames_from_the_executor_reach_the_loop():
+    async def run():
+        emulator = BusEmulator("debug", range(2), time_scale=0)
+        bus = AsyncBus(emulator, "debug")
+        bus.start()
+        lamp = Lamp("debug", "Mock", "1", Short(1), 1, 1, 254, 0)
+        refreshed = []
+        monitor = BusMonitor("debug", asyncio.get_running_loop())
+        monitor.watch(
+            {"1": lamp},
+            dict,
+            lambda lamp_object: None,
+            lambda lamp_object: refreshed.append(
+                bus.submit(BUS_PRIORITY_QUERY, lamp_object.actual_level())
+            ),
+        )
+        emulator.bus_traffic.register(monitor.on_traffic)
+        await bus.submit(BUS_PRIORITY_COMMAND, step_up())
+        while not refreshed:
+            await asyncio.sleep(0)
+        await refreshed[0]
+        bus.stop()
+
+    def step_up():
+        yield gear.StepUp(Short(1))
+
+    asyncio.run(run())
@@ -0,0 +1,76 @@
+"""Tests for the command planner."""
+
+from unittest import mock
+
+from dali2mqtt.bus import run_sequence
+from dali2mqtt.dali2mqtt import set_lamp_levels
+from dali2mqtt.emulator import BusEmulator
+from dali2mqtt.lamp import Lamp
+from dali2mqtt.planner import plan_levels
+from dali.address import Broadcast, Group, Short
+
+
+def test_whole_bus_is_one_broadcast():
+    plan = plan_levels({1: 100, 2: 100, 3: 100}, {0: [1, 2]}, [1, 2, 3])
+
+    assert plan == [(Broadcast(), 100, [1, 2, 3])]
+
+
+def test_exact_group_members_are_one_group_frame():
+    groups = {0: [1, 2, 3], 1: [1, 2], 2: [4, 5]}
+    plan = plan_levels({1: 0, 2: 0, 3: 0, 4: 50, 5: 60}, groups, [1, 2, 3, 4, 5, 6])
+
+    assert plan == [
+        (Group(0), 0, [1, 2, 3]),
+        (Short(4), 50, [4]),
+        (Short(5), 60, [5]),
+    ]
+
+
+def test_partial_group_stays_unicast():
+    plan = plan_levels({1: 10, 2: 10}, {0: [1, 2, 3]}, [1, 2, 3])
+
+    assert plan == [(Short(1), 10, [1]), (Short(2), 10, [2])]
+
+
+def test_batch_keeps_arrival_order_around_groups():
+    emulator = BusEmulator("debug", [1, 2], time_scale=0)
+    for number in (1, 2):
+        emulator.gear[number].groups.add(0)
+    limits = dict(min_physical_level=1, min_level=1, max_level=254, level=0)
+    lamp = Lamp("debug", "Mock", "1", Short(1), **limits)
+    group = Lamp("debug", "Mock", "group_0", Group(0), **limits)
+    data_object = {
+        "base_topic": "test",
+        "light_schema": "default",
+        "groups": {0: [1, 2]},
+        "all_lamps": {"1": lamp, "group_0": group},
+    }
+
+    batch = {"1": (lamp, 50, None, None), "group_0": (group, 0, None, None)}
+    run_sequence(emulator, set_lamp_levels(mock.Mock(), data_object, batch))
+
+    assert emulator.gear[1].level(0) == 0
+    assert lamp.level == 0
+
+
+def test_group_command_updates_members():
+    limits = dict(min_physical_level=1, min_level=1, max_level=254, level=0)
+    lamps = [Lamp("debug", "Mock", str(number), Short(number), **limits) for number in (1, 2)]
+    group = Lamp("debug", "Mock", "group_0", Group(0), **limits)
+    data_object = {
+        "base_topic": "test",
+        "light_schema": "default",
+        "groups": {0: [1, 2]},
+        "all_lamps": {"1": lamps[0], "2": lamps[1], "group_0": group},
+    }
+    emulator = BusEmulator("debug", [1, 2], time_scale=0)
+    client = mock.Mock()
+
+    batch = {"group_0": (group, 80, None, 4)}
+    run_sequence(emulator, set_lamp_levels(client, data_object, batch))
+
+    assert [lamp.level for lamp in lamps] == [80, 80]
+    published = [call.args for call in client.publish.call_args_list]
+    for name in ("1", "2", "group-0"):
+        assert (f"test/{name}/light/brightness/status", 80) in published
@@ -0,0 +1,78 @@
+"""Tests for the background state poller."""
+
+from unittest import mock
+
+import pytest
+
+from dali.address import Group, Short
+from dali.exceptions import DALIError
+from dali2mqtt.lamp import Lamp
+from dali2mqtt.poller import StatePoller
+from tests.conftest import SyncBus
+
+
+def level_driver(levels):
+    driver = mock.Mock()
+
+    def send(command):
+        level = levels[command.destination.address]
+        if level is None:
+            raise DALIError("no answer")
+        return mock.Mock(value=level)
+
+    driver.send = send
+    return driver
+
+
+def make_poller(levels, published):
+    all_lamps = {
+        "1": Lamp("debug", "Mock", "1", Short(1), level=100),
+        "group-0": Lamp("debug", "Mock", "group_0", Group(0), level=100),
+    }
+    poller = StatePoller(
+        SyncBus(level_driver(levels)), 0.5, "debug", min_interval=0, max_interval=8
+    )
+    poller.watch(all_lamps, published.append)
+    return poller, all_lamps
+
+
+def test_only_changed_levels_are_published():
+    levels = {1: 100}
+    published = []
+    poller, all_lamps = make_poller(levels, published)
+
+    poller.poll_once()
+    assert published == []
+    assert poller.interval("1") == 0
+
+    levels[1] = 30
+    poller.poll_once()
+    assert published == [all_lamps["1"]]
+    assert all_lamps["1"].level == 30
+    assert "group-0" not in poller._schedule
+
+
+def test_stable_lamps_back_off_and_dead_lamps_wait_longest():
+    levels = {1: 100}
+    poller, _ = make_poller(levels, [])
+    poller._min_interval = 1
+
+    intervals = []
+    for _ in range(4):
+        poller._schedule["1"] = (0, poller.interval("1"))
+        poller.poll_once()
+        intervals.append(poller.interval("1"))
+    assert intervals == [2, 4, 8, 8]
+
+    levels[1] = None
+    poller._schedule["1"] = (0, 1)
+    poller.poll_once()
+    assert poller.interval("1") == 8
+
+
+def test_idle_time_keeps_within_budget():
+    poller, _ = make_poller({1: 100}, [])
+
+    with mock.patch("dali2mqtt.poller.time.monotonic", side_effect=[0, 0, 10, 10.2, 10.2]):
+        delay = poller.poll_once()
+    assert delay == pytest.approx(0.2)
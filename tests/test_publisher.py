@@ -0,0 +1,129 @@
+"""Tests for the publish layer."""
+
+from concurrent.futures import Future
+from unittest import mock
+
+import paho.mqtt.client as mqtt
+from dali2mqtt.metrics import BridgeMetrics
+from dali2mqtt.publisher import BulkPublisher, DedupClient, PublishCache
+
+
+def test_identical_publishes_are_skipped():
+    cache = PublishCache()
+
+    assert cache.changed("a/state", b"ON", False)
+    assert not cache.changed("a/state", "ON", False)
+    assert cache.changed("a/state", b"ON", True)
+    assert cache.changed("a/level", 100, True)
+    assert not cache.changed("a/level", "100", True)
+    assert cache.changed("a/level", 100, True, force=True)
+
+    assert (cache.published, cache.skipped) == (4, 2)
+
+
+def test_clear_forces_next_publish():
+    cache = PublishCache()
+    cache.changed("a/state", b"ON", False)
+    cache.clear()
+
+    assert cache.changed("a/state", b"ON", False)
+
+
+class FakeClient:
+    """Client delivering messages only when told to."""
+
+    def __init__(self):
+        self.sent = []
+        self.pending = []
+        self.published = set()
+
+    def publish(self, topic, payload=None, qos=0, retain=False, on_delivered=None):
+        if (topic, payload) in self.published:
+            return None
+        self.published.add((topic, payload))
+        self.sent.append((topic, payload, qos, retain))
+        self.pending.append(on_delivered)
+        return mock.Mock(rc=mqtt.MQTT_ERR_SUCCESS)
+
+    def deliver(self, count=1):
+        for _ in range(count):
+            self.pending.pop(0)()
+
+
+def test_bulk_publish_keeps_window():
+    client = FakeClient()
+    bulk = BulkPublisher(client, window=2, qos=1)
+    done = []
+    bulk.when_done(lambda: done.append(bulk.progress()))
+
+    for number in range(5):
+        bulk.publish(f"lamp/{number}", "config", retain=True)
+    bulk.publish("lamp/0", "config", retain=True)
+    bulk.close()
+
+    assert [topic for topic, *_ in client.sent] == ["lamp/0", "lamp/1"]
+    assert client.sent[0][2:] == (1, True)
+    client.deliver()
+    assert len(client.sent) == 3
+    client.deliver(2)
+    assert len(client.sent) == 5
+    assert not done
+    client.deliver(2)
+    assert done == [(6, 6)]
+    assert (bulk.delivered, bulk.skipped) == (5, 1)
+
+
+def test_bulk_closes_after_futures():
+    client = FakeClient()
+    bulk = BulkPublisher(client)
+    futures = [Future(), Future()]
+    bulk.close_after(futures)
+    done = []
+    bulk.when_done(lambda: done.append(True))
+
+    bulk.publish("lamp/0", "config")
+    futures[0].set_result(None)
+    client.deliver()
+    assert not done
+    futures[1].set_result(None)
+    assert done == [True]
+
+    bulk.when_done(lambda: done.append(False))
+    assert done == [True, False]
+
+
+def test_delivery_reported_before_publish_returns():
+    client = DedupClient()
+    delivered = []
+
+    def publish_inline(topic, payload, qos, retain, properties):
+        # the write, and its on_publish, can happen inside publish()
+        client.on_publish(client, None, 7)
+        return mock.Mock(rc=mqtt.MQTT_ERR_SUCCESS, mid=7)
+
+    with mock.patch.object(mqtt.Client, "publish", side_effect=publish_inline):
+        client.publish("a/state", "ON", on_delivered=lambda: delivered.append(7))
+    assert delivered == [7]
+
+    with mock.patch.object(
+        mqtt.Client, "publish", return_value=mock.Mock(rc=mqtt.MQTT_ERR_SUCCESS, mid=8)
+    ):
+        client.publish("a/state", "OFF", on_delivered=lambda: delivered.append(8))
+    assert delivered == [7]
+    client.on_publish(client, None, 8)
+    assert delivered == [7, 8]
+
+
+def test_skipped_publishes_are_counted():
+    client = DedupClient()
+    client.metrics = BridgeMetrics("debug")
+
+    with mock.patch.object(
+        mqtt.Client, "publish", return_value=mock.Mock(rc=mqtt.MQTT_ERR_SUCCESS, mid=1)
+    ):
+        for _ in range(3):
+            client.publish("dali2mqtt/lamp-1/light/status", b"ON")
+
+    text = client.metrics.render()
+    assert 'mqtt_publishes_skipped_total{family="+/+/light/status"} 2' in text
+    assert 'mqtt_messages_total{direction="out",family="+/+/light/status"} 1' in text
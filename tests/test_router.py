@@ -0,0 +1,44 @@
+"""Tests for the command topic router."""
+
+from dali.address import Group, Short
+from dali2mqtt.consts import (
+    MQTT_BRIGHTNESS_COMMAND_TOPIC,
+    MQTT_COMMAND_TOPIC,
+)
+from dali2mqtt.lamp import Lamp
+from dali2mqtt.router import TopicRouter
+
+ACTIONS = {MQTT_COMMAND_TOPIC: "switch", MQTT_BRIGHTNESS_COMMAND_TOPIC: "brightness"}
+
+
+def make_lamps(count):
+    lamps = [Lamp("info", "Mock", f"Lamp {number}", Short(number)) for number in range(count)]
+    lamps.append(Lamp("info", "Mock", "group_3", Group(3)))
+    return {lamp.device_name: lamp for lamp in lamps}
+
+
+def test_resolve_exact_topics():
+    all_lamps = make_lamps(2)
+    router = TopicRouter("dali2mqtt", ACTIONS)
+    router.rebuild(all_lamps)
+
+    assert len(router) == 6
+    assert router.resolve("dali2mqtt/lamp-1/light/switch") == (all_lamps["lamp-1"], "switch")
+    assert router.resolve("dali2mqtt/group-3/light/brightness/set") == (
+        all_lamps["group-3"],
+        "brightness",
+    )
+    assert router.resolve("dali2mqtt/lamp-7/light/switch") is None
+    assert router.resolve("dali2mqtt/lamp-1/light/brightness/get") is None
+
+
+def test_rebuild_drops_retired_lamps():
+    all_lamps = make_lamps(2)
+    router = TopicRouter("dali2mqtt", ACTIONS)
+    router.rebuild(all_lamps)
+    del all_lamps["lamp-0"]
+    router.rebuild(all_lamps)
+
+    assert router.resolve("dali2mqtt/lamp-0/light/switch") is None
+    assert len(router) == 4
+
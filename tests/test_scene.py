@@ -0,0 +1,102 @@
+"""Tests for scenes."""
+
+from dali2mqtt.bus import run_sequence
+from dali2mqtt.dali2mqtt import publish_scenes
+from dali2mqtt.emulator import BusEmulator
+from dali2mqtt.lamp import Lamp
+from dali2mqtt.scene import known_scenes, recall_scene, remove_scene, store_scene
+from dali.address import Group, Short
+from unittest import mock
+import dali.gear.general as gear
+
+
+def make_lamps():
+    limits = dict(min_physical_level=1, min_level=2, max_level=254)
+    return {
+        "1": Lamp("debug", "Mock", "1", Short(1), level=100, **limits),
+        "2": Lamp("debug", "Mock", "2", Short(2), level=0, **limits),
+        "group_0": Lamp("debug", "Mock", "group_0", Group(0), level=0, **limits),
+    }
+
+
+def make_emulator():
+    emulator = BusEmulator("debug", [1, 2], time_scale=0)
+    emulator.gear[1].go_to(100, 0, fade=False)
+    return emulator
+
+
+def test_store_and_recall_scene():
+    emulator = make_emulator()
+    all_lamps = make_lamps()
+
+    run_sequence(emulator, store_scene(all_lamps, 3))
+    assert known_scenes(all_lamps) == [3]
+    assert all_lamps["1"].scenes == {3: 100}
+    assert all_lamps["group_0"].scenes == {}
+
+    all_lamps["1"].level = 10
+    all_lamps["2"].level = 20
+    driver = mock.Mock()
+    changed = run_sequence(driver, recall_scene(all_lamps, 3))
+
+    assert isinstance(driver.send.call_args[0][0], gear.GoToScene)
+    assert changed == [all_lamps["1"], all_lamps["2"]]
+    assert (all_lamps["1"].level, all_lamps["2"].level) == (100, 0)
+
+
+def test_remove_scene():
+    emulator = make_emulator()
+    all_lamps = make_lamps()
+    run_sequence(emulator, store_scene(all_lamps, 3))
+    run_sequence(emulator, remove_scene(all_lamps, 3))
+
+    assert known_scenes(all_lamps) == []
+    assert run_sequence(emulator, recall_scene(all_lamps, 3)) == []
+
+
+def test_store_scene_reads_levels_back():
+    emulator = make_emulator()
+    for control_gear in emulator.gear.values():
+        control_gear.groups.add(3)
+    all_lamps = make_lamps()
+    all_lamps["1"].level = 254
+    all_lamps["3"] = Lamp("debug", "Mock", "3", Short(3))
+
+    emulator.send(gear.DAPC(Group(3), 30))
+    run_sequence(emulator, store_scene(all_lamps, 4))
+
+    assert all_lamps["1"].scenes == {4: 30}
+    assert all_lamps["2"].scenes == {4: 30}
+    assert all_lamps["3"].scenes == {}
+
+
+def test_recall_skips_unknown_scene_levels():
+    all_lamps = make_lamps()
+    all_lamps["1"].scenes[3] = None
+    all_lamps["2"].scenes[3] = 20
+
+    changed = run_sequence(mock.Mock(), recall_scene(all_lamps, 3))
+
+    assert changed == [all_lamps["2"]]
+    assert all_lamps["1"].level == 100
+
+
+def test_scene_discovery_is_retained():
+    client = mock.Mock()
+    all_lamps = make_lamps()
+    all_lamps["1"].scenes[3] = 100
+    data_object = {
+        "all_lamps": all_lamps,
+        "model": "Mock",
+        "base_topic": "test",
+        "bus_name": None,
+        "instance": None,
+        "ha_prefix": "homeassistant",
+        "availability_topic": "test/status",
+    }
+
+    publish_scenes(client, data_object)
+
+    ((args, kwargs),) = client.publish.call_args_list
+    assert args[0] == "homeassistant/scene/dali_scene_3/config"
+    assert kwargs == {"retain": True}
@@ -0,0 +1,60 @@
+"""Tests for the bus snapshot."""
+
+import json
+
+from dali.address import Group, Short
+from dali2mqtt.lamp import Lamp
+from dali2mqtt.snapshot import BusSnapshot, parse_snapshot
+
+
+def lamp(number, level, group=False):
+    address = Group(number) if group else Short(number)
+    return Lamp("debug", "Mock", f"lamp {number}", address, 1, 1, 254, level)
+
+
+def test_snapshot_is_published_once_per_change():
+    published = []
+    groups = {0: [1, 63]}
+    snapshot = BusSnapshot("debug", interval=1)
+    snapshot.watch(lambda: groups, published.append)
+
+    snapshot.publish_once()
+    assert published == []
+
+    snapshot.update(lamp(1, 0))
+    snapshot.update(lamp(63, 200))
+    snapshot.update(lamp(0, 120, group=True))
+    snapshot.publish_once()
+    snapshot.publish_once()
+    assert len(published) == 1
+
+    lamps, snapshot_groups = parse_snapshot(published[0])
+    assert lamps == {1: (0, False, False), 63: (200, True, False)}
+    assert snapshot_groups == {0: [1, 63]}
+    assert len(published[0]) < 300
+
+
+def test_faults_and_removed_lamps():
+    published = []
+    snapshot = BusSnapshot("debug")
+    snapshot.watch(dict, published.append)
+    first, second = lamp(1, 100), lamp(2, None)
+
+    snapshot.update(first)
+    snapshot.update(second)
+    snapshot.fault(first)
+    snapshot.publish_once()
+    assert parse_snapshot(published[-1])[0] == {
+        1: (100, True, True),
+        2: (None, False, False),
+    }
+
+    snapshot.fault(second, failed=False)
+    snapshot.publish_once()
+    assert len(published) == 1
+
+    snapshot.update(first)
+    snapshot.remove(second)
+    snapshot.publish_once()
+    assert parse_snapshot(published[-1])[0] == {1: (100, True, False)}
+    assert json.loads(published[-1])["fault"] == "0" * 16
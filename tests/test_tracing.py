@@ -0,0 +1,68 @@
+"""Tests for command latency tracing."""
+
+import json
+from unittest import mock
+
+import pytest
+
+from dali.address import Short
+from dali2mqtt import tracing
+from dali2mqtt.bus import run_sequence
+from dali2mqtt.dali2mqtt import set_lamp_levels
+from dali2mqtt.lamp import Lamp
+from dali2mqtt.tracing import Tracer
+
+
+def message(topic, timestamp):
+    msg = mock.Mock()
+    msg.topic = topic
+    msg.timestamp = timestamp
+    return msg
+
+
+def test_slowest_and_percentiles():
+    tracer = Tracer("debug", slowest=2, report_interval=3600)
+    for number in range(10):
+        with mock.patch("dali2mqtt.tracing.time.monotonic", return_value=1 + number / 100):
+            trace = tracer.start("brightness", message(f"lamp-{number}", 1.0))
+            tracing.finish(trace)
+
+    summary = tracer.summary()
+
+    assert summary["count"] == 10
+    assert summary["p50_ms"] == pytest.approx(40)
+    assert summary["p99_ms"] == pytest.approx(90)
+    assert [trace["topic"] for trace in summary["slowest"]] == ["lamp-9", "lamp-8"]
+    assert list(summary["slowest"][0]["stages"]) == ["received", "dispatched", "published"]
+
+
+def test_reports_to_json_lines_file(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer("debug", str(path), report_interval=0)
+    publish = mock.Mock()
+    tracer.watch(publish)
+
+    tracing.finish(tracer.start("brightness_get", message("lamp-1", 0.0)))
+    tracing.finish(tracer.start("brightness_get", message("lamp-2", 0.0)))
+
+    reports = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [report["count"] for report in reports] == [1, 2]
+    publish.assert_not_called()
+
+
+def test_traced_level_command():
+    tracer = Tracer("debug", report_interval=3600)
+    lamp = Lamp("debug", "Mock", "1", Short(1), 1, 1, 254, 0)
+    data_object = {
+        "base_topic": "test",
+        "light_schema": "default",
+        "groups": {},
+        "all_lamps": {"1": lamp},
+    }
+    trace = tracer.start("brightness", message("test/1/light/brightness/set", 0.0))
+    tracing.mark(trace, "queued")
+
+    run_sequence(mock.Mock(), set_lamp_levels(mock.Mock(), data_object, {"1": (lamp, 100, trace, None)}))
+
+    stages = tracer.summary()["slowest"][0]["stages"]
+    assert list(stages) == ["received", "dispatched", "queued", "bus", "sent", "published"]